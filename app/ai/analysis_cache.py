@@ -0,0 +1,136 @@
+import os
+import json
+import pickle
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisCache:
+    """StepAnalyzer 分析结果的内容寻址缓存
+
+    键由解码后像素的哈希与分析参数共同决定。内存层为 LRU，可选的磁盘层
+    按总字节数淘汰最久未访问的条目，进程重启后依然有效。
+    """
+
+    def __init__(self, max_entries: int = 64, disk_dir: Optional[str] = None,
+                 disk_max_bytes: int = 512 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'memory_evictions': 0,
+            'disk_evictions': 0,
+        }
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(image: np.ndarray, params: Dict[str, Any]) -> str:
+        """像素内容 + 形状 + 参数的 SHA-256"""
+        digest = hashlib.sha256()
+        digest.update(str(image.shape).encode())
+        digest.update(str(image.dtype).encode())
+        digest.update(np.ascontiguousarray(image).data)
+        digest.update(json.dumps(params, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.pkl")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            result = self._memory.get(key)
+            if result is not None:
+                self._memory.move_to_end(key)
+                self.counters['memory_hits'] += 1
+                return result
+        if self.disk_dir:
+            path = self._disk_path(key)
+            try:
+                with open(path, 'rb') as f:
+                    result = pickle.load(f)
+                os.utime(path)  # 记录访问时间，用于淘汰
+            except FileNotFoundError:
+                result = None
+            except Exception as e:
+                logger.warning(f"读取分析缓存失败，已忽略: {str(e)}")
+                result = None
+            if result is not None:
+                with self._lock:
+                    self.counters['disk_hits'] += 1
+                self._put_memory(key, result)
+                return result
+        with self._lock:
+            self.counters['misses'] += 1
+        return None
+
+    def _put_memory(self, key: str, result: Dict[str, Any]) -> None:
+        with self._lock:
+            self._memory[key] = result
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self.counters['memory_evictions'] += 1
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        self._put_memory(key, result)
+        with self._lock:
+            self.counters['stores'] += 1
+        if self.disk_dir:
+            try:
+                fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix='.tmp')
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, self._disk_path(key))
+                self._evict_disk()
+            except Exception as e:
+                logger.warning(f"写入分析缓存失败，已忽略: {str(e)}")
+
+    def _evict_disk(self) -> None:
+        entries = []
+        total = 0
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith('.pkl'):
+                continue
+            path = os.path.join(self.disk_dir, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+        if total <= self.disk_max_bytes:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                with self._lock:
+                    self.counters['disk_evictions'] += 1
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.counters)
+            stats['memory_entries'] = len(self._memory)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_ratio'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 3) if lookups else 0.0
+        return stats
@@ -0,0 +1,232 @@
+import time
+import random
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# 视为暂时性故障、值得稍后重试的状态码
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class RetryLater(Exception):
+    """远程 API 暂不可用，调用方应在 retry_after 秒后重试"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = max(float(retry_after), 0.0)
+
+
+class CircuitOpenError(RetryLater):
+    """熔断器处于打开状态，请求未发出即被拒绝"""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 头（秒数或 HTTP 日期），无法解析时返回 None"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(failures: int, base: float, cap: float) -> float:
+    """指数退避 + 全抖动：在 [0, min(cap, base * 2^(failures-1))] 内均匀取值"""
+    exponent = min(max(failures - 1, 0), 30)
+    return random.uniform(0, min(cap, base * (2 ** exponent)))
+
+
+class RateLimiter:
+    """令牌桶：平均每秒 rate 个请求，最多突发 burst 个"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """有令牌时取走一个并返回 0，否则返回需要等待的秒数（不阻塞）"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+
+class CircuitBreaker:
+    """连续失败达到阈值后打开熔断，reset_timeout 秒后放行一个探测请求
+
+    closed -> open：连续失败 failure_threshold 次
+    open -> half_open：打开超过 reset_timeout 秒
+    half_open -> closed / open：探测请求成功 / 失败
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_request(self) -> None:
+        """请求前检查，熔断打开时抛出 CircuitOpenError"""
+        with self._lock:
+            if self.state == 'closed':
+                return
+            remaining = self.opened_at + self.reset_timeout - time.time()
+            if self.state == 'open' and remaining <= 0:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            raise CircuitOpenError("远程 API 暂不可用（熔断中）", max(remaining, 1.0))
+
+    def release_probe(self) -> None:
+        """放弃已放行但未发出的探测请求，不改变熔断状态"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != 'closed':
+                logger.info("远程 API 已恢复，熔断关闭")
+            self.state = 'closed'
+            self.failures = 0
+            self.opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    logger.warning(f"远程 API 连续失败 {self.failures} 次，熔断打开 {self.reset_timeout} 秒")
+                self.state = 'open'
+                self.opened_at = time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'state': self.state, 'failures': self.failures}
+
+
+class ApiClient:
+    """带连接池、退避与熔断的 HTTP 客户端
+
+    复用 keep-alive 连接；暂时性故障（超时、连接错误、429、5xx）不会在当前
+    线程里 sleep 重试，而是记录下一次允许请求的时间并抛出 RetryLater，
+    由调用方（HTTP 503 + Retry-After，或后台任务调度）决定何时重试。
+    在退避窗口内的请求直接快速失败，不会打到远程 API。
+    """
+
+    def __init__(self, pool_size: int = 10, connect_timeout: float = 5.0,
+                 read_timeout: float = 120.0, backoff_base: float = 1.0,
+                 backoff_max: float = 60.0, failure_threshold: int = 5,
+                 reset_timeout: float = 60.0, rate_limit: float = 0.0, rate_burst: int = 1):
+        self.timeout = (connect_timeout, read_timeout)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        # 本地速率预算（每秒请求数），0 表示不限制
+        self.rate_limiter = RateLimiter(rate_limit, rate_burst) if rate_limit > 0 else None
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._next_attempt_at = 0.0
+        self._consecutive_failures = 0
+        self._lock = threading.Lock()
+        self.counters = {'requests': 0, 'successes': 0, 'retryable_failures': 0, 'rejected': 0, 'throttled': 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def _defer(self, message: str, retry_after: Optional[float]) -> RetryLater:
+        """记录一次暂时性失败，返回应抛出的 RetryLater"""
+        self.breaker.record_failure()
+        with self._lock:
+            self._consecutive_failures += 1
+            self.counters['retryable_failures'] += 1
+            if retry_after is None:
+                retry_after = backoff_delay(self._consecutive_failures, self.backoff_base, self.backoff_max)
+            self._next_attempt_at = max(self._next_attempt_at, time.time() + retry_after)
+        logger.warning(f"{message}，{retry_after:.1f} 秒后可重试")
+        return RetryLater(message, retry_after)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """发送 POST 请求
+
+        返回非暂时性错误的响应（包括 4xx），由调用方解析。
+
+        异常：
+            RetryLater: 处于退避窗口、超出速率预算、熔断打开或本次请求遇到暂时性故障
+        """
+        with self._lock:
+            wait = self._next_attempt_at - time.time()
+        if wait > 0:
+            self._count('rejected')
+            raise RetryLater("远程 API 退避中", wait)
+        # 先检查熔断，被拒绝的请求不消耗速率令牌
+        try:
+            self.breaker.before_request()
+        except CircuitOpenError:
+            self._count('rejected')
+            raise
+        if self.rate_limiter is not None:
+            wait = self.rate_limiter.reserve()
+            if wait > 0:
+                self.breaker.release_probe()
+                self._count('throttled')
+                raise RetryLater("超出本地速率预算", wait)
+
+        self._count('requests')
+        try:
+            response = self.session.post(url, timeout=self.timeout, **kwargs)
+        except requests.exceptions.Timeout:
+            raise self._defer("API 请求超时", None)
+        except requests.exceptions.ConnectionError as e:
+            raise self._defer(f"API 连接失败: {str(e)}", None)
+        except requests.exceptions.RequestException as e:
+            # 其余请求异常同样要记入熔断，否则半开状态的探测请求永远无法结束
+            raise self._defer(f"API 请求失败: {str(e)}", None)
+
+        if response.status_code in RETRYABLE_STATUS:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if response.status_code == 429:
+                message = "API 速率限制超出"
+            else:
+                message = f"API 暂时不可用，状态码 {response.status_code}"
+            raise self._defer(message, retry_after)
+
+        # 非暂时性响应：远程服务是健康的
+        self.breaker.record_success()
+        with self._lock:
+            self._consecutive_failures = 0
+            self.counters['successes'] += 1
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.counters)
+            stats['backoff_remaining_s'] = round(max(self._next_attempt_at - time.time(), 0.0), 1)
+        stats['breaker'] = self.breaker.to_dict()
+        return stats
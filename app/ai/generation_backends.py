@@ -0,0 +1,349 @@
+import io
+import os
+import math
+import base64
+import random
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from PIL import Image, ImageDraw
+
+from ai.api_client import ApiClient, RetryLater
+from ai.generation_cache import normalize_prompt
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationBackend:
+    """图案生成后端接口
+
+    generate 返回 samples 张 Base64 编码的 PNG 原图，后处理由 PatternGenerator 统一完成。
+    """
+
+    name = 'base'
+    # 结果是否值得缓存（本地生成足够快时可以跳过缓存）
+    cacheable = True
+
+    @property
+    def identity(self) -> str:
+        """参与缓存键计算的后端标识，更换模型或地址后旧缓存自动失效"""
+        return self.name
+
+    def generate(self, prompt: str, params: Dict[str, Any], samples: int = 1) -> List[str]:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {'backend': self.name}
+
+
+class StabilityBackend(GenerationBackend):
+    """Stability AI 文生图接口"""
+
+    name = 'stability'
+
+    def __init__(self, client: Optional[ApiClient] = None):
+        self.api_key = os.getenv("STABLE_DIFFUSION_API_KEY")
+        if not self.api_key:
+            logging.warning("未在.env文件中找到 STABLE_DIFFUSION_API_KEY，部分功能将不可用。")
+        self.api_url = os.getenv(
+            "STABLE_DIFFUSION_API_URL",
+            "https://api.stability.ai/v1/generation/stable-diffusion-xl-1024-v1-0/text-to-image")
+        # 连接池 + 指数退避 + 熔断，暂时性故障不阻塞请求线程
+        self.client = client if client is not None else ApiClient(
+            pool_size=int(os.getenv("STABLE_DIFFUSION_POOL_SIZE", "10")),
+            read_timeout=float(os.getenv("STABLE_DIFFUSION_TIMEOUT", "120")),
+            backoff_base=float(os.getenv("STABLE_DIFFUSION_BACKOFF_BASE", "1")),
+            backoff_max=float(os.getenv("STABLE_DIFFUSION_BACKOFF_MAX", "60")),
+            failure_threshold=int(os.getenv("STABLE_DIFFUSION_BREAKER_THRESHOLD", "5")),
+            reset_timeout=float(os.getenv("STABLE_DIFFUSION_BREAKER_RESET", "60")),
+            rate_limit=float(os.getenv("STABLE_DIFFUSION_RATE_LIMIT", "0")),
+            rate_burst=int(os.getenv("STABLE_DIFFUSION_RATE_BURST", "1")),
+        )
+
+    @property
+    def identity(self) -> str:
+        return self.api_url
+
+    def generate(self, prompt: str, params: Dict[str, Any], samples: int = 1) -> List[str]:
+        """请求 Stability AI 生成图案
+
+        只发出一次请求，暂时性故障以 RetryLater 抛出，不在当前线程中等待重试。
+        """
+        # 构建增强提示词（保留英文内容）
+        enhanced_prompt = f"""
+        A traditional Chinese paper cutting pattern of {prompt},
+        clean and precise lines,
+        very very easy,
+        suitable for paper cutting,
+        black and white,
+        high contrast,
+        vector style,
+        symmetrical design,
+        traditional Chinese art style,
+        detailed edges,
+        no shading,
+        no gradients,
+        single layer design,
+        suitable for cutting with scissors,
+        clear cutting lines,
+        traditional paper cutting technique,
+        cultural elements,
+        decorative pattern
+        """
+
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "Accept": "application/json"
+        }
+
+        body = {
+            "text_prompts": [
+                {
+                    "text": enhanced_prompt,
+                    "weight": 1
+                },
+                {
+                    "text": "photorealistic, 3d, shading, gradient, multiple layers, complex background, blurry, low contrast, modern style, digital art, painting, sketch, watercolor, oil painting, realistic, detailed shading, multiple colors, complex textures",
+                    "weight": -1
+                }
+            ],
+            "cfg_scale": params['cfg_scale'],
+            "height": params['height'],
+            "width": params['width'],
+            "samples": samples,
+            "steps": params['steps'],
+            "style_preset": params['style_preset'],
+            "seed": params['seed']
+        }
+
+        logger.debug(f"发送请求到 Stability AI API")
+        logger.debug(f"请求 URL: {self.api_url}")
+
+        try:
+            response = self.client.post(self.api_url, headers=headers, json=body)
+        except RetryLater:
+            raise
+        except requests.exceptions.RequestException as e:
+            error_msg = f"API 请求失败: {str(e)}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+
+        logger.debug(f"响应状态码: {response.status_code}")
+
+        if response.status_code == 200:
+            data = response.json()
+            if "artifacts" in data and len(data["artifacts"]) > 0:
+                artifacts = [artifact["base64"] for artifact in data["artifacts"]]
+                logger.info(f"成功生成 {len(artifacts)} 个图案")
+                return artifacts
+            error_msg = "响应中无图片数据"
+            logger.error(error_msg)
+            logger.debug(f"响应数据: {data}")
+            raise Exception(error_msg)
+        elif response.status_code == 401:
+            error_msg = "API 认证失败，请检查 API 密钥。"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+        else:
+            error_msg = f"API 请求失败，状态码 {response.status_code}: {response.text}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(super().stats(), **self.client.stats())
+
+
+# 提示词关键字到图案类型的映射
+MOTIF_KEYWORDS = {
+    'flower': ('花', '梅', '莲', '牡丹', 'flower', 'lotus', 'blossom', 'rose', 'peony'),
+    'border': ('边', '框', '窗', 'border', 'frame', 'window'),
+    'mirror': ('蝶', '鸟', '鱼', '福', '喜', 'butterfly', 'bird', 'fish', 'symmetric'),
+    'mandala': ('圆', '团', '轮', 'mandala', 'round', 'wheel', 'snow', '雪'),
+}
+
+Point = Tuple[float, float]
+
+
+class ProceduralBackend(GenerationBackend):
+    """纯 CPU 的本地程序化剪纸图案生成器
+
+    以提示词哈希为随机种子，生成具有旋转或镜像对称的黑白剪纸纹样
+    （团花、窗花边框、蝴蝶等）。同一提示词与参数总是得到相同的图案，
+    无需网络，适合开发、CI、离线车间以及整条流水线的压力测试。
+    """
+
+    name = 'procedural'
+    cacheable = False
+    version = 1
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size  # 限制画布边长，避免超大尺寸拖慢生成
+
+    @property
+    def identity(self) -> str:
+        return f"{self.name}-v{self.version}"
+
+    def _seed(self, prompt: str, params: Dict[str, Any], sample: int) -> int:
+        payload = f"{normalize_prompt(prompt)}|{params.get('seed', 0)}|{sample}"
+        return int.from_bytes(hashlib.sha256(payload.encode('utf-8')).digest()[:8], 'big')
+
+    @staticmethod
+    def _pick_motif(prompt: str, rng: random.Random) -> str:
+        lowered = prompt.casefold()
+        for motif, keywords in MOTIF_KEYWORDS.items():
+            if any(keyword in lowered for keyword in keywords):
+                return motif
+        return rng.choice(list(MOTIF_KEYWORDS))
+
+    def generate(self, prompt: str, params: Dict[str, Any], samples: int = 1) -> List[str]:
+        width = max(64, min(int(params.get('width', 1024)), self.max_size))
+        height = max(64, min(int(params.get('height', 1024)), self.max_size))
+        images = []
+        for sample in range(samples):
+            rng = random.Random(self._seed(prompt, params, sample))
+            image = self._render(prompt, rng, width, height)
+            buffered = io.BytesIO()
+            image.save(buffered, format="PNG")
+            images.append(base64.b64encode(buffered.getvalue()).decode())
+        logger.info(f"本地生成 {samples} 个图案: {prompt}")
+        return images
+
+    def _render(self, prompt: str, rng: random.Random, width: int, height: int) -> Image.Image:
+        image = Image.new('L', (width, height), 255)
+        draw = ImageDraw.Draw(image)
+        center = (width / 2, height / 2)
+        radius = 0.42 * min(width, height)
+        motif = self._pick_motif(prompt, rng)
+
+        if motif == 'flower':
+            self._draw_flower(draw, rng, center, radius)
+        elif motif == 'mandala':
+            self._draw_mandala(draw, rng, center, radius)
+        elif motif == 'mirror':
+            self._draw_mirror(draw, rng, center, radius)
+        else:
+            self._draw_flower(draw, rng, center, radius * 0.7)
+        if motif == 'border' or rng.random() < 0.3:
+            self._draw_border(draw, rng, width, height)
+        return image.convert('RGB')
+
+    @staticmethod
+    def _polar(center: Point, r: float, angle: float) -> Point:
+        return (center[0] + r * math.cos(angle), center[1] + r * math.sin(angle))
+
+    def _petal(self, center: Point, inner: float, outer: float, angle: float,
+               half_width: float, steps: int = 12) -> List[Point]:
+        """以 angle 为轴、从 inner 到 outer 的对称花瓣多边形"""
+        left, right = [], []
+        for i in range(steps + 1):
+            t = i / steps
+            r = inner + (outer - inner) * t
+            spread = half_width * math.sin(math.pi * t)
+            left.append(self._polar(center, r, angle - spread))
+            right.append(self._polar(center, r, angle + spread))
+        return left + right[::-1]
+
+    def _draw_flower(self, draw: ImageDraw.ImageDraw, rng: random.Random,
+                     center: Point, radius: float) -> None:
+        """多层旋转对称的团花，花瓣内镂空"""
+        petals = rng.randint(5, 12)
+        layers = rng.randint(1, 3)
+        offset = rng.random() * math.pi
+        for layer in range(layers):
+            outer = radius * (1 - layer * 0.28)
+            inner = outer * rng.uniform(0.2, 0.4)
+            width = math.pi / petals * rng.uniform(0.6, 0.95)
+            rotation = offset + (math.pi / petals if layer % 2 else 0)
+            for k in range(petals):
+                angle = rotation + 2 * math.pi * k / petals
+                draw.polygon(self._petal(center, inner, outer, angle, width), fill=0)
+                draw.polygon(self._petal(center, inner + (outer - inner) * 0.3,
+                                         outer - (outer - inner) * 0.2, angle, width * 0.4), fill=255)
+        core = radius * rng.uniform(0.12, 0.2)
+        draw.ellipse([center[0] - core, center[1] - core, center[0] + core, center[1] + core], fill=0)
+        hole = core * 0.45
+        draw.ellipse([center[0] - hole, center[1] - hole, center[0] + hole, center[1] + hole], fill=255)
+
+    def _draw_mandala(self, draw: ImageDraw.ImageDraw, rng: random.Random,
+                      center: Point, radius: float) -> None:
+        """同心环上重复的几何纹样"""
+        order = rng.choice([6, 8, 10, 12, 16])
+        draw.ellipse([center[0] - radius, center[1] - radius,
+                      center[0] + radius, center[1] + radius], fill=0)
+        draw.ellipse([center[0] - radius * 0.94, center[1] - radius * 0.94,
+                      center[0] + radius * 0.94, center[1] + radius * 0.94], fill=255)
+        rings = rng.randint(2, 4)
+        for ring in range(rings):
+            r = radius * (0.8 - ring * 0.6 / rings)
+            size = radius * rng.uniform(0.06, 0.12) * (1 - ring * 0.15)
+            shape = rng.choice(['circle', 'diamond', 'triangle'])
+            for k in range(order):
+                angle = 2 * math.pi * k / order + (math.pi / order) * (ring % 2)
+                x, y = self._polar(center, r, angle)
+                if shape == 'circle':
+                    draw.ellipse([x - size, y - size, x + size, y + size], fill=0)
+                else:
+                    corners = 4 if shape == 'diamond' else 3
+                    draw.polygon([self._polar((x, y), size * 1.4, angle + 2 * math.pi * c / corners)
+                                  for c in range(corners)], fill=0)
+        self._draw_flower(draw, rng, center, radius * 0.3)
+
+    def _draw_mirror(self, draw: ImageDraw.ImageDraw, rng: random.Random,
+                     center: Point, radius: float) -> None:
+        """左右镜像对称的随机轮廓（蝴蝶、鸟等剪影），内部镂空"""
+        count = rng.randint(10, 16)
+        # 右半边的平滑随机半径
+        radii = [rng.uniform(0.45, 1.0) for _ in range(count)]
+        radii = [(radii[i - 1] + 2 * radii[i] + radii[(i + 1) % count]) / 4 for i in range(count)]
+        right = [self._polar(center, radius * r, -math.pi / 2 + math.pi * i / (count - 1))
+                 for i, r in enumerate(radii)]
+        left = [(2 * center[0] - x, y) for x, y in reversed(right)]
+        draw.polygon(right + left, fill=0)
+        holes = rng.randint(2, 5)
+        for i in range(holes):
+            angle = -math.pi / 2 + math.pi * (i + 1) / (holes + 1)
+            r = radius * 0.45
+            size = radius * rng.uniform(0.05, 0.1)
+            for x, y in (self._polar(center, r, angle), self._polar(center, r, math.pi - angle)):
+                draw.ellipse([x - size, y - size, x + size, y + size], fill=255)
+        spine = radius * 0.04
+        draw.rectangle([center[0] - spine, center[1] - radius * 0.6,
+                        center[0] + spine, center[1] + radius * 0.6], fill=255)
+
+    def _draw_border(self, draw: ImageDraw.ImageDraw, rng: random.Random,
+                     width: int, height: int) -> None:
+        """窗花式边框：双线框 + 沿边重复的菱形"""
+        margin = 0.04 * min(width, height)
+        band = 0.05 * min(width, height)
+        draw.rectangle([margin, margin, width - margin, height - margin], outline=0,
+                       width=max(2, int(band * 0.25)))
+        inner = margin + band
+        draw.rectangle([inner, inner, width - inner, height - inner], outline=0,
+                       width=max(2, int(band * 0.15)))
+        repeats = rng.randint(8, 16)
+        mid = margin + band / 2
+        size = band * 0.35
+        for i in range(repeats + 1):
+            for x, y in ((margin + (width - 2 * margin) * i / repeats, mid),
+                         (margin + (width - 2 * margin) * i / repeats, height - mid),
+                         (mid, margin + (height - 2 * margin) * i / repeats),
+                         (width - mid, margin + (height - 2 * margin) * i / repeats)):
+                draw.polygon([(x, y - size), (x + size, y), (x, y + size), (x - size, y)], fill=0)
+
+
+# 可通过 PATTERN_BACKEND 选择的后端
+BACKENDS = {
+    StabilityBackend.name: StabilityBackend,
+    ProceduralBackend.name: ProceduralBackend,
+}
+
+
+def create_backend(name: Optional[str] = None) -> GenerationBackend:
+    """按名称创建生成后端，默认读取 PATTERN_BACKEND 环境变量"""
+    name = (name or os.getenv('PATTERN_BACKEND') or StabilityBackend.name).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"不支持的生成后端: {name}（可选: {', '.join(BACKENDS)}）")
+    return BACKENDS[name]()
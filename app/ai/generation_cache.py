@@ -0,0 +1,281 @@
+import os
+import re
+import json
+import time
+import errno
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """规范化提示词：去除首尾空白、合并连续空白、统一大小写"""
+    return re.sub(r'\s+', ' ', prompt.strip()).casefold()
+
+
+def make_generation_key(prompt: str, params: Dict[str, Any]) -> str:
+    """规范化提示词 + 全部请求参数的 SHA-256"""
+    payload = json.dumps({'prompt': normalize_prompt(prompt), 'params': params},
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class GenerationCache:
+    """图案生成缓存的基类
+
+    子类实现 _load / _store；基类负责统计与单飞（single-flight）：
+    同一个键同时只有一个调用方真正请求远程 API，其余调用方等待其结果。
+    """
+
+    def __init__(self, ttl: Optional[float] = None, wait_timeout: float = 180.0):
+        self.ttl = ttl  # 秒，None 表示永不过期
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, threading.Event] = {}
+        self.counters = {
+            'hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'expirations': 0,
+            'evictions': 0,
+            'deduplicated': 0,
+        }
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += amount
+
+    def _load(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def _store(self, key: str, value: str) -> None:
+        raise NotImplementedError
+
+    def _acquire_process_lock(self, key: str) -> bool:
+        """跨进程单飞锁，默认仅进程内有效"""
+        return True
+
+    def _release_process_lock(self, key: str) -> None:
+        pass
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._load(key)
+        self._count('hits' if value is not None else 'misses')
+        return value
+
+    def put(self, key: str, value: str) -> None:
+        self._store(key, value)
+        self._count('stores')
+
+    def get_or_create(self, key: str, factory: Callable[[], str]) -> str:
+        """命中缓存直接返回，否则只让一个调用方执行 factory 并写入缓存"""
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = threading.Event()
+        if not leader:
+            self._count('deduplicated')
+            event.wait(self.wait_timeout)
+            value = self._load(key)
+            if value is not None:
+                return value
+            # 领头的调用失败，由当前调用方重新生成
+            return self.get_or_create(key, factory)
+
+        try:
+            if not self._acquire_process_lock(key):
+                # 其他进程正在生成同一图案，等待其结果
+                self._count('deduplicated')
+                value = self._load(key)
+                if value is not None:
+                    return value
+            value = factory()
+            self.put(key, value)
+            return value
+        finally:
+            self._release_process_lock(key)
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.counters)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        return stats
+
+
+class MemoryGenerationCache(GenerationCache):
+    """进程内 LRU 缓存（按条目数淘汰）"""
+
+    def __init__(self, max_entries: int = 100, ttl: Optional[float] = None):
+        super().__init__(ttl=ttl)
+        self.max_entries = max_entries
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def _load(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            created_at, value = item
+            if self.ttl is not None and time.time() - created_at > self.ttl:
+                del self._items[key]
+                self.counters['expirations'] += 1
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def _store(self, key: str, value: str) -> None:
+        with self._lock:
+            self._items[key] = (time.time(), value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        with self._lock:
+            stats['entries'] = len(self._items)
+        return stats
+
+
+class DiskGenerationCache(GenerationCache):
+    """磁盘缓存，可被多个工作进程共享
+
+    每个条目是一个 JSON 文件，写入使用临时文件 + os.replace 保证原子性；
+    跨进程单飞通过 O_EXCL 创建锁文件实现。超过 TTL 的条目在读取时删除，
+    总大小超过 max_bytes 时淘汰最久未访问的条目。
+    """
+
+    def __init__(self, directory: str, ttl: Optional[float] = 7 * 24 * 3600,
+                 max_bytes: int = 1024 * 1024 * 1024, lock_timeout: float = 180.0):
+        super().__init__(ttl=ttl, wait_timeout=lock_timeout)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock_timeout = lock_timeout
+        self._owned_locks = set()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _lock_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.lock")
+
+    def _load(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取生成缓存失败，已忽略: {str(e)}")
+            return None
+        if self.ttl is not None and time.time() - entry.get('created_at', 0) > self.ttl:
+            self._remove(path)
+            self._count('expirations')
+            return None
+        try:
+            os.utime(path)  # 记录访问时间，用于淘汰
+        except OSError:
+            pass
+        return entry.get('image')
+
+    def _store(self, key: str, value: str) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'created_at': time.time(), 'image': value}, f)
+            os.replace(tmp_path, self._path(key))
+        except Exception:
+            self._remove(tmp_path)
+            raise
+        self._evict()
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self) -> None:
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+            self._count('evictions')
+
+    def _acquire_process_lock(self, key: str) -> bool:
+        """创建锁文件；已被其他进程持有时等待其完成并返回 False"""
+        lock_path = self._lock_path(key)
+        deadline = time.time() + self.lock_timeout
+        while True:
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode())
+                os.close(fd)
+                with self._lock:
+                    self._owned_locks.add(key)
+                return True
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+            try:
+                # 持有者崩溃留下的过期锁
+                if time.time() - os.stat(lock_path).st_mtime > self.lock_timeout:
+                    self._remove(lock_path)
+                    continue
+            except FileNotFoundError:
+                continue
+            if os.path.exists(self._path(key)) or time.time() > deadline:
+                return False
+            time.sleep(0.2)
+
+    def _release_process_lock(self, key: str) -> None:
+        with self._lock:
+            owned = key in self._owned_locks
+            self._owned_locks.discard(key)
+        if owned:
+            self._remove(self._lock_path(key))
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        sizes = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                try:
+                    sizes.append(os.path.getsize(os.path.join(self.directory, name)))
+                except FileNotFoundError:
+                    pass
+        stats['entries'] = len(sizes)
+        stats['bytes'] = sum(sizes)
+        return stats
@@ -0,0 +1,294 @@
+import time
+import uuid
+import queue
+import logging
+import threading
+import traceback
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from ai.api_client import RetryLater
+
+logger = logging.getLogger(__name__)
+
+# 已结束的任务状态
+FINISHED_STATES = ('completed', 'failed', 'cancelled')
+
+
+class JobLimitError(RuntimeError):
+    """队列已满或客户端并发任务数超限"""
+
+    def __init__(self, message: str, retry_after: float = 5.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class GenerationJob:
+    """一次图案生成任务的状态"""
+
+    def __init__(self, prompt: str, options: Dict[str, Any], client_id: str,
+                 batch: Optional[Dict[str, Any]] = None):
+        self.id = uuid.uuid4().hex
+        self.prompt = prompt
+        self.batch = batch  # 批量任务：prompts / samples / rank
+        self.options = options
+        self.client_id = client_id
+        self.status = 'queued'  # queued / running / retrying / completed / failed / cancelled
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.retry_at = None
+        self.attempts = 0
+        self.image = None
+        self.result = None  # 批量任务的结果：candidates / errors
+        self.error = None
+        self.version = 0  # 每次状态变化递增，供事件流判断是否有更新
+        self._changed = threading.Condition(threading.RLock())
+
+    def update(self, **fields) -> None:
+        with self._changed:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.version += 1
+            self._changed.notify_all()
+
+    def transition(self, expected: tuple, **fields) -> bool:
+        """仅当当前状态属于 expected 时更新，返回是否更新成功"""
+        with self._changed:
+            if self.status not in expected:
+                return False
+            self.update(**fields)
+            return True
+
+    def wait_for_change(self, version: int, timeout: float) -> int:
+        """阻塞直到 version 变化或超时，返回当前 version"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def to_dict(self, include_image: bool = True) -> Dict[str, Any]:
+        with self._changed:
+            data = {
+                'id': self.id,
+                'status': self.status,
+                'prompt': self.prompt,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'retry_at': self.retry_at,
+                'attempts': self.attempts,
+                'error': self.error,
+                'version': self.version,
+            }
+            if self.batch is not None:
+                data['batch'] = dict(self.batch)
+            if include_image and self.status == 'completed':
+                if self.batch is None:
+                    data['image'] = self.image
+                else:
+                    data.update(self.result)
+            return data
+
+
+class GenerationJobManager:
+    """后台图案生成任务池
+
+    固定数量的工作线程从有界队列中取任务执行 PatternGenerator.generate，
+    HTTP 请求只负责提交与查询。远程 API 要求稍后重试时，任务进入 retrying
+    状态并由定时器在 Retry-After 之后重新入队，不占用工作线程。
+    """
+
+    def __init__(self, generator, workers: int = 2, max_queue: int = 32,
+                 per_client_limit: int = 2, max_attempts: int = 5,
+                 history_size: int = 100, batch_concurrency: int = 4,
+                 scorer: Optional[Callable[[str], Dict[str, Any]]] = None):
+        self.generator = generator
+        self.batch_concurrency = batch_concurrency
+        self.scorer = scorer  # 批量任务排序用的评分函数
+        self.workers = workers
+        self.max_queue = max_queue
+        self.per_client_limit = per_client_limit
+        self.max_attempts = max_attempts
+        self.history_size = history_size
+        self._queue = queue.Queue()
+        self._jobs: "OrderedDict[str, GenerationJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._running = 0
+        self.counters = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'cancelled': 0,
+            'rejected': 0,
+            'retries': 0,
+        }
+        self._started = 0
+        self._queue_wait_total = 0.0
+        self._run_total = 0.0
+        self._run_count = 0
+
+    def _ensure_workers(self) -> None:
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, daemon=True,
+                                          name=f'generation-worker-{len(self._threads)}')
+                thread.start()
+                self._threads.append(thread)
+
+    def _active(self) -> List[GenerationJob]:
+        return [job for job in self._jobs.values() if not job.finished]
+
+    def submit(self, prompt: str, options: Optional[Dict[str, Any]] = None,
+               client_id: str = 'anonymous') -> GenerationJob:
+        """提交生成任务，立即返回任务对象
+
+        异常：
+            JobLimitError: 队列已满或该客户端未完成的任务过多
+        """
+        if not prompt or not isinstance(prompt, str):
+            raise ValueError("无效的提示词: 必须为非空字符串")
+        return self._enqueue(GenerationJob(prompt, dict(options or {}), client_id))
+
+    def submit_batch(self, prompts: List[str], samples: int = 1, rank: bool = False,
+                     options: Optional[Dict[str, Any]] = None,
+                     client_id: str = 'anonymous') -> GenerationJob:
+        """提交批量 / 多候选生成任务，整个批次占用一个任务名额
+
+        异常：
+            JobLimitError: 队列已满或该客户端未完成的任务过多
+        """
+        if not prompts or not all(isinstance(p, str) and p.strip() for p in prompts):
+            raise ValueError("无效的提示词列表: 必须为非空字符串组成的列表")
+        if rank and self.scorer is None:
+            raise ValueError("未配置评分函数，无法排序候选")
+        batch = {'prompts': list(prompts), 'samples': samples, 'rank': rank}
+        return self._enqueue(GenerationJob(prompts[0], dict(options or {}), client_id, batch=batch))
+
+    def _enqueue(self, job: GenerationJob) -> GenerationJob:
+        client_id = job.client_id
+        with self._lock:
+            active = self._active()
+            if sum(1 for j in active if j.status == 'queued') >= self.max_queue:
+                self.counters['rejected'] += 1
+                raise JobLimitError("生成队列已满，请稍后再试")
+            if sum(1 for j in active if j.client_id == client_id) >= self.per_client_limit:
+                self.counters['rejected'] += 1
+                raise JobLimitError(f"每个客户端最多同时进行 {self.per_client_limit} 个生成任务")
+            self._jobs[job.id] = job
+            self.counters['submitted'] += 1
+            self._trim_history()
+        self._queue.put(job)
+        self._ensure_workers()
+        logger.info(f"已提交生成任务 {job.id}，提示词: {job.batch['prompts'] if job.batch else job.prompt}")
+        return job
+
+    def _trim_history(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(len(self._jobs) - self.history_size, 0)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[GenerationJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> GenerationJob:
+        """取消排队或等待重试的任务；正在请求远程 API 的任务无法中断"""
+        job = self.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        if not job.transition(('queued', 'retrying'), status='cancelled', finished_at=time.time()):
+            raise ValueError("只有排队中或等待重试的任务可以取消")
+        with self._lock:
+            self.counters['cancelled'] += 1
+        return job
+
+    def _requeue(self, job: GenerationJob) -> None:
+        if job.transition(('retrying',), status='queued', retry_at=None):
+            self._queue.put(job)
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                self._execute(job)
+            finally:
+                self._queue.task_done()
+
+    def _execute(self, job: GenerationJob) -> None:
+        started = time.time()
+        first_attempt = job.attempts == 0
+        # 排队期间被取消的任务直接跳过
+        if not job.transition(('queued',), status='running', attempts=job.attempts + 1,
+                              started_at=job.started_at or started):
+            return
+        with self._lock:
+            self._running += 1
+            if first_attempt:
+                self._started += 1
+                self._queue_wait_total += started - job.created_at
+        try:
+            if job.batch is None:
+                image = self.generator.generate(job.prompt, **job.options)
+                job.update(status='completed', image=image, finished_at=time.time())
+            else:
+                result = self.generator.generate_batch(
+                    job.batch['prompts'], samples=job.batch['samples'],
+                    max_concurrency=self.batch_concurrency,
+                    scorer=self.scorer if job.batch['rank'] else None, **job.options)
+                if not result['candidates']:
+                    raise RuntimeError(result['errors'][0]['error'] if result['errors'] else "未生成任何候选")
+                job.update(status='completed', result=result, finished_at=time.time())
+            self._count('completed')
+            logger.info(f"生成任务 {job.id} 完成")
+        except RetryLater as e:
+            if job.attempts >= self.max_attempts:
+                job.update(status='failed', error=str(e), finished_at=time.time())
+                self._count('failed')
+                logger.error(f"生成任务 {job.id} 重试 {job.attempts} 次后仍失败: {str(e)}")
+            else:
+                job.update(status='retrying', error=str(e), retry_at=time.time() + e.retry_after)
+                self._count('retries')
+                timer = threading.Timer(e.retry_after, self._requeue, args=(job,))
+                timer.daemon = True
+                timer.start()
+                logger.warning(f"生成任务 {job.id} 将在 {e.retry_after:.1f} 秒后重试")
+        except Exception as e:
+            logger.error(f"生成任务 {job.id} 失败: {str(e)}")
+            logger.debug(f"详细错误: {traceback.format_exc()}")
+            job.update(status='failed', error=str(e), finished_at=time.time())
+            self._count('failed')
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._run_total += time.time() - started
+                self._run_count += 1
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """队列深度与吞吐统计"""
+        with self._lock:
+            active = self._active()
+            per_client: Dict[str, int] = {}
+            for job in active:
+                per_client[job.client_id] = per_client.get(job.client_id, 0) + 1
+            return dict(
+                self.counters,
+                workers=self.workers,
+                queue_depth=sum(1 for j in active if j.status == 'queued'),
+                running=self._running,
+                retrying=sum(1 for j in active if j.status == 'retrying'),
+                max_queue=self.max_queue,
+                per_client_limit=self.per_client_limit,
+                active_per_client=per_client,
+                avg_queue_wait_s=round(self._queue_wait_total / self._started, 3) if self._started else 0.0,
+                avg_run_s=round(self._run_total / self._run_count, 3) if self._run_count else 0.0,
+            )
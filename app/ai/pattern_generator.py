@@ -1,24 +1,34 @@
-import requests
 import os
 from PIL import Image
 import io
-from functools import lru_cache
+import json
+from typing import Any, Callable, Dict, List, Optional
 import logging
 import base64
 import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from ai.api_client import RetryLater
+from ai.generation_backends import GenerationBackend, create_backend
+from ai.generation_cache import GenerationCache, MemoryGenerationCache, make_generation_key
+from metrics import timed
 
 logger = logging.getLogger(__name__)
 
+# 单次请求允许的最大候选数（Stability AI 的上限）
+MAX_SAMPLES = 10
+
 class PatternGenerator:
-    def __init__(self):
-        self.api_key = os.getenv("STABLE_DIFFUSION_API_KEY")
-        if not self.api_key:
-            logging.warning("未在.env文件中找到 STABLE_DIFFUSION_API_KEY，部分功能将不可用。")
-        self.api_url = "https://api.stability.ai/v1/generation/stable-diffusion-xl-1024-v1-0/text-to-image"
-        self.max_retries = 1  # 增加重试次数
-        self.retry_delay = 30  # 秒
-        self.timeout = 120  # 增加超时时间
+    def __init__(self, cache: Optional[GenerationCache] = None,
+                 backend: Optional[GenerationBackend] = None):
+        # 生成结果缓存，默认为进程内 LRU
+        self.cache = cache if cache is not None else MemoryGenerationCache(max_entries=100)
+        # 生成后端：Stability AI 或本地程序化生成，由 PATTERN_BACKEND 选择
+        self.backend = backend if backend is not None else create_backend()
+        # 多候选图片的后处理线程池
+        self._process_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 4,
+                                                thread_name_prefix='pattern-process')
+        self.batch_max_wait = 60.0  # 批量生成时单次重试的最长等待（秒）
 
     def _process_image(self, image_data: str) -> str:
         """处理生成的图片，确保适合剪纸绘制
@@ -59,136 +69,156 @@ class PatternGenerator:
             logger.error(f"详细错误: {traceback.format_exc()}")
             raise
 
-    @lru_cache(maxsize=100)
-    def generate(self, prompt: str) -> str:
+    def generate(self, prompt: str, cfg_scale: float = 7, steps: int = 30,
+                 style_preset: str = "line-art", width: int = 1024, height: int = 1024,
+                 seed: int = 0) -> str:
         """根据文本提示生成剪纸图案
         
         参数：
             prompt: 所需图案的文本描述
+            cfg_scale: 提示词引导强度
+            steps: 采样步数
+            style_preset: 风格预设
+            width: 图片宽度
+            height: 图片高度
+            seed: 随机种子（0 表示由服务端随机）
             
         返回：
             str: Base64 编码的图片数据
             
         异常：
+            RetryLater: 远程 API 暂时不可用，应在 retry_after 秒后重试
             Exception: 如果生成失败
         """
+        return self.generate_samples(prompt, 1, cfg_scale=cfg_scale, steps=steps,
+                                     style_preset=style_preset, width=width,
+                                     height=height, seed=seed)[0]
+
+    def generate_samples(self, prompt: str, samples: int = 4, cfg_scale: float = 7,
+                         steps: int = 30, style_preset: str = "line-art", width: int = 1024,
+                         height: int = 1024, seed: int = 0) -> List[str]:
+        """一次请求生成同一提示词的多个候选图案
+
+        参数：
+            prompt: 所需图案的文本描述
+            samples: 候选数量（1-10）
+            其余参数同 generate
+
+        返回：
+            List[str]: Base64 编码的图片数据列表
+        """
         if not prompt or not isinstance(prompt, str):
             raise ValueError("无效的提示词: 必须为非空字符串")
-            
-        for attempt in range(self.max_retries):
+        if not 1 <= samples <= MAX_SAMPLES:
+            raise ValueError(f"候选数量必须在 1 到 {MAX_SAMPLES} 之间")
+
+        params = {
+            'cfg_scale': cfg_scale,
+            'steps': steps,
+            'style_preset': style_preset,
+            'width': width,
+            'height': height,
+            'seed': seed,
+        }
+        with timed('generator', 'total'):
+            if not self.backend.cacheable:
+                return self._generate_uncached(prompt, params, samples)
+            # 规范化提示词与全部参数（含后端标识）共同决定缓存键
+            if samples == 1:
+                key = make_generation_key(prompt, dict(params, model=self.backend.identity))
+                return [self.cache.get_or_create(key, lambda: self._generate_uncached(prompt, params, 1)[0])]
+            key = make_generation_key(prompt, dict(params, model=self.backend.identity, samples=samples))
+            cached = self.cache.get_or_create(
+                key, lambda: json.dumps(self._generate_uncached(prompt, params, samples)))
+            return json.loads(cached)
+
+    def _generate_with_retry(self, prompt: str, samples: int, options: Dict[str, Any],
+                             max_attempts: int) -> List[str]:
+        """批量生成的单个提示词：在后台线程中按 Retry-After 等待并重试"""
+        for attempt in range(1, max_attempts + 1):
             try:
-                logger.info(f"为提示词生成图案: {prompt} (第 {attempt + 1}/{self.max_retries} 次尝试)")
-                
-                # 构建增强提示词（保留英文内容）
-                enhanced_prompt = f"""
-                A traditional Chinese paper cutting pattern of {prompt},
-                clean and precise lines,
-                very very easy,
-                suitable for paper cutting,
-                black and white,
-                high contrast,
-                vector style,
-                symmetrical design,
-                traditional Chinese art style,
-                detailed edges,
-                no shading,
-                no gradients,
-                single layer design,
-                suitable for cutting with scissors,
-                clear cutting lines,
-                traditional paper cutting technique,
-                cultural elements,
-                decorative pattern
-                """
-
-                headers = {
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json",
-                    "Accept": "application/json"
-                }
-
-                body = {
-                    "text_prompts": [
-                        {
-                            "text": enhanced_prompt,
-                            "weight": 1
-                        },
-                        {
-                            "text": "photorealistic, 3d, shading, gradient, multiple layers, complex background, blurry, low contrast, modern style, digital art, painting, sketch, watercolor, oil painting, realistic, detailed shading, multiple colors, complex textures",
-                            "weight": -1
-                        }
-                    ],
-                    "cfg_scale": 7,
-                    "height": 1024,
-                    "width": 1024,
-                    "samples": 1,
-                    "steps": 30,
-                    "style_preset": "line-art"
-                }
-
-                logger.debug(f"发送请求到 Stability AI API")
-                logger.debug(f"请求 URL: {self.api_url}")
-                
-                response = requests.post(
-                    self.api_url,
-                    headers=headers,
-                    json=body,
-                    timeout=self.timeout
-                )
-                
-                logger.debug(f"响应状态码: {response.status_code}")
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if "artifacts" in data and len(data["artifacts"]) > 0:
-                        image_data = data["artifacts"][0]["base64"]
-                        logger.info("成功生成图案")
-                        
-                        # 处理图片
-                        processed_image = self._process_image(image_data)
-                        logger.info("成功处理图案图片")
-                        return processed_image
-                    else:
-                        error_msg = "响应中无图片数据"
-                        logger.error(error_msg)
-                        logger.debug(f"响应数据: {data}")
-                        raise Exception(error_msg)
-                elif response.status_code == 401:
-                    error_msg = "API 认证失败，请检查 API 密钥。"
-                    logger.error(error_msg)
-                    raise Exception(error_msg)
-                elif response.status_code == 429:
-                    error_msg = "API 速率限制超出，请稍后再试。"
-                    logger.error(error_msg)
-                    if attempt < self.max_retries - 1:
-                        time.sleep(self.retry_delay * (attempt + 1))
-                        continue
-                    raise Exception(error_msg)
-                else:
-                    error_msg = f"API 请求失败，状态码 {response.status_code}: {response.text}"
-                    logger.error(error_msg)
-                    raise Exception(error_msg)
-                    
-            except requests.exceptions.Timeout:
-                error_msg = "API 请求超时"
-                logger.error(error_msg)
-                if attempt < self.max_retries - 1:
-                    time.sleep(self.retry_delay * (attempt + 1))
-                    continue
-                raise Exception(error_msg)
-            except requests.exceptions.RequestException as e:
-                error_msg = f"API 请求失败: {str(e)}"
-                logger.error(error_msg)
-                if attempt < self.max_retries - 1:
-                    time.sleep(self.retry_delay * (attempt + 1))
-                    continue
-                raise Exception(error_msg)
-            except Exception as e:
-                logger.error(f"图案生成出错: {str(e)}")
-                logger.error(f"详细错误: {traceback.format_exc()}")
-                if attempt < self.max_retries - 1:
-                    time.sleep(self.retry_delay * (attempt + 1))
+                return self.generate_samples(prompt, samples, **options)
+            except RetryLater as e:
+                if attempt == max_attempts:
+                    raise
+                logger.warning(f"提示词 '{prompt}' 第 {attempt} 次生成被推迟，{e.retry_after:.1f} 秒后重试")
+                time.sleep(min(e.retry_after, self.batch_max_wait))
+
+    def generate_batch(self, prompts: List[str], samples: int = 1, max_concurrency: int = 4,
+                       max_attempts: int = 5,
+                       scorer: Optional[Callable[[str], Dict[str, Any]]] = None,
+                       **options) -> Dict[str, Any]:
+        """为多个提示词并发生成候选图案
+
+        并发数受 max_concurrency 限制，实际请求速率还受 ApiClient 的速率预算约束；
+        被推迟的请求在批处理线程内按 Retry-After 重试，因此应在后台任务中调用。
+
+        参数：
+            prompts: 提示词列表
+            samples: 每个提示词的候选数量
+            max_concurrency: 同时进行的远程请求数
+            max_attempts: 每个提示词的最多尝试次数
+            scorer: 可选的评分函数，输入 Base64 图片，返回包含 score 的字典，
+                分数越低越适合剪纸；提供时候选按分数排序
+            options: 传给 generate_samples 的其他参数
+
+        返回：
+            Dict: candidates（候选列表）与 errors（失败的提示词）
+        """
+        if not prompts:
+            raise ValueError("提示词列表不能为空")
+        candidates = []
+        errors = []
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(prompts))),
+                                thread_name_prefix='generation-batch') as executor:
+            futures = {
+                executor.submit(self._generate_with_retry, prompt, samples, options, max_attempts): prompt
+                for prompt in prompts
+            }
+            for future in as_completed(futures):
+                prompt = futures[future]
+                try:
+                    images = future.result()
+                except Exception as e:
+                    logger.error(f"提示词 '{prompt}' 批量生成失败: {str(e)}")
+                    errors.append({'prompt': prompt, 'error': str(e)})
                     continue
-                raise
-                
-        raise Exception("所有重试后仍未成功生成图案") 
\ No newline at end of file
+                for index, image in enumerate(images):
+                    candidates.append({'prompt': prompt, 'sample': index, 'image': image})
+
+            if scorer is not None and candidates:
+                scores = executor.map(lambda c: self._safe_score(scorer, c['image']), candidates)
+                for candidate, score in zip(candidates, scores):
+                    candidate['ranking'] = score
+                candidates.sort(key=lambda c: (c['ranking'].get('score') is None,
+                                               c['ranking'].get('score') or 0))
+
+        order = {prompt: i for i, prompt in enumerate(prompts)}
+        if scorer is None:
+            candidates.sort(key=lambda c: (order[c['prompt']], c['sample']))
+        errors.sort(key=lambda e: order[e['prompt']])
+        logger.info(f"批量生成完成: {len(candidates)} 个候选, {len(errors)} 个提示词失败")
+        return {'candidates': candidates, 'errors': errors}
+
+    @staticmethod
+    def _safe_score(scorer: Callable[[str], Dict[str, Any]], image: str) -> Dict[str, Any]:
+        try:
+            return scorer(image)
+        except Exception as e:
+            logger.warning(f"候选评分失败: {str(e)}")
+            return {'score': None, 'error': str(e)}
+
+    def _generate_uncached(self, prompt: str, params: Dict[str, Any], samples: int = 1) -> List[str]:
+        """调用生成后端并处理图片（不经过缓存）"""
+        logger.info(f"为提示词生成图案: {prompt}（后端: {self.backend.name}）")
+        with timed('generator', 'backend'):
+            artifacts = self.backend.generate(prompt, params, samples)
+
+        # 多个候选并行处理图片
+        with timed('generator', 'postprocess'):
+            if len(artifacts) == 1:
+                processed_images = [self._process_image(artifacts[0])]
+            else:
+                processed_images = list(self._process_pool.map(self._process_image, artifacts))
+        logger.info("成功处理图案图片")
+        return processed_images
@@ -1,21 +1,43 @@
 import cv2
 import numpy as np
-from PIL import Image, ImageDraw, ImageFont
-import io
+from PIL import Image
 import base64
-import math
 import logging
 import traceback
-import svgwrite
-from typing import List, Dict, Tuple, Any
+from typing import IO, Iterator, List, Dict, Tuple, Any, Union, Optional
+from ai.analysis_cache import AnalysisCache
+from ai.svg_writer import SvgWriter
+from ai.step_format import format_result, pack_contours, unpack_contours
+from metrics import timed
 
 # 配置日志记录
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 分析结果格式版本，输出内容变化时递增以使旧缓存失效
+RESULT_VERSION = 4
+
+# 可视化中各部分路径轮流使用的颜色（RGB）
+VIZ_CONTOUR_COLORS = (
+    (255, 0, 0),    # 红色
+    (0, 100, 0),    # 绿色
+    (0, 0, 255),    # 蓝色
+    (128, 0, 128),  # 紫色
+    (255, 165, 0),  # 橙色
+)
+
+# 按 45° 划分的八个方向，索引 0 为向右（0°），顺时针（图像坐标 y 轴向下）
+DIRECTIONS = ("向右", "向右下", "向下", "向左下", "向左", "向左上", "向上", "向右上")
+
+
 class StepAnalyzer:
-    def __init__(self):
-        """初始化 StepAnalyzer"""
+    def __init__(self, cache: Optional[AnalysisCache] = None):
+        """初始化 StepAnalyzer
+
+        参数：
+            cache: 可选的分析结果缓存
+        """
+        self.cache = cache
         # 图像处理参数
         self.target_size = 800  # 图像处理的目标尺寸
         
@@ -38,28 +60,63 @@ class StepAnalyzer:
         self.viz_stroke_width = 3  # 可视化线宽
         self.arrow_length = 25  # 箭头长度
         self.min_segment_length = 10  # 最小线段长度
-        self.font = ImageFont.truetype("arial.ttf", 12)
 
     def _get_direction_description(self, angle: float) -> str:
         """获取人类可读的方向描述"""
-        angle = angle % 360
-        
-        if 337.5 <= angle or angle < 22.5:
-            return "向右"
-        elif 22.5 <= angle < 67.5:
-            return "向右下"
-        elif 67.5 <= angle < 112.5:
-            return "向下"
-        elif 112.5 <= angle < 157.5:
-            return "向左下"
-        elif 157.5 <= angle < 202.5:
-            return "向左"
-        elif 202.5 <= angle < 247.5:
-            return "向左上"
-        elif 247.5 <= angle < 292.5:
-            return "向上"
-        else:  # 292.5 到 337.5
-            return "向右上"
+        return DIRECTIONS[int(((angle % 360) + 22.5) // 45) % 8]
+
+    @staticmethod
+    def _corner_indices(points: np.ndarray, corners: np.ndarray) -> np.ndarray:
+        """返回 approxPolyDP 角点在原轮廓中的索引（升序，去掉相邻重复）
+
+        approxPolyDP 输出的是原轮廓点的子集，因此可以按坐标精确查找：
+        把 (x, y) 编码成一个整数键，稳定排序后用 searchsorted 批量定位，
+        重复坐标取最早出现的索引（与逐点求最近距离的结果一致）。
+        """
+        keys = (points[:, 0].astype(np.int64) << 32) | (points[:, 1].astype(np.int64) & 0xFFFFFFFF)
+        corner_keys = (corners[:, 0].astype(np.int64) << 32) | (corners[:, 1].astype(np.int64) & 0xFFFFFFFF)
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        pos = np.minimum(np.searchsorted(sorted_keys, corner_keys), len(keys) - 1)
+        indices = order[pos]
+        missing = sorted_keys[pos] != corner_keys
+        if missing.any():
+            # 理论上不会发生；保底按最近距离查找
+            diff = points[None, :, :] - corners[missing][:, None, :]
+            indices[missing] = np.argmin((diff.astype(np.int64) ** 2).sum(axis=2), axis=1)
+        keep = np.ones(len(indices), dtype=bool)
+        keep[1:] = indices[1:] != indices[:-1]
+        return np.sort(indices[keep])
+
+    @staticmethod
+    def _stroke_metrics(points: np.ndarray, corner_indices: np.ndarray) -> Dict[str, np.ndarray]:
+        """批量计算相邻角点之间每条笔画的度量（封闭轮廓，最后一笔回到第一个角点）
+
+        返回：
+            start（起点索引）、count（点数）、length（路径长度）、direct（首尾直线距离）、
+            dx / dy（首尾位移）与 direction（DIRECTIONS 中的方向索引）
+        """
+        n = len(points)
+        closed = np.vstack((points, points[:1])).astype(np.float64)
+        # cumulative[k] 为沿轮廓从第 0 点走到第 k 点的长度，cumulative[n] 为周长
+        cumulative = np.concatenate(([0.0], np.cumsum(np.hypot(*np.diff(closed, axis=0).T))))
+        start = corner_indices
+        end = np.roll(corner_indices, -1)
+        wrap = end <= start
+        length = cumulative[end] - cumulative[start] + np.where(wrap, cumulative[n], 0.0)
+        count = end - start + 1 + np.where(wrap, n, 0)
+        delta = points[end].astype(np.float64) - points[start]
+        dx, dy = delta[:, 0], delta[:, 1]
+        angle = np.degrees(np.arctan2(dy, dx)) % 360
+        return {
+            'start': start,
+            'count': count,
+            'length': length,
+            'direct': np.hypot(dx, dy),
+            'dx': dx,
+            'dy': dy,
+            'direction': ((angle + 22.5) // 45).astype(np.int64) % 8,
+        }
 
     def _get_direction_angle(self, direction: str) -> float:
         """将方向描述转换为角度"""
@@ -75,273 +132,364 @@ class StepAnalyzer:
         }
         return directions.get(direction, 0)
 
-    def _convert_to_python_types(self, data: Any) -> Any:
-        """递归地将 numpy 类型转换为原生 Python 类型以便 JSON 序列化。"""
-        if isinstance(data, dict):
-            return {key: self._convert_to_python_types(value) for key, value in data.items()}
-        elif isinstance(data, list):
-            return [self._convert_to_python_types(element) for element in data]
-        elif isinstance(data, tuple):
-            return tuple(self._convert_to_python_types(element) for element in data)
-        elif isinstance(data, np.integer):
-            return int(data)
-        elif isinstance(data, np.floating):
-            return float(data)
-        elif isinstance(data, np.ndarray):
-            return data.tolist()
-        return data
+    @staticmethod
+    def decode_image(image_bytes: bytes) -> np.ndarray:
+        """把编码后的图像字节直接解码为 RGB 数组
+
+        异常：
+            ValueError: 数据为空或无法解码
+        """
+        if not image_bytes:
+            raise ValueError("图像数据为空")
+        buffer = np.frombuffer(image_bytes, dtype=np.uint8)
+        image_bgr = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+        if image_bgr is None or image_bgr.size == 0:
+            raise ValueError("图像数据无效")
+        return cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
+
+    def _prepare_image(self, image: Union[bytes, Image.Image, np.ndarray]) -> np.ndarray:
+        """把字节、PIL 图像或 RGB 数组统一为缩放后的 RGB 数组"""
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            image_np = self.decode_image(bytes(image))
+        elif isinstance(image, Image.Image):
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            image_np = np.asarray(image)
+        elif isinstance(image, np.ndarray):
+            image_np = image
+            if image_np.ndim == 2:
+                image_np = cv2.cvtColor(image_np, cv2.COLOR_GRAY2RGB)
+            elif image_np.shape[2] == 4:
+                image_np = image_np[:, :, :3]
+        else:
+            raise TypeError(f"不支持的图像类型: {type(image)}")
+
+        height, width = image_np.shape[:2]
+        if width == 0 or height == 0:
+            raise ValueError("图像尺寸无效")
+        # 与 PIL thumbnail 相同：保持宽高比，只缩小不放大
+        ratio = min(self.target_size / width, self.target_size / height)
+        if ratio < 1:
+            new_size = (max(1, round(width * ratio)), max(1, round(height * ratio)))
+            image_np = cv2.resize(image_np, new_size, interpolation=cv2.INTER_AREA)
+        return np.ascontiguousarray(image_np, dtype=np.uint8)
+
+    def _cache_params(self) -> Dict[str, Any]:
+        """影响分析结果的全部参数，作为缓存键的一部分"""
+        return {
+            'target_size': self.target_size,
+            'min_contour_area': self.min_contour_area,
+            'epsilon_factor': self.epsilon_factor,
+            'low_threshold_ratio': self.low_threshold_ratio,
+            'high_threshold_ratio': self.high_threshold_ratio,
+            'svg': [self.svg_width, self.svg_height, self.svg_padding, self.svg_stroke_width],
+            'viz_stroke_width': self.viz_stroke_width,
+            'version': RESULT_VERSION,
+        }
+
+    @staticmethod
+    def _finalize_result(result: Dict[str, Any], binary_artifacts: bool,
+                         steps_format: str = 'compact') -> Dict[str, Any]:
+        """按 steps_format 生成对外结果（不修改缓存中的结果），按需把可视化编码为 base64"""
+        result = format_result(result, steps_format, binary_artifacts)
+        if not binary_artifacts and isinstance(result.get('visualization'), bytes):
+            result['visualization'] = base64.b64encode(result['visualization']).decode()
+        return result
+
+    def _detect_edges(self, image_np: np.ndarray) -> np.ndarray:
+        """灰度 + 高斯模糊 + 按中值自适应阈值的 Canny 边缘检测"""
+        gray = cv2.cvtColor(image_np, cv2.COLOR_RGB2GRAY)
+        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+
+        # 应用 Canny 边缘检测
+        v = np.median(blurred)
+        low_threshold = int(max(0, (1.0 - self.low_threshold_ratio) * v))
+        high_threshold = int(min(255, (1.0 + self.high_threshold_ratio) * v))
+        logger.info(f"使用 Canny 阈值: Low={low_threshold}, High={high_threshold}")
+        return cv2.Canny(blurred, low_threshold, high_threshold)
+
+    @staticmethod
+    def _trace_contours(edges: np.ndarray) -> Tuple[List[np.ndarray], Optional[np.ndarray]]:
+        """从边缘图提取全部轮廓及其层级"""
+        contours, hierarchy = cv2.findContours(
+            edges,
+            cv2.RETR_TREE,
+            cv2.CHAIN_APPROX_NONE  # 更详细的轮廓
+        )
+        return list(contours), hierarchy
+
+    def _find_contours(self, image_np: np.ndarray) -> Tuple[List[np.ndarray], Optional[np.ndarray]]:
+        """边缘检测后提取全部轮廓及其层级"""
+        return self._trace_contours(self._detect_edges(image_np))
+
+    def cutting_complexity(self, image: Union[bytes, Image.Image, np.ndarray]) -> Dict[str, Any]:
+        """估算图案的剪裁难度，只做轮廓提取，不生成 SVG 和可视化
+
+        返回：
+            Dict[str, Any]: contours（轮廓数）、points（轮廓点总数）与 score
+            （轮廓越少越适合剪纸；没有轮廓的图案无法剪裁，score 为 None）
+        """
+        contours, _ = self._find_contours(self._prepare_image(image))
+        return {
+            'contours': len(contours),
+            'points': int(sum(len(c) for c in contours)),
+            'score': len(contours) or None,
+        }
+
+    @property
+    def svg_writer(self) -> SvgWriter:
+        return SvgWriter(self.svg_width, self.svg_height, self.svg_stroke_width)
+
+    @staticmethod
+    def _order_contours(contours: List[np.ndarray], hierarchy: np.ndarray) -> Tuple[List[float], List[Tuple]]:
+        """计算轮廓面积并按由内到外的顺序排列
+
+        返回：
+            (面积列表, 排序后的 (轮廓索引, 轮廓, 层级信息) 列表)
+        """
+        areas = [cv2.contourArea(c) for c in contours]
+        # 创建元组列表 (contour_index, contour, hierarchy_info)
+        contour_info = [(i, contours[i], hierarchy[0][i]) for i in range(len(contours))]
+
+        # 排序轮廓：先洞，后父轮廓，再按面积（小的在前）
+        # 这样可以实现由内到外的绘制顺序
+        contour_info.sort(key=lambda item: (item[2][3] == -1, item[2][3], areas[item[0]]))
+        return areas, contour_info
+
+    def _svg_paths(self, contours: List[np.ndarray], areas: List[float],
+                   contour_info: List[Tuple]) -> Iterator[Tuple[np.ndarray, str]]:
+        """产生 (缩放后的坐标数组, 描边颜色)，跳过面积小于 min_contour_area 的轮廓"""
+        all_points = np.vstack(contours).reshape(-1, 2)
+        _, _, w, h = cv2.boundingRect(all_points)
+        scale_x = (self.svg_width - 2 * self.svg_padding) / w
+        scale_y = (self.svg_height - 2 * self.svg_padding) / h
+        scale = min(scale_x, scale_y)
+
+        # 计算偏移量以居中图案
+        offset = np.array([(self.svg_width - w * scale) / 2, (self.svg_height - h * scale) / 2])
+        scaled = all_points * scale + offset
+        bounds = np.concatenate(([0], np.cumsum([len(c) for c in contours])))
+
+        for i, _, hier in contour_info:
+            if areas[i] < self.min_contour_area:
+                continue
+            is_hole = hier[3] != -1
+            yield scaled[bounds[i]:bounds[i + 1]], ('black' if not is_hole else 'gray')
+
+    def _build_steps(self, areas: List[float],
+                     contour_info: List[Tuple]) -> Tuple[List[Dict[str, Any]], List[np.ndarray]]:
+        """按排序后的轮廓生成步骤，面积小于 min_contour_area 的轮廓跳过
+
+        返回：
+            (步骤列表, 每个部分的 Nx2 轮廓点)，部分的 contour_id = 部分序号 - 1
+        """
+        all_steps = []
+        part_contours = []
+        contour_index = 0
+        for i, contour, hier in contour_info:
+            if areas[i] < self.min_contour_area:
+                continue
+
+            contour_index += 1
+            points = contour.reshape(-1, 2)
+            part_contours.append(points)
+            all_steps.append({
+                'step': len(all_steps) + 1,
+                'description': f"开始处理第 {contour_index} 部分",
+                'type': 'start',
+                'contour_index': contour_index
+            })
+
+            # --- 笔画分段：角点索引 + 批量笔画度量 ---
+            perimeter = cv2.arcLength(contour, True)
+            corners = cv2.approxPolyDP(contour, self.epsilon_factor * perimeter, True)
+
+            if len(corners) < 2:
+                continue
+
+            corner_indices = self._corner_indices(points, corners.reshape(-1, 2))
+            strokes = self._stroke_metrics(points, corner_indices)
+            n = len(points)
+
+            end_indices = (strokes['start'] + strokes['count'] - 1) % n
+            point_list = points.tolist()
+
+            for start_idx, end_idx, path_length, direct_dist, direction_idx in zip(
+                    strokes['start'].tolist(), end_indices.tolist(),
+                    strokes['length'].tolist(), strokes['direct'].tolist(),
+                    strokes['direction'].tolist()):
+
+                shape_type = "直线" if path_length < direct_dist * 1.1 else "曲线"
+                length_desc = "长" if path_length > 80 else ("短" if path_length < 30 else "")
+                direction = DIRECTIONS[direction_idx]
+
+                description = f"沿{direction}切一条{length_desc}{shape_type}"
+
+                all_steps.append({
+                    'step': len(all_steps) + 1,
+                    'description': description,
+                    'start_point': tuple(point_list[start_idx]),
+                    'end_point': tuple(point_list[end_idx]),
+                    'type': 'draw',
+                    'length': path_length,
+                    'direction': direction,
+                    'contour_index': contour_index,
+                    'path': [contour_index - 1, start_idx, end_idx]  # 用于 UI 高亮
+                })
+
+            all_steps.append({
+                'step': len(all_steps) + 1,
+                'description': f"完成第 {contour_index} 部分",
+                'type': 'end',
+                'contour_index': contour_index
+            })
+        return all_steps, part_contours
+
+    def write_svg(self, image: Union[bytes, Image.Image, np.ndarray], fp: IO[str]) -> int:
+        """只提取轮廓并把 SVG 直接分块写入文件对象，不生成步骤与可视化
+
+        返回：
+            int: 写入的字符数，未找到轮廓时为 0
+        """
+        contours, hierarchy = self._find_contours(self._prepare_image(image))
+        if not contours:
+            logger.warning("未找到轮廓")
+            return 0
+        areas, contour_info = self._order_contours(contours, hierarchy)
+        return self.svg_writer.write(fp, self._svg_paths(contours, areas, contour_info))
+
+    def render_visualization(self, image_np: np.ndarray, result: Dict[str, Any]) -> bytes:
+        """在原图上绘制各部分的切割路径与起止点，返回 PNG 字节
+
+        每个部分的绘制步骤首尾相接覆盖整条轮廓，因此直接从共享的轮廓数组
+        画一条封闭折线，再标出首个绘制步骤的起点和最后一个的终点。
+        """
+        # 每个部分：首个 / 最后一个绘制步骤（保持步骤中出现的顺序）
+        parts: "Dict[int, Dict[str, Any]]" = {}
+        for step in result['steps']:
+            if step.get('type') != 'draw':
+                continue
+            part = parts.get(step['contour_index'])
+            if part is None:
+                part = parts[step['contour_index']] = {'first': step}
+            part['last'] = step
+
+        contours = unpack_contours(result['contour_data'], result['contour_offsets'])
+        canvas = np.ascontiguousarray(image_np.copy())
+        for contour_idx, part in parts.items():
+            color = VIZ_CONTOUR_COLORS[(contour_idx - 1) % len(VIZ_CONTOUR_COLORS)]
+            self._draw_marker(canvas, part['first']['start_point'], (0, 255, 0), (0, 150, 0))
+            cv2.polylines(canvas, [contours[part['first']['path'][0]]], True, color, self.viz_stroke_width)
+            self._draw_marker(canvas, part['last']['end_point'], (255, 50, 50), (150, 0, 0))
+
+        # 画布为 RGB，cv2 编码需要 BGR
+        ok, png = cv2.imencode('.png', cv2.cvtColor(canvas, cv2.COLOR_RGB2BGR))
+        if not ok:
+            raise ValueError("可视化图像编码失败")
+        return png.tobytes()
+
+    @staticmethod
+    def _draw_marker(canvas: np.ndarray, point, fill: Tuple[int, int, int],
+                     outline: Tuple[int, int, int]) -> None:
+        center = (int(point[0]), int(point[1]))
+        cv2.circle(canvas, center, 6, fill, -1, cv2.LINE_AA)
+        cv2.circle(canvas, center, 6, outline, 2, cv2.LINE_AA)
 
     def analyze(self, image_data: str) -> Dict[str, Any]:
-        """分析图像并生成绘图指令"""
+        """分析 base64 编码（可带 data URL 前缀）的图像并生成绘图指令"""
+        if not image_data:
+            return {}
+        try:
+            if ',' in image_data:
+                image_data = image_data.split(',')[1]
+            image_bytes = base64.b64decode(image_data)
+        except Exception as e:
+            logger.error(f"图像处理失败: {str(e)}")
+            return {}
+        return self.analyze_image(image_bytes)
+
+    def analyze_image(self, image: Union[bytes, Image.Image, np.ndarray],
+                      binary_artifacts: bool = False, visualization: bool = True,
+                      steps_format: str = 'compact') -> Dict[str, Any]:
+        """分析图像并生成绘图指令
+
+        绘制步骤不再各自携带坐标列表，而是通过 path = [contour_id, start_idx, end_idx]
+        引用结果中共享的轮廓点数组（contours），见 ai.step_format。
+
+        参数：
+            image: 编码后的图像字节、PIL 图像或 RGB 数组（HxWx3, uint8）
+            binary_artifacts: 为 True 时 visualization 返回 PNG 原始字节而非 base64，
+                contours 的 data 为 int16 原始字节
+            visualization: 为 False 时跳过可视化 PNG 的绘制与编码，结果中不含 visualization
+            steps_format: compact / packed / lean / full，见 ai.step_format.STEP_FORMATS
+        """
         try:
             logger.info("开始图像分析")
             
-            if not image_data:
-                return {}
-            
             try:
-                # 处理图像数据
-                if ',' in image_data:
-                    image_data = image_data.split(',')[1]
-                
-                image_bytes = base64.b64decode(image_data)
-                image = Image.open(io.BytesIO(image_bytes))
-                
-                if image.mode != 'RGB':
-                    image = image.convert('RGB')
-                
-                image.thumbnail((self.target_size, self.target_size))
-                image_np = np.array(image)
+                with timed('analyzer', 'decode'):
+                    image_np = self._prepare_image(image)
                 logger.info(f"处理后的图像尺寸: {image_np.shape}")
-                
             except Exception as e:
                 logger.error(f"图像处理失败: {str(e)}")
                 return {}
+
+            cache_key = None
+            if self.cache is not None:
+                with timed('analyzer', 'cache_lookup'):
+                    cache_key = self.cache.make_key(image_np, self._cache_params())
+                    cached = self.cache.get(cache_key)
+                if cached is not None:
+                    logger.info("命中分析缓存")
+                    if visualization and 'visualization' not in cached:
+                        # 之前的请求跳过了可视化，按缓存的步骤补绘
+                        cached = dict(cached, visualization=self.render_visualization(image_np, cached))
+                        self.cache.put(cache_key, cached)
+                    elif not visualization and 'visualization' in cached:
+                        cached = {key: value for key, value in cached.items() if key != 'visualization'}
+                    with timed('analyzer', 'format'):
+                        return self._finalize_result(cached, binary_artifacts, steps_format)
             
-            # 转为灰度并高斯模糊
-            gray = cv2.cvtColor(image_np, cv2.COLOR_RGB2GRAY)
-            blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-
-            # 应用 Canny 边缘检测
-            v = np.median(blurred)
-            low_threshold = int(max(0, (1.0 - self.low_threshold_ratio) * v))
-            high_threshold = int(min(255, (1.0 + self.high_threshold_ratio) * v))
-            logger.info(f"使用 Canny 阈值: Low={low_threshold}, High={high_threshold}")
-            edges = cv2.Canny(blurred, low_threshold, high_threshold)
-            
-            # 查找轮廓
-            contours, hierarchy = cv2.findContours(
-                edges,
-                cv2.RETR_TREE,
-                cv2.CHAIN_APPROX_NONE  # 更详细的轮廓
-            )
+            with timed('analyzer', 'edges'):
+                edges = self._detect_edges(image_np)
+            with timed('analyzer', 'contours'):
+                contours, hierarchy = self._trace_contours(edges)
             
             if not contours:
                 logger.warning("未找到轮廓")
                 return {}
             
-            # 创建 SVG 绘图对象
-            svg_drawing = svgwrite.Drawing(
-                size=(self.svg_width, self.svg_height),
-                viewBox=f"0 0 {self.svg_width} {self.svg_height}"
-            )
-            svg_drawing.add(svg_drawing.rect(
-                insert=(0, 0),
-                size=('100%', '100%'),
-                fill='white'
-            ))
-            
-            # 处理轮廓
-            all_steps = []
-            contour_index = 0
-            
-            # 计算缩放因子
-            all_points = np.vstack(contours)
-            x, y, w, h = cv2.boundingRect(all_points)
-            scale_x = (self.svg_width - 2 * self.svg_padding) / w
-            scale_y = (self.svg_height - 2 * self.svg_padding) / h
-            scale = min(scale_x, scale_y)
-            
-            # 计算偏移量以居中图案
-            offset_x = (self.svg_width - w * scale) / 2
-            offset_y = (self.svg_height - h * scale) / 2
-            
-            # 使用层级信息处理轮廓，实现由内到外的顺序
-            processed_contours = set()
-            # 创建元组列表 (contour_index, contour, hierarchy_info)
-            contour_info = [(i, contours[i], hierarchy[0][i]) for i in range(len(contours))]
-
-            # 排序轮廓：先洞，后父轮廓，再按面积（小的在前）
-            # 这样可以实现由内到外的绘制顺序
-            contour_info.sort(key=lambda item: (item[2][3] == -1, item[2][3], cv2.contourArea(item[1])))
-
-            for i, contour, hier in contour_info:
-                # 首先将所有轮廓绘制到 SVG
-                path_data = "M "
-                for point in contour:
-                    x = point[0][0] * scale + offset_x
-                    y = point[0][1] * scale + offset_y
-                    path_data += f"{('L' if path_data != 'M ' else '')}{x:.1f},{y:.1f} "
-                path_data += "Z"
-                
-                is_hole = hier[3] != -1
-                stroke_color = 'black' if not is_hole else 'gray'
-                svg_drawing.add(svg_drawing.path(d=path_data, stroke=stroke_color, fill='none', stroke_width=self.svg_stroke_width))
-
-            # 现在，基于排序后的轮廓生成步骤
-            for i, contour, hier in contour_info:
-                area = cv2.contourArea(contour)
-                if area < self.min_contour_area:
-                    continue
-
-                contour_index += 1
-                all_steps.append({
-                    'step': len(all_steps) + 1,
-                    'description': f"开始处理第 {contour_index} 部分",
-                    'type': 'start',
-                    'contour_index': contour_index
-                })
+            areas, contour_info = self._order_contours(contours, hierarchy)
 
-                # --- 新的笔画分段逻辑 ---
-                # 简化轮廓以找到关键角点/顶点
-                perimeter = cv2.arcLength(contour, True)
-                corners = cv2.approxPolyDP(contour, self.epsilon_factor * perimeter, True)
-
-                if len(corners) < 2:
-                    continue
-
-                # 在原始轮廓中查找角点索引
-                corner_indices = []
-                for corner in corners:
-                    # 查找该角点在原始轮廓中的索引
-                    distances = np.sqrt(np.sum((contour - corner) ** 2, axis=2))
-                    index = np.argmin(distances)
-                    if not corner_indices or corner_indices[-1] != index:
-                         corner_indices.append(index)
-                corner_indices.sort()
-
-                # 在角点之间生成笔画
-                for j in range(len(corner_indices)):
-                    start_corner_idx = corner_indices[j]
-                    end_corner_idx = corner_indices[(j + 1) % len(corner_indices)]
-                    
-                    # 提取该笔画的点
-                    if start_corner_idx < end_corner_idx:
-                        stroke_points = contour[start_corner_idx:end_corner_idx + 1]
-                    else: # 封闭笔画时需要首尾拼接
-                        stroke_points = np.vstack((contour[start_corner_idx:], contour[:end_corner_idx+1]))
-
-                    if len(stroke_points) < 2:
-                        continue
-
-                    # 分析该笔画以获得更好的描述
-                    start_point = tuple(stroke_points[0][0])
-                    end_point = tuple(stroke_points[-1][0])
-
-                    dx = end_point[0] - start_point[0]
-                    dy = end_point[1] - start_point[1]
-                    
-                    # 路径长度与直线距离，用于判断曲线/直线
-                    path_length = cv2.arcLength(stroke_points, False)
-                    direct_dist = math.sqrt(dx*dx + dy*dy)
-
-                    shape_type = "直线" if path_length < direct_dist * 1.1 else "曲线"
-                    length_desc = "长" if path_length > 80 else ("短" if path_length < 30 else "")
-                    direction = self._get_direction_description(math.degrees(math.atan2(dy, dx)))
-
-                    description = f"沿{direction}切一条{length_desc}{shape_type}"
-
-                    all_steps.append({
-                        'step': len(all_steps) + 1,
-                        'description': description,
-                        'start_point': start_point,
-                        'end_point': end_point,
-                        'type': 'draw',
-                        'length': path_length,
-                        'direction': direction,
-                        'contour_index': contour_index,
-                        'path_pixels': [tuple(p[0]) for p in stroke_points] # 用于 UI 高亮
-                    })
+            # 将面积足够的轮廓批量缩放后输出为 SVG
+            with timed('analyzer', 'svg'):
+                svg_data = self.svg_writer.to_string(self._svg_paths(contours, areas, contour_info))
 
-                all_steps.append({
-                    'step': len(all_steps) + 1,
-                    'description': f"完成第 {contour_index} 部分",
-                    'type': 'end',
-                    'contour_index': contour_index
-                })
+            # 现在，基于排序后的轮廓生成步骤
+            with timed('analyzer', 'steps'):
+                all_steps, part_contours = self._build_steps(areas, contour_info)
             
             if not all_steps:
                 logger.warning("未生成有效绘图步骤")
                 return {}
             
-            # 生成可视化图像
-            vis_image = image_np.copy()
-            pil_image = Image.fromarray(vis_image)
-            draw = ImageDraw.Draw(pil_image)
-            
-            contour_colors = [
-                (255, 0, 0),    # 红色
-                (0, 100, 0),    # 绿色
-                (0, 0, 255),    # 蓝色
-                (128, 0, 128),  # 紫色
-                (255, 165, 0),  # 橙色
-            ]
-            
-            last_positions = {}
-            
-            for step in all_steps:
-                contour_idx = step.get('contour_index', 0)
-                color_idx = (contour_idx - 1) % len(contour_colors)
-                color = contour_colors[color_idx]
-                
-                if step['type'] == 'start':
-                    # 查找该轮廓的第一个绘制步骤以获取起点
-                    first_draw_step = next((s for s in all_steps if s.get('contour_index') == contour_idx and s.get('type') == 'draw'), None)
-                    if first_draw_step:
-                        point = first_draw_step['start_point']
-                        draw.ellipse([point[0]-6, point[1]-6, point[0]+6, point[1]+6], 
-                                   fill=(0, 255, 0), outline=(0, 150, 0), width=2)
-                        last_positions[contour_idx] = point
-                
-                elif step['type'] == 'draw':
-                    start = step['start_point']
-                    end = step['end_point']
-                    
-                    # 使用 path_pixels 以更精确地在可视化图像上绘制线条
-                    if 'path_pixels' in step and len(step['path_pixels']) > 1:
-                        draw.line(step['path_pixels'], fill=color, width=self.viz_stroke_width)
-                    else:
-                        draw.line([start, end], fill=color, width=self.viz_stroke_width)
-
-                    # 按用户要求，去除步骤注释，保持极简。
-                    
-                    last_positions[contour_idx] = end
-                
-                elif step['type'] == 'end':
-                    # 查找该轮廓的最后一个绘制步骤以获取终点
-                    last_draw_step = next((s for s in reversed(all_steps) if s.get('contour_index') == contour_idx and s.get('type') == 'draw'), None)
-                    if last_draw_step:
-                        point = last_draw_step['end_point']
-                        draw.ellipse([point[0]-6, point[1]-6, point[0]+6, point[1]+6], 
-                                   fill=(255, 50, 50), outline=(150, 0, 0), width=2)
-                        last_positions[contour_idx] = point
-            
-            buffered = io.BytesIO()
-            pil_image.save(buffered, format="PNG")
-            visualization = base64.b64encode(buffered.getvalue()).decode()
-            
-            # 完成 SVG
-            svg_data = svg_drawing.tostring()
-            
             logger.info(f"生成了 {len(all_steps)} 个绘图步骤")
             
+            contour_data, contour_offsets = pack_contours(part_contours)
             result = {
                 'steps': all_steps,
                 'svg_data': svg_data,
-                'visualization': visualization
+                'contour_data': contour_data,
+                'contour_offsets': contour_offsets,
             }
             
-            return self._convert_to_python_types(result)
+            if visualization:
+                with timed('analyzer', 'visualization'):
+                    result['visualization'] = self.render_visualization(image_np, result)
+            if cache_key is not None:
+                self.cache.put(cache_key, result)
+            with timed('analyzer', 'format'):
+                return self._finalize_result(result, binary_artifacts, steps_format)
             
         except Exception as e:
             logger.error(f"分析出错: {str(e)}")
@@ -0,0 +1,101 @@
+import base64
+import logging
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 步骤输出格式：
+#   compact  轮廓以扁平整数列表给出，步骤通过 path 引用（默认）
+#   packed   轮廓打包为 base64 编码的 int16 小端数组
+#   lean     同 packed，步骤只保留 step / type / description / contour_index / path
+#   full     旧格式：每个绘制步骤自带 path_pixels 坐标列表
+STEP_FORMATS = ('compact', 'packed', 'lean', 'full')
+
+# 轮廓坐标的存储类型
+CONTOUR_DTYPE = np.dtype('<i2')
+
+# lean 格式保留的步骤字段
+LEAN_STEP_FIELDS = ('step', 'type', 'description', 'contour_index', 'path')
+
+
+def pack_contours(contours: Sequence[np.ndarray]) -> Tuple[bytes, List[int]]:
+    """把若干 Nx2 轮廓拼成一段 int16 小端字节
+
+    返回：
+        (数据, 偏移量)：第 k 个轮廓的点为 offsets[k] 到 offsets[k + 1] 之间的点
+    """
+    lengths = [len(c) for c in contours]
+    offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64).tolist()
+    if not contours:
+        return b'', offsets
+    flat = np.concatenate([np.asarray(c).reshape(-1, 2) for c in contours])
+    if flat.size and (flat.min() < np.iinfo(CONTOUR_DTYPE).min or flat.max() > np.iinfo(CONTOUR_DTYPE).max):
+        raise ValueError("轮廓坐标超出 int16 范围")
+    return flat.astype(CONTOUR_DTYPE).tobytes(), offsets
+
+
+def unpack_contours(data: bytes, offsets: Sequence[int]) -> List[np.ndarray]:
+    """pack_contours 的逆操作，返回 Nx2 int32 数组列表"""
+    flat = np.frombuffer(data, dtype=CONTOUR_DTYPE).reshape(-1, 2).astype(np.int32)
+    return [flat[offsets[k]:offsets[k + 1]] for k in range(len(offsets) - 1)]
+
+
+def path_points(contour: np.ndarray, path: Sequence[int]) -> np.ndarray:
+    """按步骤的 path = [contour_id, start_idx, end_idx] 取出笔画的点
+
+    笔画从 start_idx 沿轮廓前进到 end_idx（含）；end_idx <= start_idx 时
+    绕过轮廓末尾回到开头，两者相等表示完整走一圈。
+    """
+    _, start, end = path
+    if end > start:
+        return contour[start:end + 1]
+    return np.vstack((contour[start:], contour[:end + 1]))
+
+
+def format_result(result: Dict[str, Any], steps_format: str = 'compact',
+                  binary: bool = False) -> Dict[str, Any]:
+    """把内部分析结果转换为对外的步骤格式
+
+    参数：
+        result: StepAnalyzer 的内部结果（包含 contour_data / contour_offsets）
+        steps_format: STEP_FORMATS 之一
+        binary: 为 True 时 compact / packed / lean 的轮廓数据以原始字节返回
+            （由调用方另行存储，例如作为产物 URL 提供）
+
+    返回：
+        Dict: 新的结果字典，不修改传入的 result
+    """
+    if steps_format not in STEP_FORMATS:
+        raise ValueError(f"不支持的步骤格式: {steps_format}")
+    output = {key: value for key, value in result.items()
+              if key not in ('contour_data', 'contour_offsets')}
+    data = result.get('contour_data', b'')
+    offsets = result.get('contour_offsets', [0])
+
+    if steps_format == 'full':
+        contours = unpack_contours(data, offsets)
+        steps = []
+        for step in result['steps']:
+            if 'path' in step:
+                path = step['path']
+                step = {key: value for key, value in step.items() if key != 'path'}
+                step['path_pixels'] = list(map(tuple, path_points(contours[path[0]], path).tolist()))
+            steps.append(step)
+        output['steps'] = steps
+        return output
+
+    if steps_format == 'lean':
+        output['steps'] = [{key: step[key] for key in LEAN_STEP_FIELDS if key in step}
+                           for step in result['steps']]
+
+    if binary:
+        output['contours'] = {'dtype': 'int16', 'byteorder': 'little', 'offsets': offsets, 'data': data}
+    elif steps_format == 'compact':
+        flat = np.frombuffer(data, dtype=CONTOUR_DTYPE).tolist()
+        output['contours'] = [flat[2 * offsets[k]:2 * offsets[k + 1]] for k in range(len(offsets) - 1)]
+    else:
+        output['contours'] = {'dtype': 'int16', 'byteorder': 'little', 'offsets': offsets,
+                              'data': base64.b64encode(data).decode()}
+    return output
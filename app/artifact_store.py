@@ -0,0 +1,55 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 扩展名与 MIME 类型
+ARTIFACT_TYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+    'json': 'application/json',
+    'gcode': 'text/plain; charset=utf-8',
+    'bin': 'application/octet-stream',
+}
+
+
+class ArtifactStore:
+    """按内容寻址的分析产物存储（可视化 PNG、SVG 等）
+
+    键为内容的 SHA-256 加扩展名，内容不变则 URL 不变，因此可以让浏览器
+    永久缓存。超出容量时按最近最少使用淘汰。
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def put(self, data: bytes, ext: str) -> str:
+        """保存产物，返回内容地址键"""
+        if ext not in ARTIFACT_TYPES:
+            raise ValueError(f"不支持的产物类型: {ext}")
+        key = f"{hashlib.sha256(data).hexdigest()}.{ext}"
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return key
+            self._items[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes and len(self._items) > 1:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted)
+        return key
+
+    def get(self, key: str) -> Optional[Tuple[bytes, str]]:
+        """返回 (内容, MIME 类型)，不存在时返回 None"""
+        with self._lock:
+            data = self._items.get(key)
+            if data is None:
+                return None
+            self._items.move_to_end(key)
+        return data, ARTIFACT_TYPES[key.rsplit('.', 1)[-1]]
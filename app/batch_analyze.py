@@ -0,0 +1,236 @@
+"""批量分析目录中的剪纸图案，为每张图像输出 SVG、步骤 JSON 与 G-code
+
+用法：
+    python app/batch_analyze.py 图案目录/ "更多图案/*.png" -o 输出目录 [--workers 8]
+
+图像在进程池中并行分析（OpenCV 计算受 GIL 限制，多线程无法加速）。
+每完成一张图像就向输出目录下的 manifest.jsonl 追加一条记录，中断后重新运行
+同一命令会跳过内容与参数都未变化、且输出文件齐全的图像；--force 强制全部重做。
+结束时打印每张图像的耗时、轮廓数与失败原因汇总表。
+"""
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from ai.step_analyzer import StepAnalyzer
+from ai.step_format import STEP_FORMATS
+from hardware.arduino_controller import ArduinoController
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.webp')
+MANIFEST_NAME = 'manifest.jsonl'
+
+# 工作进程内复用的分析器与 G-code 编译器（由 _init_worker 创建）
+_analyzer: Optional[StepAnalyzer] = None
+_controller: Optional[ArduinoController] = None
+
+
+def collect_images(inputs: List[str], recursive: bool = False) -> List[str]:
+    """展开目录与通配符，返回去重后按路径排序的图像文件列表"""
+    found = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            pattern = os.path.join(item, '**', '*') if recursive else os.path.join(item, '*')
+            candidates = glob.glob(pattern, recursive=recursive)
+        else:
+            candidates = glob.glob(item, recursive=recursive)
+        for path in candidates:
+            if os.path.isfile(path) and path.lower().endswith(IMAGE_EXTENSIONS):
+                found.add(os.path.abspath(path))
+    return sorted(found)
+
+
+def output_stem(path: str, base_dirs: List[str], output_dir: str) -> str:
+    """输出文件的路径前缀：保留图像相对输入目录的层级，避免不同子目录的同名文件互相覆盖"""
+    for base in base_dirs:
+        if os.path.commonpath([base, path]) == base:
+            relative = os.path.relpath(path, base)
+            break
+    else:
+        relative = os.path.basename(path)
+    return os.path.join(output_dir, os.path.splitext(relative)[0])
+
+
+def _write_atomic(path: str, data: str) -> None:
+    """先写临时文件再替换，中断时不会留下半个输出文件"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _init_worker(log_level: int) -> None:
+    global _analyzer, _controller
+    logging.getLogger().setLevel(log_level)
+    _analyzer = StepAnalyzer()
+    _controller = ArduinoController()
+
+
+def process_image(task: Dict[str, Any]) -> Dict[str, Any]:
+    """在工作进程中分析一张图像并写出全部输出文件，返回 manifest 记录"""
+    record = {'source': task['source'], 'digest': task['digest'], 'options': task['options'],
+              'status': 'failed', 'timings': {}}
+    started = time.perf_counter()
+    try:
+        with open(task['source'], 'rb') as f:
+            data = f.read()
+        t = time.perf_counter()
+        result = _analyzer.analyze_image(data, visualization=False,
+                                         steps_format=task['options']['steps_format'])
+        record['timings']['analyze'] = time.perf_counter() - t
+        if not result:
+            raise ValueError("未找到轮廓或分析失败")
+
+        svg_data = result.pop('svg_data')
+        outputs = {'svg': f"{task['stem']}.svg", 'steps': f"{task['stem']}.steps.json"}
+        _write_atomic(outputs['svg'], svg_data)
+        _write_atomic(outputs['steps'], json.dumps(result, ensure_ascii=False))
+        record['contours'] = sum(1 for step in result['steps'] if step['type'] == 'start')
+        record['steps'] = len(result['steps'])
+
+        if task['options']['gcode']:
+            t = time.perf_counter()
+            program = _controller.build_svg_program(svg_data)
+            record['timings']['gcode'] = time.perf_counter() - t
+            outputs['gcode'] = f"{task['stem']}.gcode"
+            _write_atomic(outputs['gcode'], '\n'.join(program) + '\n')
+            record['gcode_lines'] = len(program)
+
+        record['outputs'] = outputs
+        record['status'] = 'ok'
+    except Exception as e:
+        record['error'] = str(e) or type(e).__name__
+    record['timings']['total'] = time.perf_counter() - started
+    return record
+
+
+def load_manifest(path: str) -> Dict[str, Dict[str, Any]]:
+    """读取已完成的记录，同一图像以最后一条为准；忽略中断时写了一半的行"""
+    records = {}
+    if not os.path.exists(path):
+        return records
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            records[record['source']] = record
+    return records
+
+
+def is_done(record: Optional[Dict[str, Any]], digest: str, options: Dict[str, Any]) -> bool:
+    return (record is not None and record.get('status') == 'ok'
+            and record.get('digest') == digest and record.get('options') == options
+            and all(os.path.exists(p) for p in record.get('outputs', {}).values()))
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def print_summary(records: List[Dict[str, Any]]) -> None:
+    print(f"\n{'图像':<40} {'状态':<6} {'轮廓数':>8} {'步骤数':>8} {'分析(ms)':>10} {'G-code(ms)':>12} {'总计(ms)':>10}")
+    for record in records:
+        timings = record.get('timings', {})
+        status = {'ok': '完成', 'skipped': '跳过'}.get(record['status'], '失败')
+
+        def ms(name: str) -> str:
+            return f"{timings[name] * 1000:.1f}" if name in timings else '-'
+
+        print(f"{os.path.basename(record['source'])[:38]:<40} {status:<6} {record.get('contours', '-'):>8} "
+              f"{record.get('steps', '-'):>8} {ms('analyze'):>10} {ms('gcode'):>12} {ms('total'):>10}")
+
+    failed = [r for r in records if r['status'] == 'failed']
+    done = [r for r in records if r['status'] == 'ok']
+    skipped = len(records) - len(failed) - len(done)
+    total_ms = sum(r['timings'].get('total', 0) for r in done) * 1000
+    print(f"\n共 {len(records)} 张：完成 {len(done)}，跳过 {skipped}，失败 {len(failed)}；"
+          f"本次处理累计耗时 {total_ms:.0f} ms")
+    for record in failed:
+        print(f"  失败 {record['source']}: {record.get('error')}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('inputs', nargs='+', help='图像目录、文件或通配符')
+    parser.add_argument('-o', '--output', default='batch_output', help='输出目录（默认 batch_output）')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1, help='工作进程数')
+    parser.add_argument('-r', '--recursive', action='store_true', help='递归查找子目录中的图像')
+    parser.add_argument('--steps-format', choices=STEP_FORMATS, default='compact', help='步骤 JSON 格式')
+    parser.add_argument('--no-gcode', action='store_true', help='不生成 G-code')
+    parser.add_argument('--force', action='store_true', help='忽略 manifest，重新处理全部图像')
+    parser.add_argument('-v', '--verbose', action='store_true', help='输出分析器的详细日志')
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    log_level = logging.INFO if args.verbose else logging.WARNING
+    logging.getLogger().setLevel(log_level)
+
+    images = collect_images(args.inputs, args.recursive)
+    if not images:
+        print("未找到图像文件")
+        return 1
+
+    output_dir = os.path.abspath(args.output)
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    previous = {} if args.force else load_manifest(manifest_path)
+    options = {'steps_format': args.steps_format, 'gcode': not args.no_gcode}
+    base_dirs = [os.path.abspath(item) for item in args.inputs if os.path.isdir(item)]
+
+    records: Dict[str, Dict[str, Any]] = {}
+    tasks = []
+    for path in images:
+        digest = file_digest(path)
+        if is_done(previous.get(path), digest, options):
+            records[path] = dict(previous[path], status='skipped', timings={})
+            continue
+        tasks.append({'source': path, 'digest': digest, 'options': options,
+                      'stem': output_stem(path, base_dirs, output_dir)})
+    print(f"找到 {len(images)} 张图像，需要处理 {len(tasks)} 张，{len(images) - len(tasks)} 张已完成")
+
+    interrupted = False
+    if tasks:
+        executor = ProcessPoolExecutor(max_workers=max(1, min(args.workers, len(tasks))),
+                                       initializer=_init_worker, initargs=(log_level,))
+        futures = [executor.submit(process_image, task) for task in tasks]
+        try:
+            with open(manifest_path, 'a', encoding='utf-8') as manifest:
+                for index, future in enumerate(as_completed(futures), 1):
+                    record = future.result()
+                    records[record['source']] = record
+                    # 逐条落盘，进程被中断时已完成的图像不会重做
+                    manifest.write(json.dumps(record, ensure_ascii=False) + '\n')
+                    manifest.flush()
+                    state = '完成' if record['status'] == 'ok' else f"失败: {record.get('error')}"
+                    print(f"[{index}/{len(tasks)}] {os.path.basename(record['source'])} {state}")
+        except KeyboardInterrupt:
+            interrupted = True
+            print("\n已中断，重新运行同一命令即可从断点继续")
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=not interrupted)
+
+    print_summary([records[path] for path in images if path in records])
+    if interrupted:
+        return 130
+    return 1 if any(r['status'] == 'failed' for r in records.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,9 +3,22 @@ import time
 import os
 import logging
 import traceback
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import xml.etree.ElementTree as ET
 import re
+import threading
+import hashlib
+import json
+from contextlib import contextmanager
+import numpy as np
+from hardware.grbl_streamer import GrblStreamer, GRBL_RX_BUFFER_SIZE, GRBL_STATUS_QUERY
+from hardware.grbl_status import MachineStatus, StatusPoller
+from hardware.gcode_compiler import GcodeCompiler
+from hardware.path_optimizer import PathOptimizer
+from hardware.toolpath_reducer import ToolpathReducer
+from hardware.plot_program import PlotProgram, PlotProgramCache
+from hardware.svg_path_parser import IDENTITY, Matrix, SvgPathParser
+from metrics import REGISTRY
 
 # 配置日志记录
 logging.basicConfig(
@@ -17,6 +30,18 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 注册 hardware 包中的串口 URL 处理器（grblsim:// 模拟设备）
+if 'hardware' not in serial.protocol_handler_packages:
+    serial.protocol_handler_packages.append('hardware')
+
+# 逐行发送（pingpong）时每条指令从写入到收到 ok 的往返耗时
+SERIAL_ROUNDTRIP = REGISTRY.histogram(
+    'papercut_serial_roundtrip_seconds', '串口指令往返耗时（秒），按结果分类', ('result',))
+SERIAL_RETRIES = REGISTRY.counter('papercut_serial_retries_total', '串口指令重试次数')
+
+class MachineBusyError(RuntimeError):
+    """串口正被其他任务占用"""
+
 class ArduinoController:
     """ESP32 GRBL 两轴（X, Y）绘图控制器，支持舵机升降笔（M3 Sxx）"""
     
@@ -27,54 +52,250 @@ class ArduinoController:
         self.timeout = float(os.getenv('ARDUINO_TIMEOUT', 2))
         self.max_retries = int(os.getenv('ARDUINO_MAX_RETRIES', 3))
         self.retry_delay = float(os.getenv('ARDUINO_RETRY_DELAY', 1))
+        # 打开串口后等待 GRBL 启动信息的最长时间（秒），收到横幅或状态报告即就绪
+        self.startup_timeout = float(os.getenv('ARDUINO_STARTUP_TIMEOUT', 5))
+        # 断线后自动重连的最长退避间隔（秒），间隔从 retry_delay 开始逐次翻倍
+        self.reconnect_max_delay = float(os.getenv('ARDUINO_RECONNECT_MAX_DELAY', 30))
         # 舵机角度
         self.pen_up_angle = 90
         self.pen_down_angle = 0
         self.rapid_feed_rate = 3000  # mm/分钟
         self.drawing_feed_rate = 1000  # mm/分钟
         self.pen_delay = 200  # 毫秒
+        # 发送模式：pingpong（逐行等待 ok）或 stream（字符计数流式发送）
+        self.send_mode = os.getenv('ARDUINO_SEND_MODE', 'pingpong')
+        self.rx_buffer_size = int(os.getenv('ARDUINO_RX_BUFFER_SIZE', GRBL_RX_BUFFER_SIZE))
+        self.stream_timeout = float(os.getenv('ARDUINO_STREAM_TIMEOUT', 30))
+        self.last_send_stats = None
+        self.last_compile_stats = None
+        # 路径排序：减少抬笔空行程
+        self.optimize_travel = os.getenv('ARDUINO_OPTIMIZE_TRAVEL', 'true').lower() in ('1', 'true', 'yes')
+        self.reverse_open_paths = os.getenv('ARDUINO_REVERSE_OPEN_PATHS', 'true').lower() in ('1', 'true', 'yes')
+        # 刀路精简：容差（mm，0 表示关闭）与 G2/G3 圆弧拟合
+        self.path_tolerance = float(os.getenv('ARDUINO_PATH_TOLERANCE', 0.2))
+        self.arc_fitting = os.getenv('ARDUINO_ARC_FITTING', 'false').lower() in ('1', 'true', 'yes')
+        # 贝塞尔曲线与圆弧展平为折线时允许的最大偏差（mm）
+        self.curve_tolerance = float(os.getenv('ARDUINO_CURVE_TOLERANCE', 0.05))
+        self.svg_parser = SvgPathParser(tolerance=self.curve_tolerance)
+        # 绘图区域（mm）：设置后把 SVG 画布等比缩放并居中到台面内，0 表示按 SVG 单位直接当作 mm
+        self.bed_width = float(os.getenv('ARDUINO_BED_WIDTH', 0))
+        self.bed_height = float(os.getenv('ARDUINO_BED_HEIGHT', 0))
+        self.bed_margin = float(os.getenv('ARDUINO_BED_MARGIN', 0))
+        # 编译结果缓存：重复绘制同一图案时不再解析 SVG
+        self.programs = PlotProgramCache(int(os.getenv('ARDUINO_PROGRAM_CACHE_SIZE', 32)))
+        # 任务独占锁：同一时间只允许一个任务使用机器，busy 即此锁是否被持有
+        self._port_lock = threading.Lock()
+        # 串口读取锁：任务执行期间与状态轮询线程读取一行状态报告时持有，保证只有一方读串口
+        self._io_lock = threading.Lock()
+        # 连接状态：端口打开一次后保持，断线时由状态轮询线程按退避间隔重连
+        self._connect_lock = threading.RLock()
+        self._keep_open = False
+        self._reconnect_attempts = 0
+        self._next_reconnect_at = 0.0
+        self.firmware = None
+        self.connected_since = None
+        self.last_error = None
+        # 实时状态：连接后按 ARDUINO_STATUS_INTERVAL（秒，0 表示关闭）发送 ? 查询
+        self.status = MachineStatus()
+        self.status_poller = StatusPoller(self, float(os.getenv('ARDUINO_STATUS_INTERVAL', 0.2)))
         logger.info(f"ESP32 GRBL 控制器初始化，端口: {self.port}, 波特率: {self.baud_rate}")
 
+    @contextmanager
+    def exclusive(self, blocking: bool = False):
+        """独占机器的上下文，blocking 为 False 时已有任务在执行则立即抛出 MachineBusyError
+
+        状态轮询线程只在读取一行状态报告期间持有串口读取锁，这里等它读完即可，不视为占用。
+        """
+        if not self._port_lock.acquire(blocking=blocking):
+            raise MachineBusyError("机器正忙，请等待当前任务完成")
+        try:
+            with self._io_lock:
+                yield
+        finally:
+            self._port_lock.release()
+
+    @property
+    def busy(self) -> bool:
+        return self._port_lock.locked()
+
+    @property
+    def connected(self) -> bool:
+        return bool(self.serial and self.serial.is_open)
+
+    @property
+    def auto_reconnect(self) -> bool:
+        """曾经连接成功且未主动断开，断线后会自动重连"""
+        return self._keep_open
+
     def connect(self) -> bool:
-        if self.serial and self.serial.is_open:
-            logger.info("已连接到 ESP32 GRBL")
+        """打开串口并等待 GRBL 就绪，失败时按 max_retries 重试；连接成功后保持打开"""
+        if self.connected:
             return True
         retry_count = 0
         while retry_count < self.max_retries:
+            if self._open_port():
+                return True
+            retry_count += 1
+            logger.error(f"连接 ESP32 GRBL 失败（第 {retry_count}/{self.max_retries} 次）: {self.last_error}")
+            if retry_count < self.max_retries:
+                time.sleep(self.retry_delay)
+        return False
+
+    def reconnect(self) -> bool:
+        """断线后自动重连，未到下次重试时间时直接返回 False
+
+        只持有连接锁，不占用任务锁：重连期间发起的任务在 connect() 中等待重连结束。
+        """
+        with self._connect_lock:
+            if self.connected:
+                return True
+            if not self._keep_open or time.time() < self._next_reconnect_at:
+                return False
+            logger.info(f"尝试重新连接 ESP32 GRBL（第 {self._reconnect_attempts} 次重连）")
+            if self._open_port():
+                return True
+            self._schedule_reconnect()
+            logger.warning(f"重新连接失败: {self.last_error}，{self._next_reconnect_at - time.time():.1f} 秒后重试")
+            return False
+
+    def _open_port(self) -> bool:
+        with self._connect_lock:
+            if self.connected:
+                return True
+            port = None
             try:
                 logger.info(f"尝试连接 ESP32 GRBL，端口: {self.port}, 波特率: {self.baud_rate}")
-                self.serial = serial.Serial(self.port, self.baud_rate, timeout=self.timeout)
-                time.sleep(2)
-                startup_message = self.serial.read_all().decode(errors='ignore').strip()
-                if startup_message:
-                    logger.info(f"GRBL 启动信息: {startup_message}")
-                logger.info("成功连接到 ESP32 GRBL")
-                return True
-            except serial.SerialException as e:
-                retry_count += 1
-                logger.error(f"连接 ESP32 GRBL 失败（第 {retry_count}/{self.max_retries} 次）: {str(e)}")
-                logger.error(f"详细错误: {traceback.format_exc()}")
-                if retry_count < self.max_retries:
-                    time.sleep(self.retry_delay)
-                else:
-                    self.serial = None
-                    return False
+                # serial_for_url 同时支持普通端口名与 grblsim:// 等 URL
+                port = serial.serial_for_url(self.port, self.baud_rate, timeout=self.timeout)
+                self.firmware = self._wait_until_ready(port)
             except Exception as e:
-                logger.error(f"连接 ESP32 GRBL 时发生未知错误: {str(e)}")
-                logger.error(f"详细错误: {traceback.format_exc()}")
-                self.serial = None
+                self.last_error = str(e)
+                if not isinstance(e, serial.SerialException):
+                    logger.error(f"连接 ESP32 GRBL 时发生未知错误: {str(e)}")
+                    logger.error(f"详细错误: {traceback.format_exc()}")
+                if port is not None:
+                    port.close()
                 return False
+            self.serial = port
+            self.connected_since = time.time()
+            self.last_error = None
+            self._keep_open = True
+            self._reconnect_attempts = 0
+            self._next_reconnect_at = 0.0
+            logger.info(f"成功连接到 ESP32 GRBL: {self.firmware}")
+            self.status.set_connected(True)
+            self.status_poller.start()
+            return True
+
+    def _wait_until_ready(self, port) -> str:
+        """等待 GRBL 就绪，返回启动横幅或状态报告
+
+        ESP32 打开串口时会复位并输出 "Grbl 1.1h ['$' for help]"；不会复位的开发板没有横幅，
+        因此每隔一段时间发送一次 ? 查询，收到状态报告同样视为就绪。
+        """
+        deadline = time.time() + self.startup_timeout
+        port.timeout = min(self.timeout, 0.5)
+        try:
+            while time.time() < deadline:
+                line = port.readline().decode(errors='ignore').strip()
+                if line.startswith('Grbl'):
+                    logger.info(f"GRBL 启动信息: {line}")
+                    return line
+                if line.startswith('<'):
+                    self.status.update_from_report(line)
+                    return line
+                if line:
+                    logger.debug(f"GRBL 消息: {line}")
+                else:
+                    port.write(GRBL_STATUS_QUERY)
+        finally:
+            port.timeout = self.timeout
+        raise serial.SerialException(f"{self.startup_timeout} 秒内未收到 GRBL 启动信息")
+
+    def _schedule_reconnect(self) -> None:
+        delay = min(self.retry_delay * 2 ** self._reconnect_attempts, self.reconnect_max_delay)
+        self._reconnect_attempts += 1
+        self._next_reconnect_at = time.time() + delay
+
+    def connection_lost(self, reason: str) -> None:
+        """串口读写出错时调用：关闭端口并交给状态轮询线程自动重连"""
+        logger.error(f"与 ESP32 GRBL 的连接中断: {reason}")
+        with self._connect_lock:
+            self.last_error = reason
+            self._close_port()
+            self._schedule_reconnect()
 
     def disconnect(self) -> None:
+        """主动断开连接，不再自动重连"""
+        with self._connect_lock:
+            self._keep_open = False
+            self._close_port()
+        self.status_poller.stop()
+
+    def _close_port(self) -> None:
+        self.status.set_connected(False)
+        self.connected_since = None
         try:
             if self.serial and self.serial.is_open:
                 self.serial.close()
                 logger.info("已断开与 ESP32 GRBL 的连接")
-            self.serial = None
         except Exception as e:
             logger.error(f"断开连接时出错: {str(e)}")
             logger.error(f"详细错误: {traceback.format_exc()}")
-            self.serial = None
+        self.serial = None
+
+    def health(self) -> Dict:
+        """连接健康状况，只读取内存中的状态，不访问串口"""
+        status = self.status.to_dict()
+        now = time.time()
+        return {
+            **status,
+            'port': self.port,
+            'busy': self.busy,
+            'firmware': self.firmware,
+            'connected_for_s': round(now - self.connected_since, 1) if self.connected_since else None,
+            'status_age_s': round(now - status['updated_at'], 2) if status['updated_at'] else None,
+            'auto_reconnect': self.auto_reconnect,
+            'reconnect_attempts': self._reconnect_attempts,
+            'next_reconnect_in_s': round(max(self._next_reconnect_at - now, 0.0), 1)
+            if self._keep_open and not self.connected else None,
+            'last_error': self.last_error,
+        }
+
+    def request_status(self) -> None:
+        """写入 ? 实时查询，报告由当前读取串口的一方交给 self.status"""
+        if self.connected:
+            self.serial.write(GRBL_STATUS_QUERY)
+
+    def poll_status(self) -> None:
+        """无人读取串口时查询并读取一次状态报告；任务执行期间只发送查询"""
+        if not self._io_lock.acquire(blocking=False):
+            try:
+                self.request_status()
+            except serial.SerialException as e:
+                logger.debug(f"发送状态查询失败: {str(e)}")
+            return
+        try:
+            if self.connected and not self._query_status_locked():
+                logger.warning("GRBL 未响应状态查询")
+        finally:
+            self._io_lock.release()
+
+    def _query_status_locked(self) -> bool:
+        """发送 ? 并读取状态报告，需已持有串口读取锁"""
+        try:
+            self.request_status()
+            deadline = time.time() + self.timeout
+            while time.time() < deadline:
+                line = self.serial.readline().decode(errors='ignore').strip()
+                if self.status.update_from_report(line):
+                    return True
+                if line:
+                    logger.debug(f"GRBL 消息: {line}")
+            return False
+        except serial.SerialException as e:
+            self.connection_lost(f"查询机器状态时串口错误: {str(e)}")
+            return False
 
     def _send_command(self, gcode_line: str) -> bool:
         if not self.serial or not self.serial.is_open:
@@ -82,6 +303,9 @@ class ArduinoController:
             return False
         retry_count = 0
         while retry_count < self.max_retries:
+            if retry_count > 0:
+                SERIAL_RETRIES.inc()
+            sent_at = time.perf_counter()
             try:
                 self.serial.write(f"{gcode_line}\n".encode())
                 logger.debug(f"已发送: {gcode_line}")
@@ -90,13 +314,17 @@ class ArduinoController:
                 while time.time() - response_start_time < self.timeout:
                     if self.serial.in_waiting > 0:
                         response_part = self.serial.readline().decode(errors='ignore').strip()
+                        if self.status.update_from_report(response_part):
+                            continue
                         response += response_part
                         if 'ok' in response.lower():
                             logger.debug(f"收到响应: {response}")
+                            SERIAL_ROUNDTRIP.observe(time.perf_counter() - sent_at, result='ok')
                             return True
                         if response_part:
                             logger.debug(f"部分响应: {response_part}")
                     time.sleep(0.01)
+                SERIAL_ROUNDTRIP.observe(time.perf_counter() - sent_at, result='timeout')
                 retry_count += 1
                 logger.warning(f"指令 '{gcode_line}' 超时或无 'ok' 响应（第 {retry_count}/{self.max_retries} 次）")
                 logger.warning(f"完整响应: '{response}'")
@@ -105,59 +333,44 @@ class ArduinoController:
                 else:
                     return False
             except serial.SerialException as e:
+                SERIAL_ROUNDTRIP.observe(time.perf_counter() - sent_at, result='error')
                 retry_count += 1
                 logger.error(f"发送指令 '{gcode_line}' 时串口错误（第 {retry_count}/{self.max_retries} 次）: {str(e)}")
                 logger.error(f"详细错误: {traceback.format_exc()}")
                 if retry_count < self.max_retries:
                     time.sleep(self.retry_delay)
                 else:
-                    self.disconnect()
+                    self.connection_lost(f"发送指令时串口错误: {str(e)}")
                     return False
             except Exception as e:
                 logger.error(f"发送指令 '{gcode_line}' 时发生未知错误: {str(e)}")
                 logger.error(f"详细错误: {traceback.format_exc()}")
-                self.disconnect()
+                self.connection_lost(f"发送指令时发生未知错误: {str(e)}")
                 return False
 
     def _parse_svg_path(self, path_data: str) -> List[Dict]:
-        """解析 SVG 路径数据为 X、Y 绘图指令，支持绝对/相对 M、L、Z"""
+        """解析 SVG 路径数据为 X、Y 绘图指令，支持完整的 SVG 路径语法，曲线展平为直线段"""
+        return self._subpaths_to_commands(self.svg_parser.parse_path(path_data))
+
+    def _subpaths_to_commands(self, subpaths: List[np.ndarray]) -> List[Dict]:
+        """每条子路径以 G0 移动到起点，其余各点为 G1"""
         commands = []
-        current_x = 0.0
-        current_y = 0.0
-        start_x = 0.0
-        start_y = 0.0
-        path_commands = re.findall(r'([MLZmlz])([^MLZmlz]*)', path_data)
-        for cmd, params in path_commands:
-            params = [float(p) for p in re.findall(r'[-+]?[0-9]*\.?[0-9]+', params)]
-            if cmd == 'M':  # 绝对移动到
-                current_x, current_y = params[0], params[1]
-                start_x, start_y = current_x, current_y
-                commands.append({'type': 'G0', 'x': current_x, 'y': current_y, 'f': self.rapid_feed_rate})
-            elif cmd == 'm':  # 相对移动到
-                current_x += params[0]
-                current_y += params[1]
-                start_x, start_y = current_x, current_y
-                commands.append({'type': 'G0', 'x': current_x, 'y': current_y, 'f': self.rapid_feed_rate})
-            elif cmd == 'L':  # 绝对直线到
-                current_x, current_y = params[0], params[1]
-                commands.append({'type': 'G1', 'x': current_x, 'y': current_y, 'f': self.drawing_feed_rate})
-            elif cmd == 'l':  # 相对直线到
-                current_x += params[0]
-                current_y += params[1]
-                commands.append({'type': 'G1', 'x': current_x, 'y': current_y, 'f': self.drawing_feed_rate})
-            elif cmd in ['Z', 'z']:
-                # 闭合路径，回到起点
-                commands.append({'type': 'G1', 'x': start_x, 'y': start_y, 'f': self.drawing_feed_rate})
-                current_x, current_y = start_x, start_y
+        for points in subpaths:
+            coords = zip(points[:, 0].tolist(), points[:, 1].tolist())
+            x, y = next(coords)
+            commands.append({'type': 'G0', 'x': x, 'y': y, 'f': self.rapid_feed_rate})
+            commands.extend({'type': 'G1', 'x': x, 'y': y, 'f': self.drawing_feed_rate} for x, y in coords)
         return commands
 
     def _command_to_gcode_string(self, command_dict: Dict) -> Optional[str]:
         try:
             cmd_type = command_dict.get('type')
-            if cmd_type in ['G0', 'G1']:
+            if cmd_type in ['G0', 'G1', 'G2', 'G3']:
                 parts = [cmd_type]
                 if 'x' in command_dict: parts.append(f"X{float(command_dict['x']):.3f}")
                 if 'y' in command_dict: parts.append(f"Y{float(command_dict['y']):.3f}")
+                if 'i' in command_dict: parts.append(f"I{float(command_dict['i']):.3f}")
+                if 'j' in command_dict: parts.append(f"J{float(command_dict['j']):.3f}")
                 if 'f' in command_dict: parts.append(f"F{int(command_dict['f'])}")
                 return " ".join(parts)
             elif cmd_type == 'M3':
@@ -172,51 +385,220 @@ class ArduinoController:
             logger.error(f"详细错误: {traceback.format_exc()}")
             return None
 
-    def send_svg(self, svg_data: str) -> bool:
-        if not self.serial:
-            if not self.connect():
-                logger.error("发送 SVG 失败：未连接到 ESP32 GRBL")
+    def _bed_transform(self, root: ET.Element) -> Matrix:
+        """SVG 画布到台面的仿射矩阵，未配置台面或画布尺寸未知时为单位矩阵"""
+        if self.bed_width <= 0 or self.bed_height <= 0:
+            return IDENTITY
+        view_box = root.get('viewBox')
+        try:
+            if view_box:
+                min_x, min_y, width, height = (float(v) for v in re.split(r'[\s,]+', view_box.strip()))
+            else:
+                min_x = min_y = 0.0
+                width = float(re.match(r'[-+]?[0-9]*\.?[0-9]+', root.get('width', '')).group())
+                height = float(re.match(r'[-+]?[0-9]*\.?[0-9]+', root.get('height', '')).group())
+        except (AttributeError, ValueError):
+            logger.warning("无法确定 SVG 画布尺寸，按原始坐标绘制")
+            return IDENTITY
+        if width <= 0 or height <= 0:
+            return IDENTITY
+        usable_w = self.bed_width - 2 * self.bed_margin
+        usable_h = self.bed_height - 2 * self.bed_margin
+        scale = min(usable_w / width, usable_h / height)
+        offset_x = self.bed_margin + (usable_w - width * scale) / 2 - min_x * scale
+        offset_y = self.bed_margin + (usable_h - height * scale) / 2 - min_y * scale
+        return scale, 0.0, 0.0, scale, offset_x, offset_y
+
+    def parse_svg_paths(self, svg_data: str) -> List[List[Dict]]:
+        """解析 SVG 文档中全部图形元素为绘图指令列表（每个元素一条）
+
+        应用各元素的 transform，配置了台面时坐标换算为台面 mm；
+        曲线按 ARDUINO_CURVE_TOLERANCE 在最终坐标下展平。
+        """
+        root = ET.fromstring(svg_data)
+        return [self._subpaths_to_commands(subpaths)
+                for subpaths in self.svg_parser.parse_document(root, self._bed_transform(root))]
+
+    def _compile_key(self, svg_data: str) -> str:
+        """编译输入的摘要：SVG 内容与全部影响输出的参数"""
+        settings = {
+            'pen': [self.pen_up_angle, self.pen_down_angle, self.pen_delay],
+            'feed': [self.rapid_feed_rate, self.drawing_feed_rate],
+            'order': [self.optimize_travel, self.reverse_open_paths],
+            'reduce': [self.path_tolerance, self.arc_fitting, self.curve_tolerance],
+            'bed': [self.bed_width, self.bed_height, self.bed_margin],
+        }
+        digest = hashlib.sha256(svg_data.encode('utf-8'))
+        digest.update(json.dumps(settings, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def compile_svg(self, svg_data: str) -> PlotProgram:
+        """将 SVG 编译为绘图程序；相同的 SVG 与参数直接返回缓存的程序"""
+        def compile_program() -> PlotProgram:
+            lines = self.compile_paths(self.parse_svg_paths(svg_data))
+            return PlotProgram(lines, self.last_compile_stats)
+
+        program = self.programs.get_or_compile(self._compile_key(svg_data), compile_program)
+        self.last_compile_stats = program.stats
+        return program
+
+    def build_svg_program(self, svg_data: str) -> List[str]:
+        """将 SVG 编译为 G-code 行列表，升降笔只在状态改变时发送"""
+        return self.compile_svg(svg_data).lines
+
+    def compile_paths(self, paths: List[List[Dict]]) -> List[str]:
+        """路径排序、刀路精简后编译为 G-code 行列表"""
+        optimizer = None
+        if self.optimize_travel:
+            optimizer = PathOptimizer(allow_reverse=self.reverse_open_paths,
+                                      containment_tolerance=self.path_tolerance)
+            paths = optimizer.optimize(paths)
+        reducer = None
+        if self.path_tolerance > 0 or self.arc_fitting:
+            reducer = ToolpathReducer(tolerance=self.path_tolerance, arc_fitting=self.arc_fitting)
+            paths = reducer.reduce(paths)
+        compiler = GcodeCompiler(
+            pen_up_angle=self.pen_up_angle,
+            pen_down_angle=self.pen_down_angle,
+            pen_delay=self.pen_delay,
+            rapid_feed_rate=self.rapid_feed_rate,
+            drawing_feed_rate=self.drawing_feed_rate
+        )
+        program = compiler.compile(paths)
+        self.last_compile_stats = compiler.stats.to_dict()
+        if optimizer:
+            self.last_compile_stats['path_order'] = optimizer.stats
+        if reducer:
+            self.last_compile_stats['reduction'] = reducer.stats
+        return program
+
+    def _send_program_pingpong(self, program: List[str]) -> bool:
+        """逐行发送并等待 ok"""
+        sent_lines = 0
+        sent_bytes = 0
+        start_time = time.time()
+        for gcode in program:
+            if not self._send_command(gcode):
+                logger.error(f"发送指令失败：{gcode}")
                 return False
+            sent_lines += 1
+            sent_bytes += len(gcode) + 1
+        elapsed = max(time.time() - start_time, 1e-9)
+        self.last_send_stats = {
+            'mode': 'pingpong',
+            'lines_sent': sent_lines,
+            'lines_acked': sent_lines,
+            'bytes_sent': sent_bytes,
+            'errors': [],
+            'elapsed_s': round(elapsed, 3),
+            'lines_per_s': round(sent_lines / elapsed, 2),
+            'bytes_per_s': round(sent_bytes / elapsed, 2),
+        }
+        return True
+
+    def create_streamer(self, mode: str = 'stream', line_callback=None) -> GrblStreamer:
+        """为当前连接创建发送器，pingpong 模式下每次只允许一行在途"""
+        return GrblStreamer(
+            self.serial,
+            rx_buffer_size=self.rx_buffer_size,
+            timeout=self.stream_timeout,
+            line_callback=line_callback,
+            max_in_flight=1 if mode == 'pingpong' else None,
+            status_callback=self.status.update_from_report
+        )
+
+    def _send_program_stream(self, program: List[str]) -> bool:
+        """字符计数流式发送"""
+        # 清除连接时残留的输入，保证响应与指令一一对应
+        self.serial.reset_input_buffer()
+        streamer = self.create_streamer('stream')
         try:
-            logger.info("开始发送 SVG 绘图指令")
-            root = ET.fromstring(svg_data)
-            setup_commands = ["G21", "G90"]  # mm 单位，绝对定位
-            for cmd_str in setup_commands:
-                if not self._send_command(cmd_str):
-                    logger.error(f"发送设置指令失败：{cmd_str}")
-                    return False
-            for path in root.findall(".//{http://www.w3.org/2000/svg}path"):
-                path_data = path.get('d')
-                if path_data:
-                    commands = self._parse_svg_path(path_data)
-                    # 抬笔
-                    if not self._send_command(f"M3 S{self.pen_up_angle}"):
-                        return False
-                    time.sleep(self.pen_delay / 1000.0)
-                    for cmd in commands:
-                        gcode = self._command_to_gcode_string(cmd)
-                        if gcode:
-                            if not self._send_command(gcode):
-                                logger.error(f"发送指令失败：{gcode}")
-                                return False
-                            # 画线时落笔，移动时抬笔
-                            if cmd['type'] == 'G1':
-                                if not self._send_command(f"M3 S{self.pen_down_angle}"):
-                                    return False
-                                time.sleep(self.pen_delay / 1000.0)
-                            elif cmd['type'] == 'G0':
-                                if not self._send_command(f"M3 S{self.pen_up_angle}"):
-                                    return False
-                                time.sleep(self.pen_delay / 1000.0)
-            logger.info("成功发送所有 SVG 绘图指令")
+            streamer.stream(program)
             return True
+        except (RuntimeError, TimeoutError, ValueError) as e:
+            logger.error(f"流式发送失败: {str(e)}")
+            return False
+        finally:
+            if streamer.stats:
+                self.last_send_stats = streamer.stats.to_dict()
+
+    def recover_after_reset(self) -> bool:
+        """软复位后等待 GRBL 重启、解除锁定并抬笔"""
+        try:
+            deadline = time.time() + max(self.timeout, 2)
+            while time.time() < deadline:
+                line = self.serial.readline().decode(errors='ignore').strip()
+                if line.startswith('Grbl'):
+                    logger.info(f"GRBL 已复位: {line}")
+                    break
+            self.serial.reset_input_buffer()
+            # 运动中复位会进入 ALARM 状态，需要 $X 解锁
+            return self._send_command("$X") and self._send_command(f"M3 S{self.pen_up_angle}")
+        except Exception as e:
+            logger.error(f"复位后恢复失败: {str(e)}")
+            logger.error(f"详细错误: {traceback.format_exc()}")
+            return False
+
+    def send_svg(self, svg_data: str, mode: Optional[str] = None) -> bool:
+        """发送 SVG 绘图
+
+        参数：
+            svg_data: SVG 文本
+            mode: 'pingpong' 或 'stream'，默认使用 ARDUINO_SEND_MODE
+        """
+        mode = mode or self.send_mode
+        if mode not in ('pingpong', 'stream'):
+            raise ValueError(f"不支持的发送模式: {mode}")
+        with self.exclusive():
+            return self._send_svg_locked(svg_data, mode)
+
+    def send_program(self, program: PlotProgram, mode: Optional[str] = None) -> bool:
+        """发送预先编译好的绘图程序，不再解析或编译"""
+        mode = mode or self.send_mode
+        if mode not in ('pingpong', 'stream'):
+            raise ValueError(f"不支持的发送模式: {mode}")
+        with self.exclusive():
+            return self._send_program_locked(program, mode)
+
+    def _send_svg_locked(self, svg_data: str, mode: str) -> bool:
+        try:
+            program = self.compile_svg(svg_data)
+        except Exception as e:
+            logger.error(f"编译 SVG 时发生错误: {str(e)}")
+            logger.error(f"详细错误: {traceback.format_exc()}")
+            return False
+        return self._send_program_locked(program, mode)
+
+    def _send_program_locked(self, program: PlotProgram, mode: str) -> bool:
+        if not self.connected:
+            if not self.connect():
+                logger.error("发送绘图程序失败：未连接到 ESP32 GRBL")
+                return False
+        try:
+            logger.info(f"开始发送绘图程序 {program.id[:12]}（{len(program)} 行，模式: {mode}）")
+            self.last_compile_stats = program.stats
+            if mode == 'stream':
+                success = self._send_program_stream(program.lines)
+            else:
+                success = self._send_program_pingpong(program.lines)
+            if success:
+                logger.info(f"成功发送所有绘图指令，编译统计: {self.last_compile_stats}，"
+                            f"发送统计: {self.last_send_stats}")
+            return success
+        except serial.SerialException as e:
+            self.connection_lost(f"发送绘图程序时串口错误: {str(e)}")
+            return False
         except Exception as e:
-            logger.error(f"发送 SVG 时发生错误: {str(e)}")
+            logger.error(f"发送绘图程序时发生错误: {str(e)}")
             logger.error(f"详细错误: {traceback.format_exc()}")
             return False
 
     def calibrate(self) -> bool:
-        if not self.serial:
+        with self.exclusive():
+            return self._calibrate_locked()
+
+    def _calibrate_locked(self) -> bool:
+        if not self.connected:
             if not self.connect():
                 logger.error("校准失败：未连接到 ESP32 GRBL")
                 return False
@@ -235,11 +617,15 @@ class ArduinoController:
             return False
 
     def test_connection(self) -> bool:
+        with self.exclusive():
+            return self._test_connection_locked()
+
+    def _test_connection_locked(self) -> bool:
         logger.info("测试 ESP32 GRBL 连接...")
         try:
-            if self.connect():
+            # 保持连接打开：已连接时只发送一次状态查询，不再重新打开串口（会复位 ESP32）
+            if self.connect() and self._query_status_locked():
                 logger.info("ESP32 GRBL 连接测试成功")
-                self.disconnect()
                 return True
             else:
                 logger.error("ESP32 GRBL 连接测试失败")
@@ -0,0 +1,152 @@
+import math
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CompileStats:
+    """G-code 编译统计：与逐指令升降笔的旧方案对比"""
+
+    def __init__(self):
+        self.paths = 0
+        self.setup_commands = 0
+        self.motion_commands = 0
+        self.pen_commands = 0
+        self.dwell_commands = 0
+        self.naive_commands = 0
+        self.naive_dwell_s = 0.0
+        self.dwell_s = 0.0
+        self.draw_distance = 0.0
+        self.travel_distance = 0.0
+        self.motion_time_s = 0.0
+
+    @property
+    def compiled_commands(self) -> int:
+        return self.setup_commands + self.motion_commands + self.pen_commands + self.dwell_commands
+
+    def to_dict(self) -> Dict:
+        naive_time = self.motion_time_s + self.naive_dwell_s
+        compiled_time = self.motion_time_s + self.dwell_s
+        return {
+            'paths': self.paths,
+            'naive_commands': self.naive_commands,
+            'compiled_commands': self.compiled_commands,
+            'saved_commands': self.naive_commands - self.compiled_commands,
+            'pen_transitions': self.pen_commands,
+            'draw_distance_mm': round(self.draw_distance, 2),
+            'travel_distance_mm': round(self.travel_distance, 2),
+            'naive_time_s': round(naive_time, 2),
+            'estimated_time_s': round(compiled_time, 2),
+            'saved_time_s': round(naive_time - compiled_time, 2),
+        }
+
+
+class GcodeCompiler:
+    """把路径指令编译为 G-code 行
+
+    跟踪落笔/抬笔状态，只在状态真正改变时发送 M3，并用 G4 暂停代替主机端
+    sleep 等待舵机动作；进给速度按模态规则只在变化时输出。
+    """
+
+    def __init__(self, pen_up_angle: int = 90, pen_down_angle: int = 0,
+                 pen_delay: int = 200, rapid_feed_rate: int = 3000,
+                 drawing_feed_rate: int = 1000):
+        self.pen_up_angle = pen_up_angle
+        self.pen_down_angle = pen_down_angle
+        self.pen_delay = pen_delay  # 毫秒
+        self.rapid_feed_rate = rapid_feed_rate  # mm/分钟
+        self.drawing_feed_rate = drawing_feed_rate  # mm/分钟
+        self.stats = CompileStats()
+
+    def _motion_line(self, cmd: Dict, feed: Optional[int]) -> str:
+        """格式化运动指令，feed 为 None 时沿用模态进给速度"""
+        parts = [cmd['type']]
+        if 'x' in cmd:
+            parts.append(f"X{float(cmd['x']):.3f}")
+        if 'y' in cmd:
+            parts.append(f"Y{float(cmd['y']):.3f}")
+        if cmd['type'] in ('G2', 'G3'):
+            parts.append(f"I{float(cmd['i']):.3f}")
+            parts.append(f"J{float(cmd['j']):.3f}")
+        if feed is not None:
+            parts.append(f"F{feed}")
+        return " ".join(parts)
+
+    @staticmethod
+    def _arc_length(x: float, y: float, nx: float, ny: float, cmd: Dict, ccw: bool) -> float:
+        """圆弧指令的弧长"""
+        cx, cy = x + float(cmd['i']), y + float(cmd['j'])
+        radius = math.hypot(x - cx, y - cy)
+        sweep = math.atan2(ny - cy, nx - cx) - math.atan2(y - cy, x - cx)
+        if ccw and sweep <= 0:
+            sweep += 2 * math.pi
+        elif not ccw and sweep >= 0:
+            sweep -= 2 * math.pi
+        return abs(sweep) * radius
+
+    def compile(self, paths: List[List[Dict]]) -> List[str]:
+        """编译多条路径
+
+        参数：
+            paths: 每条路径为 _parse_svg_path 输出的指令字典列表
+
+        返回：
+            List[str]: G-code 行（含 G21/G90 初始化与结束抬笔）
+        """
+        stats = CompileStats()
+        self.stats = stats
+        dwell = self.pen_delay / 1000.0
+        lines = ["G21", "G90"]  # mm 单位，绝对定位
+        stats.setup_commands = stats.naive_commands = len(lines)
+        pen_down = None  # 未知状态，第一次必须显式设置
+        feed = None
+        x = y = 0.0
+
+        def set_pen(down: bool) -> None:
+            nonlocal pen_down
+            if pen_down is down:
+                return
+            angle = self.pen_down_angle if down else self.pen_up_angle
+            lines.append(f"M3 S{angle}")
+            stats.pen_commands += 1
+            if dwell > 0:
+                lines.append(f"G4 P{dwell:.3f}")
+                stats.dwell_commands += 1
+                stats.dwell_s += dwell
+            pen_down = down
+
+        for commands in paths:
+            if not commands:
+                continue
+            stats.paths += 1
+            # 旧方案：每条路径先抬笔，之后每条运动指令再跟一次 M3
+            stats.naive_commands += 1 + 2 * len(commands)
+            stats.naive_dwell_s += dwell * (1 + len(commands))
+            for cmd in commands:
+                drawing = cmd['type'] != 'G0'
+                set_pen(drawing)
+                default_feed = self.drawing_feed_rate if drawing else self.rapid_feed_rate
+                new_feed = int(cmd.get('f', default_feed))
+                lines.append(self._motion_line(cmd, new_feed if new_feed != feed else None))
+                feed = new_feed
+                stats.motion_commands += 1
+
+                nx = float(cmd.get('x', x))
+                ny = float(cmd.get('y', y))
+                if cmd['type'] in ('G2', 'G3'):
+                    distance = self._arc_length(x, y, nx, ny, cmd, ccw=cmd['type'] == 'G3')
+                else:
+                    distance = math.hypot(nx - x, ny - y)
+                if drawing:
+                    stats.draw_distance += distance
+                else:
+                    stats.travel_distance += distance
+                if feed > 0:
+                    stats.motion_time_s += distance / feed * 60.0
+                x, y = nx, ny
+
+        set_pen(False)
+        logger.info(f"G-code 编译完成: {stats.naive_commands} -> {stats.compiled_commands} 条指令，"
+                    f"预计节省 {stats.to_dict()['saved_time_s']} 秒")
+        return lines
@@ -0,0 +1,499 @@
+import math
+import random
+import re
+import logging
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from hardware.grbl_streamer import (
+    GRBL_CYCLE_START, GRBL_FEED_HOLD, GRBL_RX_BUFFER_SIZE, GRBL_SOFT_RESET, GRBL_STATUS_QUERY
+)
+
+logger = logging.getLogger(__name__)
+
+GRBL_BANNER = "Grbl 1.1h ['$' for help]"
+_REALTIME = frozenset(GRBL_STATUS_QUERY + GRBL_FEED_HOLD + GRBL_CYCLE_START + GRBL_SOFT_RESET)
+
+# GRBL 错误码
+ERROR_BAD_NUMBER = 'error:2'
+ERROR_LOCKED = 'error:9'
+ERROR_UNSUPPORTED = 'error:20'
+ERROR_UNDEFINED_FEED = 'error:22'
+ERROR_INJECTED = 'error:1'
+
+_WORD_RE = re.compile(r'([A-Z])([-+]?(?:\d+\.?\d*|\.\d+))')
+_COMMENT_RE = re.compile(r'\([^)]*\)|;.*$')
+_SUPPORTED_G = frozenset((0, 1, 2, 3, 4, 17, 20, 21, 28, 90, 91, 94))
+_SUPPORTED_M = frozenset((3, 4, 5))
+
+
+class _Block:
+    """规划器中的一个运动或暂停块"""
+
+    __slots__ = ('duration', 'start', 'end', 'feed', 'drawing', 'ok_on_finish')
+
+    def __init__(self, duration: float, start: Tuple[float, float], end: Tuple[float, float],
+                 feed: float, drawing: bool, ok_on_finish: bool = False):
+        self.duration = duration
+        self.start = start
+        self.end = end
+        self.feed = feed
+        self.drawing = drawing
+        self.ok_on_finish = ok_on_finish
+
+
+class GrblSimulator:
+    """离散事件的 GRBL 1.1 设备模型，用于离线测试发送策略与吞吐量
+
+    模型包括：
+        - 串口两个方向按波特率逐字节传输（每字节 10 位）；
+        - 固定大小的接收缓冲区，溢出的字节被丢弃（与真实固件一样导致指令损坏或丢失）；
+        - 规划器队列：运动指令在进入规划器时回复 ok，规划器满时解析暂停；
+          G4 / M3 / M5 / G28 与 $ 指令需要规划器先排空，G4 在暂停结束后才回复 ok；
+        - 运动时间按距离与进给速度计算（G0 使用 rapid_rate），不模拟加减速；
+        - 实时指令 ? ! ~ 与 Ctrl-X，状态报告为 <Run|MPos:x,y,0.000|Bf:块,字节|FS:进给,主轴>；
+        - 可选的随机错误注入与“在第 N 行后停止响应”，用于复现错误处理与超时。
+
+    模拟器不依赖真实时钟：调用方通过 advance / wait_for_output 推进模拟时间，
+    protocol_grblsim 据此实现按真实时间或虚拟时间运行的串口。
+    """
+
+    def __init__(self, baud_rate: int = 115200, rx_buffer_size: int = GRBL_RX_BUFFER_SIZE,
+                 planner_blocks: int = 16, rapid_rate: float = 3000.0, error_rate: float = 0.0,
+                 fail_after: Optional[int] = None, seed: int = 0):
+        self.byte_time = 10.0 / baud_rate
+        self.rx_buffer_size = rx_buffer_size
+        self.planner_blocks = planner_blocks
+        self.rapid_rate = rapid_rate
+        self.error_rate = error_rate
+        self.fail_after = fail_after
+        self._rng = random.Random(seed)
+        self.now = 0.0
+        # 主机 -> 设备：按到达时间排序的 (时间, 'line' / 'rt', 内容)
+        self._arrivals: Deque[Tuple[float, str, object]] = deque()
+        self._wire_free = 0.0
+        # 设备 -> 主机：(可读取的时间, 字节)
+        self._output: Deque[Tuple[float, bytes]] = deque()
+        self._output_free = 0.0
+        self._rx_lines: Deque[bytes] = deque()
+        self._rx_partial = bytearray()
+        self._rx_fill = 0
+        self._planner: Deque[_Block] = deque()
+        self._block_end: Optional[float] = None
+        self._hold_remaining: Optional[float] = None
+        self._dwell_pending = False
+        self._hung = False
+        self.state = 'Idle'
+        self.position = (0.0, 0.0)  # 规划终点（最后一条已解析指令之后的位置）
+        self._absolute = True
+        self._units = 1.0
+        self._feed = 0.0
+        self._motion_mode = 0  # 模态运动指令（G0-G3），省略 G 字时沿用
+        self._spindle = 0
+        self._reset_stats()
+        self._emit(GRBL_BANNER)
+
+    def _reset_stats(self) -> None:
+        self._stats = {
+            'lines': 0, 'ok': 0, 'errors': 0, 'rx_overflows': 0, 'bytes_dropped': 0,
+            'max_rx_fill': 0, 'motion_time_s': 0.0, 'dwell_time_s': 0.0, 'idle_gap_s': 0.0,
+            'draw_distance_mm': 0.0, 'travel_distance_mm': 0.0, 'status_reports': 0, 'resets': 0,
+        }
+        self._first_line_at: Optional[float] = None
+        self._last_block_end: Optional[float] = None
+        self._idle_since: Optional[float] = None
+
+    # ---- 主机接口 ----
+
+    def write(self, data: bytes) -> None:
+        """主机在当前模拟时间写入字节，按波特率排队到达设备"""
+        start = max(self.now, self._wire_free)
+        segment = bytearray()
+        for offset, byte in enumerate(data):
+            arrival = start + (offset + 1) * self.byte_time
+            if byte in _REALTIME:
+                self._arrivals.append((arrival, 'rt', byte))
+            elif byte == 0x0A:
+                self._arrivals.append((arrival, 'line', bytes(segment)))
+                segment.clear()
+            else:
+                segment.append(byte)
+        if segment:
+            # 没有换行结尾的部分随下一次写入的换行一起到达
+            self._arrivals.append((start + len(data) * self.byte_time, 'partial', bytes(segment)))
+        self._wire_free = start + len(data) * self.byte_time
+
+    def read(self) -> bytes:
+        """取出当前模拟时间之前已经到达主机的全部字节"""
+        chunks = []
+        while self._output and self._output[0][0] <= self.now:
+            chunks.append(self._output.popleft()[1])
+        return b''.join(chunks)
+
+    def output_waiting(self) -> int:
+        return sum(len(data) for at, data in self._output if at <= self.now)
+
+    def discard_output(self) -> None:
+        """丢弃已到达主机但尚未读取的字节（reset_input_buffer）"""
+        self.read()
+
+    def _next_device_event(self) -> Optional[float]:
+        times = []
+        if self._arrivals:
+            times.append(self._arrivals[0][0])
+        if self._block_end is not None:
+            times.append(self._block_end)
+        return min(times) if times else None
+
+    def next_event_time(self) -> Optional[float]:
+        """下一次设备状态变化或输出到达主机的模拟时间"""
+        next_time = self._next_device_event()
+        if self._output and (next_time is None or self._output[0][0] < next_time):
+            return self._output[0][0]
+        return next_time
+
+    def advance(self, until: float) -> None:
+        """处理 until 之前的全部事件，并把模拟时间推进到 until"""
+        while True:
+            next_time = self._next_device_event()
+            if next_time is None or next_time > until:
+                break
+            self._step(next_time)
+        self.now = max(self.now, until)
+
+    def wait_for_output(self, deadline: float = math.inf) -> bool:
+        """逐个处理事件直到主机有可读的字节；在 deadline 前不会有输出时推进到 deadline 并返回 False"""
+        while not (self._output and self._output[0][0] <= self.now):
+            next_time = self.next_event_time()
+            if next_time is None or next_time > deadline:
+                if deadline != math.inf:
+                    self.now = max(self.now, deadline)
+                return False
+            if self._output and next_time == self._output[0][0]:
+                self.now = max(self.now, next_time)
+            else:
+                self._step(next_time)
+        return True
+
+    # ---- 事件处理 ----
+
+    def _step(self, at: float) -> None:
+        self.now = max(self.now, at)
+        if self._block_end is not None and self._block_end <= self.now and \
+                not (self._arrivals and self._arrivals[0][0] < self._block_end):
+            self._finish_block()
+        elif self._arrivals and self._arrivals[0][0] <= self.now:
+            _, kind, payload = self._arrivals.popleft()
+            if kind == 'rt':
+                self._realtime(payload)
+            elif kind == 'line':
+                self._receive_line(payload)
+            else:
+                self._receive_partial(payload)
+        self._parse()
+
+    def _receive_partial(self, data: bytes) -> None:
+        space = self.rx_buffer_size - self._rx_fill
+        kept = data[:max(space, 0)]
+        self._rx_partial += kept
+        self._rx_fill += len(kept)
+        self._count_overflow(len(data) - len(kept))
+
+    def _receive_line(self, data: bytes) -> None:
+        space = self.rx_buffer_size - self._rx_fill
+        if len(data) + 1 > space:
+            # 缓冲区溢出：放不下的字节（包括换行）丢失，残余部分与下一行拼接
+            kept = data[:max(space, 0)]
+            self._rx_partial += kept
+            self._rx_fill += len(kept)
+            self._count_overflow(len(data) + 1 - len(kept))
+            return
+        line = bytes(self._rx_partial) + data
+        self._rx_partial.clear()
+        self._rx_lines.append(line)
+        self._rx_fill += len(data) + 1
+        self._stats['max_rx_fill'] = max(self._stats['max_rx_fill'], self._rx_fill)
+
+    def _count_overflow(self, dropped: int) -> None:
+        if dropped > 0:
+            self._stats['rx_overflows'] += 1
+            self._stats['bytes_dropped'] += dropped
+            logger.debug(f"模拟 GRBL 接收缓冲区溢出，丢弃 {dropped} 字节")
+
+    def _emit(self, text: str) -> None:
+        data = f"{text}\r\n".encode()
+        start = max(self.now, self._output_free)
+        self._output_free = start + len(data) * self.byte_time
+        self._output.append((self._output_free, data))
+
+    def _realtime(self, byte: int) -> None:
+        if byte == GRBL_STATUS_QUERY[0]:
+            self._stats['status_reports'] += 1
+            self._emit(self.status_report())
+        elif byte == GRBL_FEED_HOLD[0]:
+            if self._block_end is not None:
+                self._hold_remaining = self._block_end - self.now
+                self._block_end = None
+                self.state = 'Hold:0'
+        elif byte == GRBL_CYCLE_START[0]:
+            if self._hold_remaining is not None:
+                self._block_end = self.now + self._hold_remaining
+                self._hold_remaining = None
+                self.state = 'Run'
+        elif byte == GRBL_SOFT_RESET[0]:
+            self._soft_reset()
+
+    def _soft_reset(self) -> None:
+        moving = bool(self._planner)
+        if moving:
+            # 运动中复位会丢失位置，进入报警锁定
+            head = self._planner[0]
+            self.position = self._current_position(head)
+        self._rx_lines.clear()
+        self._rx_partial.clear()
+        self._rx_fill = 0
+        self._planner.clear()
+        self._block_end = None
+        self._hold_remaining = None
+        self._dwell_pending = False
+        self._motion_mode = 0
+        self._stats['resets'] += 1
+        if moving:
+            self.state = 'Alarm'
+            self._emit('ALARM:3')
+        else:
+            self.state = 'Idle'
+        self._emit('')
+        self._emit(GRBL_BANNER)
+        if moving:
+            self._emit("[MSG:'$H'|'$X' to unlock]")
+
+    def _current_position(self, head: Optional[_Block] = None) -> Tuple[float, float]:
+        head = head or (self._planner[0] if self._planner else None)
+        if head is None:
+            return self.position
+        if self._block_end is not None:
+            remaining = self._block_end - self.now
+        elif self._hold_remaining is not None:
+            remaining = self._hold_remaining
+        else:
+            remaining = head.duration
+        fraction = 1.0 - remaining / head.duration if head.duration > 0 else 1.0
+        fraction = min(max(fraction, 0.0), 1.0)
+        return (head.start[0] + (head.end[0] - head.start[0]) * fraction,
+                head.start[1] + (head.end[1] - head.start[1]) * fraction)
+
+    def status_report(self) -> str:
+        x, y = self._current_position()
+        head = self._planner[0] if self._planner else None
+        feed = head.feed if head is not None and self._block_end is not None else 0
+        planner_free = self.planner_blocks - len(self._planner)
+        rx_free = self.rx_buffer_size - self._rx_fill
+        return (f"<{self.state}|MPos:{x:.3f},{y:.3f},0.000|Bf:{planner_free},{rx_free}"
+                f"|FS:{feed:.0f},{self._spindle}>")
+
+    def _push_block(self, block: _Block) -> None:
+        self._planner.append(block)
+        if len(self._planner) == 1 and self._hold_remaining is None:
+            self._start_head()
+
+    def _start_head(self) -> None:
+        head = self._planner[0]
+        if self._idle_since is not None:
+            self._stats['idle_gap_s'] += self.now - self._idle_since
+            self._idle_since = None
+        self._block_end = self.now + head.duration
+        self.state = 'Run'
+
+    def _finish_block(self) -> None:
+        block = self._planner.popleft()
+        self.now = self._block_end
+        self._block_end = None
+        if block.ok_on_finish:
+            self._stats['dwell_time_s'] += block.duration
+            self._dwell_pending = False
+            self._reply('ok')
+        else:
+            self._stats['motion_time_s'] += block.duration
+        self._last_block_end = self.now
+        if self._planner:
+            self._start_head()
+        else:
+            self._idle_since = self.now
+            if self.state != 'Alarm':
+                self.state = 'Idle'
+
+    # ---- 指令解析 ----
+
+    def _reply(self, response: str) -> None:
+        self._stats['ok' if response == 'ok' else 'errors'] += 1
+        self._emit(response)
+
+    def _parse(self) -> None:
+        while self._rx_lines and not self._dwell_pending and not self._hung:
+            line = self._rx_lines[0]
+            if not self._execute(line):
+                break
+            self._rx_lines.popleft()
+            self._rx_fill -= len(line) + 1
+
+    def _execute(self, raw: bytes) -> bool:
+        """执行一行指令；需要等待规划器时返回 False，稍后重试"""
+        text = _COMMENT_RE.sub('', raw.decode(errors='replace')).replace(' ', '').upper()
+        if self.fail_after is not None and self._stats['lines'] >= self.fail_after:
+            self._hung = True
+            logger.warning(f"模拟 GRBL 在 {self._stats['lines']} 行后停止响应")
+            return False
+
+        if text.startswith('$'):
+            if self._planner:
+                return False
+            self._count_line()
+            if text in ('$X', '$H'):
+                self.state = 'Idle'
+                if text == '$X':
+                    self._emit('[MSG:Caution: Unlocked]')
+                else:
+                    self._home()
+                self._reply('ok')
+            elif text in ('$', '$$', '$#', '$G', '$I', '$N'):
+                self._reply('ok')
+            else:
+                self._reply(ERROR_UNSUPPORTED)
+            return True
+
+        words = _WORD_RE.findall(text)
+        if ''.join(letter + value for letter, value in words) != text:
+            self._count_line()
+            self._reply(ERROR_BAD_NUMBER)
+            return True
+        codes: Dict[str, List[float]] = {}
+        for letter, value in words:
+            codes.setdefault(letter, []).append(float(value))
+        g_codes = [int(v) for v in codes.get('G', ())]
+        m_codes = [int(v) for v in codes.get('M', ())]
+        has_target = 'X' in codes or 'Y' in codes
+        motion = next((g for g in g_codes if g in (0, 1, 2, 3)), None)
+        sync = any(g in (4, 28) for g in g_codes) or bool(m_codes)
+
+        if self.state == 'Alarm' and text:
+            self._count_line()
+            self._reply(ERROR_LOCKED)
+            return True
+        if sync and self._planner:
+            return False
+        if has_target and len(self._planner) >= self.planner_blocks:
+            return False
+
+        self._count_line()
+        if not text:
+            self._reply('ok')
+            return True
+        if any(g not in _SUPPORTED_G for g in g_codes) or any(m not in _SUPPORTED_M for m in m_codes):
+            self._reply(ERROR_UNSUPPORTED)
+            return True
+        if self.error_rate and self._rng.random() < self.error_rate:
+            self._reply(ERROR_INJECTED)
+            return True
+
+        for g in g_codes:
+            if g in (20, 21):
+                self._units = 25.4 if g == 20 else 1.0
+            elif g in (90, 91):
+                self._absolute = g == 90
+        if 'F' in codes:
+            self._feed = codes['F'][-1] * self._units
+        if 'S' in codes:
+            self._spindle = int(codes['S'][-1])
+        if motion is not None:
+            self._motion_mode = motion
+        if 4 in g_codes:
+            duration = codes.get('P', [0.0])[-1]
+            self._dwell_pending = True
+            self._push_block(_Block(duration, self.position, self.position, 0.0, False, ok_on_finish=True))
+            return True
+        if 28 in g_codes:
+            self._home()
+            self._reply('ok')
+            return True
+        if has_target:
+            mode = motion if motion is not None else self._motion_mode
+            error = self._plan_motion(mode, codes)
+            self._reply(error or 'ok')
+            return True
+        self._reply('ok')
+        return True
+
+    def _count_line(self) -> None:
+        self._stats['lines'] += 1
+        if self._first_line_at is None:
+            self._first_line_at = self.now
+
+    def _home(self) -> None:
+        self._add_move(self.position, (0.0, 0.0), self.rapid_rate, drawing=False)
+
+    def _plan_motion(self, mode: int, codes: Dict[str, List[float]]) -> Optional[str]:
+        start = self.position
+        x = codes['X'][-1] * self._units if 'X' in codes else None
+        y = codes['Y'][-1] * self._units if 'Y' in codes else None
+        if self._absolute:
+            end = (start[0] if x is None else x, start[1] if y is None else y)
+        else:
+            end = (start[0] + (x or 0.0), start[1] + (y or 0.0))
+        if mode == 0:
+            self._add_move(start, end, self.rapid_rate, drawing=False)
+            return None
+        if self._feed <= 0:
+            return ERROR_UNDEFINED_FEED
+        length = math.hypot(end[0] - start[0], end[1] - start[1])
+        if mode in (2, 3):
+            i = codes.get('I', [0.0])[-1] * self._units
+            j = codes.get('J', [0.0])[-1] * self._units
+            cx, cy = start[0] + i, start[1] + j
+            radius = math.hypot(i, j)
+            a0 = math.atan2(start[1] - cy, start[0] - cx)
+            a1 = math.atan2(end[1] - cy, end[0] - cx)
+            sweep = a1 - a0
+            if mode == 3:
+                sweep = sweep % (2 * math.pi) or 2 * math.pi
+            else:
+                sweep = -((-sweep) % (2 * math.pi) or 2 * math.pi)
+            length = radius * abs(sweep)
+        self._add_move(start, end, self._feed, drawing=True, length=length)
+        return None
+
+    def _add_move(self, start: Tuple[float, float], end: Tuple[float, float], feed: float,
+                  drawing: bool, length: Optional[float] = None) -> None:
+        if length is None:
+            length = math.hypot(end[0] - start[0], end[1] - start[1])
+        self.position = end
+        if length <= 0:
+            return
+        self._stats['draw_distance_mm' if drawing else 'travel_distance_mm'] += length
+        self._push_block(_Block(length / (feed / 60.0), start, end, feed, drawing))
+
+    # ---- 统计 ----
+
+    def projected_end(self) -> float:
+        """规划器中现有指令全部执行完毕的模拟时间"""
+        if not self._planner:
+            return self._last_block_end or self.now
+        if self._block_end is not None:
+            end = self._block_end
+        else:
+            end = self.now + (self._hold_remaining if self._hold_remaining is not None else self._planner[0].duration)
+        return end + sum(block.duration for block in list(self._planner)[1:])
+
+    def stats(self) -> Dict:
+        stats = dict(self._stats)
+        for key in ('motion_time_s', 'dwell_time_s', 'idle_gap_s', 'draw_distance_mm', 'travel_distance_mm'):
+            stats[key] = round(stats[key], 3)
+        started = self._first_line_at if self._first_line_at is not None else self.now
+        stats.update({
+            'sim_time_s': round(self.now, 3),
+            'plot_time_s': round(max(self.projected_end() - started, 0.0), 3),
+            'planner_blocks': len(self._planner),
+            'state': self.state,
+            'hung': self._hung,
+        })
+        return stats
@@ -0,0 +1,161 @@
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 状态报告中数值列表类字段：字段名 -> 输出键名
+_VECTOR_FIELDS = {'MPos': 'mpos', 'WPos': 'wpos', 'WCO': 'wco', 'Ov': 'overrides'}
+
+
+def _floats(text: str) -> List[float]:
+    return [float(value) for value in text.split(',')]
+
+
+def parse_status_report(line: str) -> Optional[Dict[str, Any]]:
+    """解析 GRBL 1.1 状态报告，如 <Idle|MPos:0.000,0.000,0.000|Bf:15,128|FS:0,0>
+
+    只报告 WPos 时在已知 WCO 的情况下换算为 MPos；position 取机器坐标（无法换算时为工件坐标）。
+    格式不正确时返回 None。
+    """
+    line = line.strip()
+    if not (line.startswith('<') and line.endswith('>')):
+        return None
+    fields = line[1:-1].split('|')
+    state, _, substate = fields[0].partition(':')
+    report: Dict[str, Any] = {'state': state, 'substate': int(substate) if substate.isdigit() else None}
+    try:
+        for field in fields[1:]:
+            name, _, value = field.partition(':')
+            if name in _VECTOR_FIELDS:
+                report[_VECTOR_FIELDS[name]] = _floats(value)
+            elif name == 'Bf':
+                planner_free, rx_free = value.split(',')
+                report['planner_free'] = int(planner_free)
+                report['rx_free'] = int(rx_free)
+            elif name in ('FS', 'F'):
+                values = _floats(value)
+                report['feed'] = values[0]
+                if len(values) > 1:
+                    report['spindle'] = values[1]
+            elif name == 'Ln':
+                report['line'] = int(value)
+            elif name == 'Pn':
+                report['pins'] = value
+            elif name == 'A':
+                report['accessories'] = value
+    except ValueError:
+        logger.debug(f"无法解析的状态报告: {line}")
+        return None
+    if 'mpos' not in report and 'wpos' in report and 'wco' in report:
+        report['mpos'] = [w + o for w, o in zip(report['wpos'], report['wco'])]
+    report['position'] = report.get('mpos') or report.get('wpos')
+    return report
+
+
+class MachineStatus:
+    """最近一次机器状态的线程安全快照，version 在每次变化时递增，供事件流等待"""
+
+    def __init__(self):
+        self.connected = False
+        self.state = None  # Idle / Run / Hold / Alarm ...，None 表示未知
+        self.report: Dict[str, Any] = {}
+        self.updated_at = None
+        self.version = 0
+        self._changed = threading.Condition(threading.RLock())
+
+    def update_from_report(self, line: str) -> bool:
+        """用一行状态报告更新快照，不是状态报告时返回 False"""
+        report = parse_status_report(line)
+        if report is None:
+            return False
+        with self._changed:
+            changed = not self.connected or report != self.report
+            self.connected = True
+            self.state = report['state']
+            self.report = report
+            self.updated_at = time.time()
+            if changed:
+                self.version += 1
+                self._changed.notify_all()
+        return True
+
+    def set_connected(self, connected: bool) -> None:
+        with self._changed:
+            if connected == self.connected:
+                return
+            self.connected = connected
+            if not connected:
+                self.state = None
+                self.report = {}
+            self.version += 1
+            self._changed.notify_all()
+
+    def wait_for_change(self, version: int, timeout: float) -> int:
+        """阻塞直到 version 变化或超时，返回当前 version"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._changed:
+            return {
+                'connected': self.connected,
+                'state': self.state,
+                'position': self.report.get('position'),
+                'feed': self.report.get('feed'),
+                'spindle': self.report.get('spindle'),
+                'planner_free': self.report.get('planner_free'),
+                'rx_free': self.report.get('rx_free'),
+                'updated_at': self.updated_at,
+                'version': self.version,
+            }
+
+
+class StatusPoller:
+    """连接的后台维护线程：按固定频率向 GRBL 发送 ? 实时查询，断线后自动重连
+
+    无人读取串口时短暂持有串口读取锁，发送查询并读取这一行报告，不占用任务锁，机器不会因此显示为忙；
+    有任务在读取串口时只写入 ?，报告由正在读取响应的发送器（GrblStreamer / 逐行发送）转交给 MachineStatus。
+    ? 是实时指令，GRBL 在接收时即取出处理，不占用接收缓冲区，也不会打断正在传输的指令行。
+    interval 为 0 时不查询状态，只每秒检查一次是否需要重连；主动断开连接时线程退出。
+    """
+
+    def __init__(self, controller, interval: float = 0.2):
+        self.controller = controller
+        self.interval = interval
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        with self._lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='grbl-status-poller', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=max(self.interval, 1.0) + 1)
+
+    def _run(self) -> None:
+        controller = self.controller
+        period = self.interval if self.interval > 0 else 1.0
+        while not self._stop.wait(period):
+            try:
+                if not controller.connected:
+                    controller.reconnect()
+                elif self.interval > 0:
+                    controller.poll_status()
+            except Exception as e:
+                logger.warning(f"维护机器连接时出错: {str(e)}")
+        logger.debug("机器状态轮询已停止")
@@ -0,0 +1,231 @@
+import time
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# GRBL 串口接收缓冲区大小（字节）
+GRBL_RX_BUFFER_SIZE = 128
+
+# GRBL 实时指令（无需换行，可插入到指令流任意位置）
+GRBL_STATUS_QUERY = b'?'
+GRBL_FEED_HOLD = b'!'
+GRBL_CYCLE_START = b'~'
+GRBL_SOFT_RESET = b'\x18'
+
+
+class StreamCancelled(Exception):
+    """发送任务被取消"""
+
+
+class StreamStats:
+    """一次发送任务的吞吐量统计"""
+
+    def __init__(self, mode: str, rx_buffer_size: int):
+        self.mode = mode
+        self.rx_buffer_size = rx_buffer_size
+        self.lines_sent = 0
+        self.lines_acked = 0
+        self.bytes_sent = 0
+        self.errors: List[Dict] = []
+        self.unmatched_acks = 0  # 没有对应在途指令的 ok / error
+        self.start_time = time.time()
+        self.end_time = None
+        self._fill_samples = 0
+        self._fill_total = 0
+        self.max_buffer_fill = 0
+
+    def sample_fill(self, fill: int) -> None:
+        self._fill_samples += 1
+        self._fill_total += fill
+        self.max_buffer_fill = max(self.max_buffer_fill, fill)
+
+    def finish(self) -> None:
+        self.end_time = time.time()
+
+    @property
+    def elapsed(self) -> float:
+        end = self.end_time if self.end_time is not None else time.time()
+        return max(end - self.start_time, 1e-9)
+
+    def to_dict(self) -> Dict:
+        avg_fill = self._fill_total / self._fill_samples if self._fill_samples else 0.0
+        return {
+            'mode': self.mode,
+            'lines_sent': self.lines_sent,
+            'lines_acked': self.lines_acked,
+            'bytes_sent': self.bytes_sent,
+            'errors': list(self.errors),
+            'unmatched_acks': self.unmatched_acks,
+            'elapsed_s': round(self.elapsed, 3),
+            'lines_per_s': round(self.lines_acked / self.elapsed, 2),
+            'bytes_per_s': round(self.bytes_sent / self.elapsed, 2),
+            'avg_buffer_fill': round(avg_fill / self.rx_buffer_size, 3),
+            'max_buffer_fill': round(self.max_buffer_fill / self.rx_buffer_size, 3),
+        }
+
+
+class GrblStreamer:
+    """基于字符计数的 GRBL 流式发送器
+
+    在不超过 GRBL 接收缓冲区的前提下尽可能多地发送指令，并按顺序把每个
+    "ok" / "error:N" 响应匹配到触发它的那一行。serial_port 只需提供
+    write / readline 接口，因此可以直接使用模拟串口进行测试。
+
+    pause / resume / cancel 可以从其他线程调用，分别发送 GRBL 的
+    进给保持、循环启动和软复位实时指令。
+    """
+
+    def __init__(self, serial_port, rx_buffer_size: int = GRBL_RX_BUFFER_SIZE,
+                 timeout: float = 30.0, abort_on_error: bool = True,
+                 line_callback: Optional[Callable[[int, str, str], None]] = None,
+                 max_in_flight: Optional[int] = None,
+                 status_callback: Optional[Callable[[str], bool]] = None):
+        self.serial = serial_port
+        self.rx_buffer_size = rx_buffer_size
+        self.timeout = timeout  # 无任何响应的最长等待时间（秒）
+        self.abort_on_error = abort_on_error
+        self.line_callback = line_callback  # (行号, 指令, 响应) 回调
+        self.max_in_flight = max_in_flight  # 为 1 时退化为逐行应答模式
+        self.status_callback = status_callback  # 收到 <...> 状态报告时回调
+        self.stats = None
+        self._write_lock = threading.Lock()
+        self._paused = threading.Event()
+        self._cancelled = threading.Event()
+
+    def _write(self, data: bytes) -> None:
+        with self._write_lock:
+            self.serial.write(data)
+
+    @property
+    def paused(self) -> bool:
+        return self._paused.is_set()
+
+    def pause(self) -> None:
+        """进给保持：机器减速停止，暂停发送新指令"""
+        self._paused.set()
+        self._write(GRBL_FEED_HOLD)
+        logger.info("已发送进给保持指令")
+
+    def resume(self) -> None:
+        """循环启动：从进给保持中恢复"""
+        self._write(GRBL_CYCLE_START)
+        self._paused.clear()
+        logger.info("已发送循环启动指令")
+
+    def cancel(self) -> None:
+        """软复位：清空 GRBL 缓冲区并立即停止"""
+        self._cancelled.set()
+        self._paused.clear()
+        self._write(GRBL_SOFT_RESET)
+        logger.warning("已发送软复位指令")
+
+    def _read_response(self) -> Optional[str]:
+        """读取一行响应，超时返回 None"""
+        raw = self.serial.readline()
+        if not raw:
+            return None
+        return raw.decode(errors='ignore').strip()
+
+    def stream(self, lines: Iterable[str]) -> StreamStats:
+        """以字符计数方式发送 G-code 行，返回统计信息
+
+        异常：
+            StreamCancelled: 调用了 cancel
+            TimeoutError: 超过 timeout 秒未收到任何响应
+            RuntimeError: GRBL 报告 ALARM，或在 abort_on_error 时收到 error
+        """
+        stats = StreamStats('pingpong' if self.max_in_flight == 1 else 'stream', self.rx_buffer_size)
+        self.stats = stats
+        in_flight = deque()  # (行号, 指令, 字节数)
+        buffer_fill = 0
+        aborted = False
+
+        def wait_for_ack() -> None:
+            nonlocal buffer_fill, aborted
+            last_activity = time.time()
+            while True:
+                if self._cancelled.is_set():
+                    raise StreamCancelled("发送任务已取消")
+                response = self._read_response()
+                if response is None or response == '':
+                    # 进给保持期间机器不会确认新指令，不计入超时
+                    if self._paused.is_set():
+                        last_activity = time.time()
+                    elif time.time() - last_activity > self.timeout:
+                        raise TimeoutError(f"等待 GRBL 响应超时（{self.timeout} 秒）")
+                    continue
+                last_activity = time.time()
+                if response.startswith('<'):
+                    # 状态轮询线程发出的 ? 查询，报告夹在 ok 之间返回
+                    if self.status_callback:
+                        self.status_callback(response)
+                    continue
+                lowered = response.lower()
+                if lowered == 'ok' or lowered.startswith('error'):
+                    if not in_flight:
+                        # 软复位前残留的应答或设备多回复的一行：没有可匹配的指令，记录后忽略
+                        stats.unmatched_acks += 1
+                        logger.warning(f"收到没有对应指令的应答，已忽略: {response}")
+                        continue
+                    line_no, gcode, size = in_flight.popleft()
+                    buffer_fill -= size
+                    stats.lines_acked += 1
+                    if self.line_callback:
+                        self.line_callback(line_no, gcode, response)
+                    if lowered.startswith('error'):
+                        logger.error(f"第 {line_no} 行指令 '{gcode}' 返回错误: {response}")
+                        stats.errors.append({'line': line_no, 'gcode': gcode, 'response': response})
+                        if self.abort_on_error:
+                            aborted = True
+                    else:
+                        logger.debug(f"第 {line_no} 行已确认: {gcode}")
+                    return
+                if lowered.startswith('alarm'):
+                    # 运动中软复位会先报告 ALARM:3，属于取消而不是故障
+                    if self._cancelled.is_set():
+                        raise StreamCancelled("发送任务已取消")
+                    raise RuntimeError(f"GRBL 报警: {response}")
+                logger.debug(f"GRBL 消息: {response}")
+
+        try:
+            for line_no, line in enumerate(lines, start=1):
+                gcode = line.strip()
+                if not gcode:
+                    continue
+                data = f"{gcode}\n".encode()
+                size = len(data)
+                if size > self.rx_buffer_size:
+                    raise ValueError(f"指令长度超过 GRBL 缓冲区: {gcode}")
+                while self._paused.is_set() and not self._cancelled.is_set():
+                    time.sleep(0.05)
+                if self._cancelled.is_set():
+                    raise StreamCancelled("发送任务已取消")
+                # 缓冲区放不下时等待最早的一行被确认
+                while in_flight and (buffer_fill + size > self.rx_buffer_size or
+                                     (self.max_in_flight and len(in_flight) >= self.max_in_flight)):
+                    wait_for_ack()
+                    if aborted:
+                        break
+                if aborted:
+                    break
+                self._write(data)
+                in_flight.append((line_no, gcode, size))
+                buffer_fill += size
+                stats.lines_sent += 1
+                stats.bytes_sent += size
+                stats.sample_fill(buffer_fill)
+            # 等待剩余指令全部确认
+            while in_flight:
+                wait_for_ack()
+        finally:
+            stats.finish()
+
+        if aborted:
+            raise RuntimeError(f"GRBL 返回错误，已停止发送: {stats.errors[0]['response']}")
+        summary = stats.to_dict()
+        logger.info(f"流式发送完成: {summary['lines_acked']} 行, {summary['lines_per_s']} 行/秒, "
+                    f"{summary['bytes_per_s']} 字节/秒, 平均缓冲区占用 {summary['avg_buffer_fill']:.0%}")
+        return stats
@@ -0,0 +1,337 @@
+import math
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from hardware.toolpath_reducer import rdp_indices
+
+logger = logging.getLogger(__name__)
+
+
+class _Polyline:
+    """一条连续子路径：闭合轮廓可从任意顶点开始，开放路径可反向绘制"""
+
+    def __init__(self, points: np.ndarray, closed: bool, rapid_feed: Optional[float],
+                 draw_feed: Optional[float]):
+        self.points = points
+        self.closed = closed
+        self.rapid_feed = rapid_feed
+        self.draw_feed = draw_feed
+        self.start = 0  # 闭合轮廓的起始顶点索引
+        self.reversed = False
+        self.bbox = (points[:, 0].min(), points[:, 1].min(), points[:, 0].max(), points[:, 1].max())
+
+    def entry(self) -> np.ndarray:
+        if self.closed:
+            return self.points[self.start]
+        return self.points[-1] if self.reversed else self.points[0]
+
+    def exit(self) -> np.ndarray:
+        if self.closed:
+            return self.points[self.start]
+        return self.points[0] if self.reversed else self.points[-1]
+
+    def to_commands(self) -> List[Dict]:
+        if self.closed:
+            pts = np.vstack((self.points[self.start:], self.points[:self.start + 1]))
+        else:
+            pts = self.points[::-1] if self.reversed else self.points
+        commands = []
+        first = {'type': 'G0', 'x': float(pts[0][0]), 'y': float(pts[0][1])}
+        if self.rapid_feed is not None:
+            first['f'] = self.rapid_feed
+        commands.append(first)
+        for x, y in pts[1:]:
+            cmd = {'type': 'G1', 'x': float(x), 'y': float(y)}
+            if self.draw_feed is not None:
+                cmd['f'] = self.draw_feed
+            commands.append(cmd)
+        return commands
+
+
+# 顶点数超过此值的外轮廓在包含判断前先简化，较小的轮廓简化本身的开销高于收益
+_SIMPLIFY_MIN_VERTICES = 256
+
+# 路径状态：可绘制 / 被内部路径阻塞 / 已绘制
+_USABLE, _BLOCKED, _VISITED = 0, 1, 2
+
+
+class _SpatialGrid:
+    """均匀网格空间索引，用于查找距当前笔位最近的可用路径入口"""
+
+    def __init__(self, points: np.ndarray, owners: np.ndarray, cell_size: float):
+        self.points = points
+        self.owners = owners
+        self.cell_size = cell_size
+        self.origin = points.min(axis=0)
+        cells = np.floor((points - self.origin) / cell_size).astype(np.int64)
+        self.max_cell = cells.max(axis=0)
+        keys = cells[:, 0] * (int(self.max_cell[1]) + 1) + cells[:, 1]
+        sort = np.argsort(keys, kind='stable')
+        unique_keys, starts = np.unique(keys[sort], return_index=True)
+        bounds = np.append(starts, len(sort))
+        width = int(self.max_cell[1]) + 1
+        self.cells: Dict[Tuple[int, int], np.ndarray] = {
+            (int(k) // width, int(k) % width): sort[bounds[n]:bounds[n + 1]]
+            for n, k in enumerate(unique_keys.tolist())
+        }
+
+    def nearest(self, position: np.ndarray, state: np.ndarray) -> Optional[int]:
+        """返回所属路径状态为可绘制的最近点索引，不存在时返回 None"""
+        cx, cy = np.floor((position - self.origin) / self.cell_size).astype(np.int64).tolist()
+        max_ring = int(max(abs(cx), abs(cy), abs(self.max_cell[0] - cx), abs(self.max_cell[1] - cy))) + 1
+        best_idx = None
+        best_dist = math.inf
+        for ring in range(max_ring + 1):
+            # 环内所有点到当前位置的距离下界
+            if best_idx is not None and best_dist <= (ring - 1) * self.cell_size:
+                break
+            for gx in range(cx - ring, cx + ring + 1):
+                for gy in (range(cy - ring, cy + ring + 1) if gx in (cx - ring, cx + ring)
+                           else (cy - ring, cy + ring)):
+                    bucket = self.cells.get((gx, gy))
+                    if bucket is None or len(bucket) == 0:
+                        continue
+                    owner_state = state[self.owners[bucket]]
+                    # 惰性删除已经绘制过的路径的点
+                    if (owner_state == _VISITED).any():
+                        keep = owner_state != _VISITED
+                        bucket = bucket[keep]
+                        owner_state = owner_state[keep]
+                        self.cells[(gx, gy)] = bucket
+                    bucket = bucket[owner_state == _USABLE]
+                    if len(bucket) == 0:
+                        continue
+                    d = np.hypot(*(self.points[bucket] - position).T)
+                    k = int(np.argmin(d))
+                    if d[k] < best_dist:
+                        best_dist = float(d[k])
+                        best_idx = int(bucket[k])
+        return best_idx
+
+
+class PathOptimizer:
+    """减少抬笔空行程的路径排序
+
+    贪心最近邻 + 2-opt 重排路径，为闭合轮廓选择起点、可选地反向开放路径，
+    同时保持"先内后外"的约束：被闭合轮廓包含的路径总是先于该轮廓绘制。
+    """
+
+    def __init__(self, allow_reverse: bool = True, two_opt_window: int = 50,
+                 two_opt_passes: int = 3, close_tolerance: float = 1e-6,
+                 containment_tolerance: float = 0.0):
+        self.allow_reverse = allow_reverse
+        self.two_opt_window = two_opt_window
+        self.two_opt_passes = two_opt_passes
+        self.close_tolerance = close_tolerance
+        # 包含判断前按此容差（mm）简化外轮廓，与刀路精简的容差一致时判断结果与实际绘制的轮廓相符
+        self.containment_tolerance = containment_tolerance
+        self.stats: Dict = {}
+
+    def _split(self, paths: List[List[Dict]]) -> List[_Polyline]:
+        """把指令列表拆分为以 G0 开头的连续子路径"""
+        polylines = []
+        for commands in paths:
+            current = []
+            rapid_feed = draw_feed = None
+            for cmd in commands + [None]:
+                if cmd is None or cmd['type'] == 'G0':
+                    if len(current) >= 2:
+                        pts = np.asarray(current, dtype=np.float64)
+                        closed = bool(np.hypot(*(pts[0] - pts[-1])) <= self.close_tolerance)
+                        if closed:
+                            pts = pts[:-1]
+                        polylines.append(_Polyline(pts, closed and len(pts) >= 2, rapid_feed, draw_feed))
+                    if cmd is None:
+                        break
+                    current = [(cmd['x'], cmd['y'])]
+                    rapid_feed = cmd.get('f')
+                    draw_feed = None
+                else:
+                    if not current:
+                        current = [(0.0, 0.0)]
+                    current.append((cmd['x'], cmd['y']))
+                    draw_feed = cmd.get('f', draw_feed)
+        return polylines
+
+    def _containment(self, polys: List[_Polyline]) -> List[List[int]]:
+        """inner[i] 为必须先于闭合轮廓 i 绘制的路径索引"""
+        n = len(polys)
+        inner = [[] for _ in range(n)]
+        if n < 2:
+            return inner
+        boxes = np.array([p.bbox for p in polys])
+        for i, outer in enumerate(polys):
+            if not outer.closed:
+                continue
+            inside = ((boxes[:, 0] >= boxes[i, 0]) & (boxes[:, 1] >= boxes[i, 1]) &
+                      (boxes[:, 2] <= boxes[i, 2]) & (boxes[:, 3] <= boxes[i, 3]))
+            inside[i] = False
+            candidates = np.nonzero(inside)[0]
+            if len(candidates) == 0:
+                continue
+            # 射线法判断候选路径的代表点（首顶点）是否位于轮廓内部
+            probes = np.array([polys[j].points[0] for j in candidates])
+            outline = outer.points
+            if self.containment_tolerance > 0 and len(outline) > _SIMPLIFY_MIN_VERTICES:
+                # 射线法的开销与轮廓顶点数成正比，顶点多时先简化轮廓再判断（首点重复以保留闭合边）
+                ring = np.vstack((outline, outline[:1]))
+                outline = ring[rdp_indices(ring, self.containment_tolerance)[:-1]]
+            xs, ys = outline[:, 0], outline[:, 1]
+            xe, ye = np.roll(xs, -1), np.roll(ys, -1)
+            px, py = probes[:, 0:1], probes[:, 1:2]
+            crosses = (ys > py) != (ye > py)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                x_at = xs + (py - ys) * (xe - xs) / (ye - ys)
+            hit = np.count_nonzero(crosses & (px < x_at), axis=1) % 2 == 1
+            area_i = (boxes[i, 2] - boxes[i, 0]) * (boxes[i, 3] - boxes[i, 1])
+            for j, is_inside in zip(candidates.tolist(), hit.tolist()):
+                area_j = (boxes[j, 2] - boxes[j, 0]) * (boxes[j, 3] - boxes[j, 1])
+                # 包围盒相同的一对轮廓只约束一个方向，避免循环依赖
+                if is_inside and (area_j < area_i or (area_j == area_i and j < i)):
+                    inner[i].append(j)
+        return inner
+
+    @staticmethod
+    def _travel(polys: List[_Polyline], order: List[int], origin: np.ndarray) -> float:
+        total = 0.0
+        position = origin
+        for idx in order:
+            total += float(np.hypot(*(polys[idx].entry() - position)))
+            position = polys[idx].exit()
+        return total
+
+    def _greedy(self, polys: List[_Polyline], inner: List[List[int]], origin: np.ndarray) -> List[int]:
+        n = len(polys)
+        blocking = [len(v) for v in inner]
+        outers = [[] for _ in range(n)]
+        for i, children in enumerate(inner):
+            for j in children:
+                outers[j].append(i)
+
+        all_points = []
+        owners = []
+        for idx, poly in enumerate(polys):
+            if poly.closed:
+                all_points.append(poly.points)
+                owners.append(np.full(len(poly.points), idx))
+            else:
+                ends = [poly.points[0]] + ([poly.points[-1]] if self.allow_reverse else [])
+                all_points.append(np.array(ends))
+                owners.append(np.full(len(ends), idx))
+        points = np.vstack(all_points)
+        owners = np.concatenate(owners)
+        span = float(np.max(points.max(axis=0) - points.min(axis=0)))
+        cell_size = max(span / max(math.sqrt(n), 1.0), 1e-6)
+        grid = _SpatialGrid(points, owners, cell_size)
+
+        state = np.array([_USABLE if b == 0 else _BLOCKED for b in blocking], dtype=np.int8)
+        order = []
+        position = origin
+        for _ in range(n):
+            idx = grid.nearest(position, state)
+            if idx is None:
+                # 理论上不会发生（约束无环），兜底按原顺序取第一个可用路径
+                owner = int(np.nonzero(state == _USABLE)[0][0])
+                point = polys[owner].points[0]
+            else:
+                owner = int(owners[idx])
+                point = points[idx]
+            poly = polys[owner]
+            if poly.closed:
+                poly.start = int(np.argmin(np.hypot(*(poly.points - point).T)))
+            else:
+                poly.reversed = self.allow_reverse and not np.array_equal(point, poly.points[0])
+            state[owner] = _VISITED
+            order.append(owner)
+            for parent in outers[owner]:
+                blocking[parent] -= 1
+                if blocking[parent] == 0:
+                    state[parent] = _USABLE
+            position = poly.exit()
+        return order
+
+    def _two_opt(self, polys: List[_Polyline], order: List[int], inner: List[List[int]],
+                 origin: np.ndarray) -> List[int]:
+        n = len(order)
+        if n < 3:
+            return order
+        constrained = [set(children) for children in inner]
+        entry = [tuple(p.entry().tolist()) for p in polys]
+        exit_ = [tuple(p.exit().tolist()) for p in polys]
+        start = tuple(origin.tolist())
+
+        def dist(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+            return math.hypot(a[0] - b[0], a[1] - b[1])
+
+        for _ in range(self.two_opt_passes):
+            improved = False
+            for i in range(n - 1):
+                prev_exit = start if i == 0 else exit_[order[i - 1]]
+                for j in range(i + 1, min(n, i + self.two_opt_window)):
+                    first, last = order[i], order[j]
+                    # 反转后 last 先绘制，开放路径的入口与出口互换
+                    old = dist(prev_exit, entry[first])
+                    new = dist(prev_exit, exit_[last])
+                    if j + 1 < n:
+                        nxt_entry = entry[order[j + 1]]
+                        old += dist(exit_[last], nxt_entry)
+                        new += dist(entry[first], nxt_entry)
+                    if new >= old - 1e-9:
+                        continue
+                    segment = order[i:j + 1]
+                    if not self.allow_reverse and any(not polys[k].closed for k in segment):
+                        continue
+                    members = set(segment)
+                    if any(constrained[k] & members for k in segment):
+                        continue
+                    for k in segment:
+                        if not polys[k].closed:
+                            polys[k].reversed = not polys[k].reversed
+                            entry[k], exit_[k] = exit_[k], entry[k]
+                    order[i:j + 1] = segment[::-1]
+                    improved = True
+            if not improved:
+                break
+        return order
+
+    def _reselect_starts(self, polys: List[_Polyline], order: List[int], origin: np.ndarray) -> None:
+        """按最终顺序重新为闭合轮廓选择离上一笔最近的起点"""
+        position = origin
+        for idx in order:
+            poly = polys[idx]
+            if poly.closed:
+                poly.start = int(np.argmin(np.hypot(*(poly.points - position).T)))
+            position = poly.exit()
+
+    def optimize(self, paths: List[List[Dict]], origin: Tuple[float, float] = (0.0, 0.0)) -> List[List[Dict]]:
+        """重排路径以减少空行程
+
+        参数：
+            paths: 每条路径为 _parse_svg_path 输出的指令字典列表
+            origin: 起始笔位（回原点后为 0,0）
+
+        返回：
+            List[List[Dict]]: 重排后的路径指令
+        """
+        polys = self._split(paths)
+        start = np.asarray(origin, dtype=np.float64)
+        if not polys:
+            self.stats = {'paths': 0, 'travel_before_mm': 0.0, 'travel_after_mm': 0.0}
+            return []
+        travel_before = self._travel(polys, list(range(len(polys))), start)
+        inner = self._containment(polys)
+        order = self._greedy(polys, inner, start)
+        order = self._two_opt(polys, order, inner, start)
+        self._reselect_starts(polys, order, start)
+        travel_after = self._travel(polys, order, start)
+        self.stats = {
+            'paths': len(polys),
+            'reversed_paths': sum(1 for p in polys if p.reversed),
+            'travel_before_mm': round(travel_before, 2),
+            'travel_after_mm': round(travel_after, 2),
+            'travel_saved_ratio': round(1 - travel_after / travel_before, 3) if travel_before else 0.0,
+        }
+        logger.info(f"路径排序完成: 空行程 {self.stats['travel_before_mm']} mm -> {self.stats['travel_after_mm']} mm")
+        return [polys[idx].to_commands() for idx in order]
@@ -0,0 +1,240 @@
+import time
+import uuid
+import queue
+import logging
+import threading
+import traceback
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from serial import SerialException
+
+from hardware.grbl_streamer import StreamCancelled
+
+logger = logging.getLogger(__name__)
+
+
+class JobStateError(ValueError):
+    """任务当前状态不允许该操作"""
+
+
+class PlotJob:
+    """一次绘图任务的状态与进度"""
+
+    def __init__(self, svg_data: Optional[str], mode: str, program=None):
+        self.id = uuid.uuid4().hex
+        self.svg_data = svg_data
+        # 预先编译好的 PlotProgram；为 None 时在执行前编译 svg_data
+        self.program = program
+        self.mode = mode
+        self.status = 'queued'  # queued / running / paused / completed / failed / cancelled
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.total_lines = 0
+        self.acked_lines = 0
+        self.current_line = None
+        self.error = None
+        self.compile_stats = None
+        self.send_stats = None
+        self.streamer = None
+        self.cancel_requested = False
+        self._paused_total = 0.0
+        self._paused_since = None
+        self._lock = threading.Lock()
+
+    def on_line(self, line_no: int, gcode: str, response: str) -> None:
+        """GrblStreamer 的逐行确认回调"""
+        with self._lock:
+            self.acked_lines += 1
+            self.current_line = {'number': line_no, 'gcode': gcode, 'response': response}
+
+    def mark_paused(self) -> None:
+        with self._lock:
+            self.status = 'paused'
+            self._paused_since = time.time()
+
+    def mark_resumed(self) -> None:
+        with self._lock:
+            self.status = 'running'
+            if self._paused_since is not None:
+                self._paused_total += time.time() - self._paused_since
+                self._paused_since = None
+
+    def _active_elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        end = self.finished_at or time.time()
+        paused = self._paused_total
+        if self._paused_since is not None:
+            paused += end - self._paused_since
+        return max(end - self.started_at - paused, 0.0)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            elapsed = self._active_elapsed()
+            percent = 100.0 * self.acked_lines / self.total_lines if self.total_lines else 0.0
+            eta = None
+            if self.status in ('running', 'paused'):
+                if self.acked_lines:
+                    eta = elapsed * (self.total_lines - self.acked_lines) / self.acked_lines
+                elif self.compile_stats:
+                    eta = self.compile_stats.get('estimated_time_s')
+            return {
+                'id': self.id,
+                'status': self.status,
+                'mode': self.mode,
+                'program_id': self.program.id if self.program is not None else None,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'total_lines': self.total_lines,
+                'acked_lines': self.acked_lines,
+                'percent': round(percent, 1),
+                'current_line': self.current_line,
+                'elapsed_s': round(elapsed, 1),
+                'eta_s': round(eta, 1) if eta is not None else None,
+                'error': self.error,
+                'compile_stats': self.compile_stats,
+                'send_stats': self.send_stats,
+            }
+
+
+class PlotJobManager:
+    """后台绘图任务队列
+
+    单个工作线程从队列中依次取出任务并独占串口执行，HTTP 请求只负责
+    提交任务、查询进度以及暂停 / 继续 / 取消。
+    """
+
+    def __init__(self, controller, history_size: int = 50):
+        self.controller = controller
+        self.history_size = history_size
+        self._queue = queue.Queue()
+        self._jobs: "OrderedDict[str, PlotJob]" = OrderedDict()
+        self._jobs_lock = threading.Lock()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    def _ensure_worker(self) -> None:
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='plot-job-worker', daemon=True)
+                self._worker.start()
+
+    def submit(self, svg_data: Optional[str] = None, mode: str = 'stream', program=None) -> PlotJob:
+        """提交绘图任务（SVG 或预编译的 PlotProgram），立即返回任务对象"""
+        if mode not in ('pingpong', 'stream'):
+            raise ValueError(f"不支持的发送模式: {mode}")
+        if svg_data is None and program is None:
+            raise ValueError("缺少 SVG 数据或绘图程序")
+        job = PlotJob(svg_data, mode, program)
+        with self._jobs_lock:
+            self._jobs[job.id] = job
+            self._trim_history()
+        self._queue.put(job)
+        self._ensure_worker()
+        logger.info(f"已提交绘图任务 {job.id}（模式: {mode}）")
+        return job
+
+    def _trim_history(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items()
+                    if job.status in ('completed', 'failed', 'cancelled')]
+        for job_id in finished[:max(len(self._jobs) - self.history_size, 0)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[PlotJob]:
+        with self._jobs_lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[Dict]:
+        with self._jobs_lock:
+            jobs = list(self._jobs.values())
+        return [job.to_dict() for job in jobs]
+
+    def _require(self, job_id: str) -> PlotJob:
+        job = self.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        return job
+
+    def pause(self, job_id: str) -> PlotJob:
+        job = self._require(job_id)
+        if job.status != 'running' or job.streamer is None:
+            raise JobStateError("只有正在运行的任务可以暂停")
+        job.streamer.pause()
+        job.mark_paused()
+        return job
+
+    def resume(self, job_id: str) -> PlotJob:
+        job = self._require(job_id)
+        if job.status != 'paused' or job.streamer is None:
+            raise JobStateError("只有已暂停的任务可以继续")
+        job.streamer.resume()
+        job.mark_resumed()
+        return job
+
+    def cancel(self, job_id: str) -> PlotJob:
+        job = self._require(job_id)
+        if job.status in ('completed', 'failed', 'cancelled'):
+            raise JobStateError("任务已结束，无法取消")
+        job.cancel_requested = True
+        if job.streamer is not None:
+            job.streamer.cancel()
+        return job
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                self._execute(job)
+            except Exception as e:
+                logger.error(f"绘图任务 {job.id} 异常: {str(e)}")
+                logger.error(f"详细错误: {traceback.format_exc()}")
+                job.status = 'failed'
+                job.error = str(e)
+                job.finished_at = time.time()
+            finally:
+                self._queue.task_done()
+
+    def _execute(self, job: PlotJob) -> None:
+        if job.cancel_requested:
+            job.status = 'cancelled'
+            job.finished_at = time.time()
+            return
+        controller = self.controller
+        with controller.exclusive(blocking=True):
+            if not controller.connected and not controller.connect():
+                raise RuntimeError("未连接到 ESP32 GRBL")
+            if job.program is None:
+                job.program = controller.compile_svg(job.svg_data)
+            program = job.program.lines
+            job.compile_stats = job.program.stats
+            job.total_lines = len(program)
+            controller.serial.reset_input_buffer()
+            job.streamer = controller.create_streamer(job.mode, line_callback=job.on_line)
+            job.started_at = time.time()
+            job.status = 'running'
+            # 提交后、开始前收到的取消请求
+            if job.cancel_requested:
+                job.streamer.cancel()
+            try:
+                job.streamer.stream(program)
+                job.status = 'completed'
+                logger.info(f"绘图任务 {job.id} 完成")
+            except StreamCancelled:
+                job.status = 'cancelled'
+                logger.warning(f"绘图任务 {job.id} 已取消")
+                controller.recover_after_reset()
+            except (RuntimeError, TimeoutError, ValueError) as e:
+                job.status = 'failed'
+                job.error = str(e)
+                logger.error(f"绘图任务 {job.id} 失败: {str(e)}")
+            except SerialException as e:
+                job.status = 'failed'
+                job.error = f"串口错误: {str(e)}"
+                controller.connection_lost(job.error)
+            finally:
+                job.finished_at = time.time()
+                job.send_stats = job.streamer.stats.to_dict() if job.streamer.stats else None
+                controller.last_send_stats = job.send_stats
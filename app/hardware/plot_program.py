@@ -0,0 +1,261 @@
+import hashlib
+import logging
+import re
+import struct
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 二进制程序格式：魔数 + 版本 + 行数，随后每行一条记录
+#   运动指令  操作码 = 类型(0-3 对应 G0-G3) | X 0x04 | Y 0x08 | IJ 0x10 | F 0x20，
+#            坐标为 int32（千分之一 mm），进给为 uint32
+#   抬落笔    0x40 + int16（M3 S 角度）
+#   暂停      0x41 + uint32（G4 P，千分之一秒）
+#   原文      0x7F + uint16 长度 + ASCII 文本（其余指令，保证无损；不得含换行与 GRBL 实时指令字符）
+PROGRAM_MAGIC = b'PCGC'
+PROGRAM_VERSION = 1
+_HEADER = struct.Struct('<4sBI')
+
+_MOTION_CODES = ('G0', 'G1', 'G2', 'G3')
+_FLAG_X, _FLAG_Y, _FLAG_IJ, _FLAG_F = 0x04, 0x08, 0x10, 0x20
+_OP_PEN, _OP_DWELL, _OP_RAW = 0x40, 0x41, 0x7F
+_INT32 = struct.Struct('<i')
+_UINT32 = struct.Struct('<I')
+_INT16 = struct.Struct('<h')
+_UINT16 = struct.Struct('<H')
+# 原文记录中不允许的字符：控制字符（含 CR/LF）、非 ASCII（GRBL 的扩展实时指令）与 ? ! ~ 实时指令
+# 换行会让 GRBL 多回复一次 ok，使字符计数发送时的应答错位；实时指令会在绘图中途暂停、恢复或复位机器
+_UNSAFE_RAW_RE = re.compile(r'[^\x20-\x7e]|[?!~]')
+
+
+def _milli(text: str) -> int:
+    return int(round(float(text) * 1000))
+
+
+def _format_motion(code: str, x: Optional[int], y: Optional[int], i: Optional[int],
+                   j: Optional[int], feed: Optional[int]) -> str:
+    """与 GcodeCompiler._motion_line 相同的格式"""
+    parts = [code]
+    if x is not None:
+        parts.append(f"X{x / 1000:.3f}")
+    if y is not None:
+        parts.append(f"Y{y / 1000:.3f}")
+    if i is not None:
+        parts.append(f"I{i / 1000:.3f}")
+        parts.append(f"J{j / 1000:.3f}")
+    if feed is not None:
+        parts.append(f"F{feed}")
+    return " ".join(parts)
+
+
+def _encode_structured(line: str) -> Optional[Tuple[bytes, str]]:
+    """尝试把一行编码为紧凑记录，返回 (记录, 解码后的文本)；不支持的格式返回 None"""
+    parts = line.split(' ')
+    code = parts[0]
+    try:
+        if code in _MOTION_CODES:
+            fields = {part[0]: part[1:] for part in parts[1:] if part}
+            if set(fields) - set('XYIJF') or (('I' in fields) != ('J' in fields)):
+                return None
+            x = _milli(fields['X']) if 'X' in fields else None
+            y = _milli(fields['Y']) if 'Y' in fields else None
+            i = _milli(fields['I']) if 'I' in fields else None
+            j = _milli(fields['J']) if 'J' in fields else None
+            feed = int(fields['F']) if 'F' in fields else None
+            op = _MOTION_CODES.index(code)
+            payload = b''
+            for flag, value in ((_FLAG_X, x), (_FLAG_Y, y)):
+                if value is not None:
+                    op |= flag
+                    payload += _INT32.pack(value)
+            if i is not None:
+                op |= _FLAG_IJ
+                payload += _INT32.pack(i) + _INT32.pack(j)
+            if feed is not None:
+                op |= _FLAG_F
+                payload += _UINT32.pack(feed)
+            return bytes((op,)) + payload, _format_motion(code, x, y, i, j, feed)
+        if code == 'M3' and len(parts) == 2 and parts[1].startswith('S'):
+            angle = int(parts[1][1:])
+            return bytes((_OP_PEN,)) + _INT16.pack(angle), f"M3 S{angle}"
+        if code == 'G4' and len(parts) == 2 and parts[1].startswith('P'):
+            value = _milli(parts[1][1:])
+            return bytes((_OP_DWELL,)) + _UINT32.pack(value), f"G4 P{value / 1000:.3f}"
+    except (ValueError, KeyError, struct.error):
+        return None
+    return None
+
+
+def encode_program(lines: List[str]) -> bytes:
+    """把 G-code 行编码为紧凑二进制，decode_program 可还原出完全相同的文本"""
+    out = bytearray(_HEADER.pack(PROGRAM_MAGIC, PROGRAM_VERSION, len(lines)))
+    for line in lines:
+        encoded = _encode_structured(line)
+        if encoded is not None and encoded[1] == line:
+            out += encoded[0]
+        else:
+            raw = line.encode('utf-8')
+            out += bytes((_OP_RAW,)) + _UINT16.pack(len(raw)) + raw
+    return bytes(out)
+
+
+def decode_program(data: bytes) -> List[str]:
+    """解码 encode_program 的输出（也用于客户端上传的程序，原文记录逐行检查）
+
+    异常：
+        ValueError: 数据不是有效的程序，或原文记录含有换行、实时指令等不能发送给 GRBL 的字符
+    """
+    if len(data) < _HEADER.size:
+        raise ValueError("程序数据过短")
+    magic, version, count = _HEADER.unpack_from(data, 0)
+    if magic != PROGRAM_MAGIC:
+        raise ValueError("不是有效的绘图程序文件")
+    if version != PROGRAM_VERSION:
+        raise ValueError(f"不支持的程序版本: {version}")
+    lines = []
+    offset = _HEADER.size
+    try:
+        for _ in range(count):
+            op = data[offset]
+            offset += 1
+            if op == _OP_RAW:
+                (length,) = _UINT16.unpack_from(data, offset)
+                offset += 2
+                line = data[offset:offset + length].decode('ascii', errors='replace')
+                if _UNSAFE_RAW_RE.search(line):
+                    raise ValueError(f"第 {len(lines) + 1} 行包含换行、GRBL 实时指令或非 ASCII 字符")
+                lines.append(line)
+                offset += length
+            elif op == _OP_PEN:
+                (angle,) = _INT16.unpack_from(data, offset)
+                offset += 2
+                lines.append(f"M3 S{angle}")
+            elif op == _OP_DWELL:
+                (value,) = _UINT32.unpack_from(data, offset)
+                offset += 4
+                lines.append(f"G4 P{value / 1000:.3f}")
+            elif op < 0x40:
+                values = {}
+                for name, flag in (('x', _FLAG_X), ('y', _FLAG_Y)):
+                    if op & flag:
+                        (values[name],) = _INT32.unpack_from(data, offset)
+                        offset += 4
+                if op & _FLAG_IJ:
+                    values['i'], values['j'] = struct.unpack_from('<ii', data, offset)
+                    offset += 8
+                if op & _FLAG_F:
+                    (values['feed'],) = _UINT32.unpack_from(data, offset)
+                    offset += 4
+                lines.append(_format_motion(_MOTION_CODES[op & 0x03], values.get('x'), values.get('y'),
+                                            values.get('i'), values.get('j'), values.get('feed')))
+            else:
+                raise ValueError(f"未知的操作码: {op:#x}")
+    except (IndexError, struct.error, UnicodeDecodeError):
+        raise ValueError("程序数据不完整")
+    if offset != len(data):
+        raise ValueError("程序数据末尾有多余内容")
+    return lines
+
+
+class PlotProgram:
+    """编译完成、可直接发送的绘图程序
+
+    坐标已换算为 mm，升降笔与进给速度均已确定。id 为 G-code 文本的 SHA-256，
+    同一程序无论来自 SVG、分析结果还是上传的二进制文件都得到相同的 id。
+    """
+
+    def __init__(self, lines: List[str], stats: Optional[Dict[str, Any]] = None):
+        self.lines = lines
+        self.stats = stats or {}
+        self._gcode: Optional[str] = None
+        self._binary: Optional[bytes] = None
+        self.id = hashlib.sha256(self.to_gcode().encode('utf-8')).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def to_gcode(self) -> str:
+        if self._gcode is None:
+            self._gcode = '\n'.join(self.lines) + '\n'
+        return self._gcode
+
+    def to_bytes(self) -> bytes:
+        if self._binary is None:
+            self._binary = encode_program(self.lines)
+        return self._binary
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'PlotProgram':
+        program = cls(decode_program(data))
+        program._binary = bytes(data)
+        return program
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'lines': len(self.lines),
+            'gcode_bytes': len(self.to_gcode().encode('utf-8')),
+            'binary_bytes': len(self.to_bytes()),
+            'compile_stats': self.stats,
+        }
+
+
+class PlotProgramCache:
+    """编译结果缓存（LRU）
+
+    按编译输入（SVG 内容 + 编译参数）的键查找，重复绘制同一图案时不再解析 SVG；
+    同时按程序 id 索引，客户端可以用 /export_gcode 返回的 id 提交绘图任务。
+    """
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self._by_key: "OrderedDict[str, PlotProgram]" = OrderedDict()
+        self._by_id: Dict[str, PlotProgram] = {}
+        self._refs: Dict[str, int] = {}  # 程序 id -> 引用它的缓存键数量
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compile(self, key: str, compile_func: Callable[[], PlotProgram]) -> PlotProgram:
+        with self._lock:
+            program = self._by_key.get(key)
+            if program is not None:
+                self._by_key.move_to_end(key)
+                self.hits += 1
+                return program
+            self.misses += 1
+        program = compile_func()
+        self.put(key, program)
+        return program
+
+    def put(self, key: str, program: PlotProgram) -> None:
+        with self._lock:
+            replaced = self._by_key.get(key)
+            if replaced is not None:
+                self._release(replaced.id)
+            self._by_key[key] = program
+            self._by_key.move_to_end(key)
+            self._by_id[program.id] = program
+            self._refs[program.id] = self._refs.get(program.id, 0) + 1
+            while len(self._by_key) > self.max_entries:
+                _, evicted = self._by_key.popitem(last=False)
+                self._release(evicted.id)
+
+    def _release(self, program_id: str) -> None:
+        """去掉一个键对程序的引用，不再被任何键引用时从 id 索引中移除（需持有锁）"""
+        refs = self._refs.get(program_id, 0) - 1
+        if refs > 0:
+            self._refs[program_id] = refs
+        else:
+            self._refs.pop(program_id, None)
+            self._by_id.pop(program_id, None)
+
+    def get(self, program_id: str) -> Optional[PlotProgram]:
+        with self._lock:
+            return self._by_id.get(program_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'entries': len(self._by_key), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,218 @@
+"""pyserial 的 grblsim:// 端口处理器
+
+把 ARDUINO_SERIAL_PORT 设为 grblsim:// 即可在没有硬件的情况下连接模拟的 GRBL 设备：
+
+    grblsim://?speed=0&rx=128&planner=16&rapid=3000&error_rate=0.01&fail_after=500&seed=1
+
+speed 为模拟时间相对真实时间的倍率：1 按真实时间运行，10 加速十倍，
+0 为虚拟时间（读取时直接跳到下一次有输出的时刻，不真正等待）。
+模拟器实例可通过 serial.simulator 访问，用于读取模拟的绘制耗时等统计。
+"""
+import math
+import threading
+import time
+import urllib.parse as urlparse
+
+from serial.serialutil import PortNotOpenError, SerialBase, SerialException
+
+from hardware.grbl_simulator import GrblSimulator
+
+_URL_FORMAT = 'grblsim://[?speed=<倍率>&rx=<字节>&planner=<块数>&rapid=<mm/min>&error_rate=<概率>&fail_after=<行数>&seed=<整数>]'
+_OPTIONS = {
+    'speed': float,
+    'rx': int,
+    'planner': int,
+    'rapid': float,
+    'error_rate': float,
+    'fail_after': int,
+    'seed': int,
+}
+# 真实时间模式下单次等待的上限，保证其他线程写入的实时指令能及时处理
+_POLL_INTERVAL = 0.005
+
+
+class Serial(SerialBase):
+    """连接到进程内 GrblSimulator 的串口"""
+
+    def __init__(self, *args, **kwargs):
+        self.simulator = None
+        self._options = {}
+        self._speed = 1.0
+        self._started = 0.0
+        self._pending = b''
+        self._lock = threading.RLock()
+        super().__init__(*args, **kwargs)
+
+    def open(self):
+        if self.is_open:
+            raise SerialException("Port is already open.")
+        if self._port is None:
+            raise SerialException("Port must be configured before it can be used.")
+        self.from_url(self.port)
+        self._speed = self._options.get('speed', 1.0)
+        self.simulator = GrblSimulator(
+            baud_rate=self._baudrate,
+            rx_buffer_size=self._options.get('rx', 128),
+            planner_blocks=self._options.get('planner', 16),
+            rapid_rate=self._options.get('rapid', 3000.0),
+            error_rate=self._options.get('error_rate', 0.0),
+            fail_after=self._options.get('fail_after'),
+            seed=self._options.get('seed', 0),
+        )
+        self._started = time.monotonic()
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+        super().close()
+
+    def _reconfigure_port(self):
+        if self.simulator is not None:
+            self.simulator.byte_time = 10.0 / self._baudrate
+
+    def from_url(self, url):
+        parts = urlparse.urlsplit(url)
+        if parts.scheme != 'grblsim':
+            raise SerialException(f"端口格式应为 {_URL_FORMAT}，而不是 {url!r}")
+        options = {}
+        try:
+            for option, values in urlparse.parse_qs(parts.query, True).items():
+                if option not in _OPTIONS:
+                    raise ValueError(f"未知选项: {option!r}")
+                options[option] = _OPTIONS[option](values[0])
+        except ValueError as e:
+            raise SerialException(f"端口格式应为 {_URL_FORMAT}: {e}")
+        if options.get('speed', 1.0) < 0:
+            raise SerialException("speed 不能为负数")
+        self._options = options
+
+    @property
+    def virtual_time(self) -> bool:
+        return self._speed == 0
+
+    def _sync(self) -> None:
+        """真实时间模式下把模拟时钟推进到当前时刻"""
+        if not self.virtual_time:
+            self.simulator.advance((time.monotonic() - self._started) * self._speed)
+
+    def _wait(self, timeout) -> bool:
+        """等待模拟设备产生输出，超时返回 False"""
+        if self.virtual_time:
+            deadline = math.inf if timeout is None else self.simulator.now + timeout
+            return self.simulator.wait_for_output(deadline)
+        wall_deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self._sync()
+            if self.simulator.output_waiting():
+                return True
+            if wall_deadline is not None and time.monotonic() >= wall_deadline:
+                return False
+            next_time = self.simulator.next_event_time()
+            delay = _POLL_INTERVAL
+            if next_time is not None:
+                delay = min(delay, max((next_time - self.simulator.now) / self._speed, 0.0))
+            if wall_deadline is not None:
+                delay = min(delay, max(wall_deadline - time.monotonic(), 0.0))
+            self._lock.release()
+            try:
+                time.sleep(delay)
+            finally:
+                self._lock.acquire()
+
+    @property
+    def in_waiting(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        with self._lock:
+            if self.virtual_time:
+                # 虚拟时间下主机轮询即视为时间流逝，直接跳到下一次输出
+                self.simulator.wait_for_output()
+            else:
+                self._sync()
+            return len(self._pending) + self.simulator.output_waiting()
+
+    def read(self, size=1):
+        if not self.is_open:
+            raise PortNotOpenError()
+        with self._lock:
+            data = bytearray(self._take(size))
+            while len(data) < size and self._wait(self._timeout):
+                data += self._take(size - len(data))
+            return bytes(data)
+
+    def readline(self, size=-1):
+        if not self.is_open:
+            raise PortNotOpenError()
+        with self._lock:
+            line = bytearray()
+            while True:
+                self._sync()
+                line += self._take_line()
+                if line.endswith(b'\n') or (0 <= size <= len(line)):
+                    return bytes(line)
+                if not self._wait(self._timeout):
+                    return bytes(line)
+
+    def _take(self, size: int) -> bytes:
+        self._pending = self._pending + self.simulator.read()
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+    def _take_line(self) -> bytes:
+        self._pending = self._pending + self.simulator.read()
+        end = self._pending.find(b'\n')
+        if end < 0:
+            data, self._pending = self._pending, b''
+        else:
+            data, self._pending = self._pending[:end + 1], self._pending[end + 1:]
+        return data
+
+    def write(self, data):
+        if not self.is_open:
+            raise PortNotOpenError()
+        data = bytes(data)
+        with self._lock:
+            self._sync()
+            self.simulator.write(data)
+        return len(data)
+
+    def reset_input_buffer(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        with self._lock:
+            self._sync()
+            self._pending = b''
+            self.simulator.discard_output()
+
+    def reset_output_buffer(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+
+    @property
+    def out_waiting(self):
+        return 0
+
+    def _update_break_state(self):
+        pass
+
+    def _update_rts_state(self):
+        pass
+
+    def _update_dtr_state(self):
+        pass
+
+    @property
+    def cts(self):
+        return True
+
+    @property
+    def dsr(self):
+        return True
+
+    @property
+    def ri(self):
+        return False
+
+    @property
+    def cd(self):
+        return True
@@ -0,0 +1,530 @@
+import logging
+import math
+import re
+import xml.etree.ElementTree as ET
+from itertools import accumulate
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+Point = Tuple[float, float]
+# 仿射矩阵，按 SVG matrix(a b c d e f) 的顺序：x' = a*x + c*y + e，y' = b*x + d*y + f
+Matrix = Tuple[float, float, float, float, float, float]
+IDENTITY: Matrix = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+_COMMAND_RE = re.compile(r'([MmZzLlHhVvCcSsQqTtAa])')
+_NUMBER_PATTERN = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+_NUMBER_RE = re.compile(_NUMBER_PATTERN)
+_ARGUMENTS_RE = re.compile(rf'[\s,]*(?:{_NUMBER_PATTERN}[\s,]*)*')
+# 圆弧参数：rx ry 旋转角 大弧标志 方向标志 x y，标志位只有一个字符，可与后续数字相连
+_ARC_RE = re.compile(rf'[\s,]*({_NUMBER_PATTERN})[\s,]*({_NUMBER_PATTERN})[\s,]*({_NUMBER_PATTERN})'
+                     rf'[\s,]*([01])[\s,]*([01])[\s,]*({_NUMBER_PATTERN})[\s,]*({_NUMBER_PATTERN})')
+# 每组参数的个数
+_ARITY = {'M': 2, 'L': 2, 'H': 1, 'V': 1, 'C': 6, 'S': 4, 'Q': 4, 'T': 2, 'A': 7}
+_TRANSFORM_RE = re.compile(r'(matrix|translate|scale|rotate|skewX|skewY)\s*\(([^)]*)\)')
+_COMMANDS = frozenset('MmZzLlHhVvCcSsQqTtAa')
+
+# 不参与绘制的容器元素
+_SKIPPED_TAGS = frozenset(('defs', 'clipPath', 'mask', 'symbol', 'marker', 'pattern',
+                           'title', 'desc', 'metadata', 'style', 'script'))
+# 产生几何的图形元素
+_SHAPE_TAGS = frozenset(('path', 'polyline', 'polygon', 'line', 'rect', 'circle', 'ellipse'))
+# 各基本图形的长度属性
+_LENGTH_ATTRS = {
+    'line': ('x1', 'y1', 'x2', 'y2'),
+    'rect': ('x', 'y', 'width', 'height'),
+    'circle': ('cx', 'cy', 'r'),
+    'ellipse': ('cx', 'cy', 'rx', 'ry'),
+}
+
+
+def _numbers(text: str) -> List[float]:
+    """解析一段参数；常见的空白 / 逗号分隔直接切分，"1.5.5"、"10-5" 等紧凑写法回退到正则
+
+    异常：
+        ValueError: 含有非数字内容（已解析的数字仍可能有效，但按规范从出错处停止）
+    """
+    try:
+        return [float(tok) for tok in text.replace(',', ' ').split()]
+    except ValueError:
+        if not _ARGUMENTS_RE.fullmatch(text):
+            raise ValueError(f"无效的参数: {text.strip()[:40]}")
+        return [float(tok) for tok in _NUMBER_RE.findall(text)]
+
+
+def _arc_arguments(text: str) -> List[float]:
+    """解析圆弧参数，按 7 个一组处理标志位"""
+    tokens = text.replace(',', ' ').split()
+    if tokens and len(tokens) % 7 == 0 and all(flag in ('0', '1') for i in range(3, len(tokens), 7)
+                                                for flag in tokens[i:i + 2]):
+        # 各参数以空白分隔、标志位独立书写时直接切分，紧凑写法回退到逐组正则匹配
+        try:
+            return [float(tok) for tok in tokens]
+        except ValueError:
+            pass
+    values: List[float] = []
+    position = 0
+    while True:
+        match = _ARC_RE.match(text, position)
+        if match is None:
+            break
+        values.extend(float(v) for v in match.groups())
+        position = match.end()
+    rest = text[position:]
+    if rest.strip(' \t\r\n,'):
+        # 不足一组的剩余参数交给 _numbers 校验，由调用方按参数个数报错
+        values.extend(_numbers(rest))
+    return values
+
+
+def multiply(m1: Matrix, m2: Matrix) -> Matrix:
+    """矩阵乘积 m1·m2（先应用 m2，再应用 m1）"""
+    a1, b1, c1, d1, e1, f1 = m1
+    a2, b2, c2, d2, e2, f2 = m2
+    return (a1 * a2 + c1 * b2, b1 * a2 + d1 * b2,
+            a1 * c2 + c1 * d2, b1 * c2 + d1 * d2,
+            a1 * e2 + c1 * f2 + e1, b1 * e2 + d1 * f2 + f1)
+
+
+def parse_transform(text: Optional[str]) -> Matrix:
+    """解析 transform 属性，按书写顺序组合为一个矩阵
+
+    异常：
+        ValueError: 变换参数个数不正确
+    """
+    matrix = IDENTITY
+    if not text:
+        return matrix
+    for name, args in _TRANSFORM_RE.findall(text):
+        values = [float(v) for v in _NUMBER_RE.findall(args)]
+        n = len(values)
+        if name == 'matrix' and n == 6:
+            step = tuple(values)
+        elif name == 'translate' and n in (1, 2):
+            step = (1.0, 0.0, 0.0, 1.0, values[0], values[1] if n == 2 else 0.0)
+        elif name == 'scale' and n in (1, 2):
+            step = (values[0], 0.0, 0.0, values[1] if n == 2 else values[0], 0.0, 0.0)
+        elif name == 'rotate' and n in (1, 3):
+            cos_a, sin_a = math.cos(math.radians(values[0])), math.sin(math.radians(values[0]))
+            step = (cos_a, sin_a, -sin_a, cos_a, 0.0, 0.0)
+            if n == 3:
+                cx, cy = values[1], values[2]
+                step = multiply(multiply((1.0, 0.0, 0.0, 1.0, cx, cy), step), (1.0, 0.0, 0.0, 1.0, -cx, -cy))
+        elif name == 'skewX' and n == 1:
+            step = (1.0, 0.0, math.tan(math.radians(values[0])), 1.0, 0.0, 0.0)
+        elif name == 'skewY' and n == 1:
+            step = (1.0, math.tan(math.radians(values[0])), 0.0, 1.0, 0.0, 0.0)
+        else:
+            raise ValueError(f"无效的变换: {name}({args})")
+        matrix = multiply(matrix, step)
+    return matrix
+
+
+def _matrix_scale(matrix: Matrix) -> float:
+    """矩阵对长度的最大放大倍数（近似），用于把容差换算到局部坐标"""
+    a, b, c, d, _, _ = matrix
+    return max(math.hypot(a, b), math.hypot(c, d), 1e-12)
+
+
+def _sample_indices(n: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """每段分为 n[i] 份时，所有采样点所属的段号与段内序号 k（1..n[i]）"""
+    ends = np.cumsum(n)
+    owner = np.repeat(np.arange(len(n)), n)
+    k = np.arange(1, ends[-1] + 1) - np.repeat(ends - n, n)
+    return owner, k
+
+
+def _flatten_cubics(curves: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """批量展平三次贝塞尔曲线（每行 x0 y0 x1 y1 x2 y2 x3 y3 容差），返回 (各曲线点数, 不含起点的点)
+
+    分段数按 Wang 公式保证偏差不超过各自的容差，每条曲线的最后一点精确等于终点。
+    """
+    x0, y0, x1, y1, x2, y2, x3, y3, tolerance = curves.T
+    dd = np.maximum(np.hypot(x0 - 2 * x1 + x2, y0 - 2 * y1 + y2),
+                    np.hypot(x1 - 2 * x2 + x3, y1 - 2 * y2 + y3))
+    n = np.maximum(1, np.ceil(np.sqrt(0.75 * dd / tolerance))).astype(np.int64)
+    owner, k = _sample_indices(n)
+    t = k / n[owner]
+    mt = 1 - t
+    w0, w1, w2, w3 = mt * mt * mt, 3 * mt * mt * t, 3 * mt * t * t, t * t * t
+    points = np.empty((len(t), 2))
+    points[:, 0] = w0 * x0[owner] + w1 * x1[owner] + w2 * x2[owner] + w3 * x3[owner]
+    points[:, 1] = w0 * y0[owner] + w1 * y1[owner] + w2 * y2[owner] + w3 * y3[owner]
+    points[np.cumsum(n) - 1] = curves[:, 6:8]
+    return n, points
+
+
+def _flatten_arcs(arcs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """批量展平椭圆弧（每行 x0 y0 rx ry 旋转角 大弧标志 方向标志 x y 容差，半径非零且端点不重合）
+
+    按 SVG 规范附录 F.6.5 转换为中心参数化，按弦高误差自适应分段；返回值同 _flatten_cubics。
+    """
+    x0, y0, rx, ry, phi_deg, large_arc, sweep, x, y, tolerance = arcs.T
+    phi = np.radians(phi_deg % 360)
+    cos_phi, sin_phi = np.cos(phi), np.sin(phi)
+    dx, dy = (x0 - x) / 2, (y0 - y) / 2
+    x1p = cos_phi * dx + sin_phi * dy
+    y1p = -sin_phi * dx + cos_phi * dy
+    # 半径不足以连接两个端点时按比例放大
+    scale = np.sqrt(np.maximum(x1p * x1p / (rx * rx) + y1p * y1p / (ry * ry), 1.0))
+    rx, ry = rx * scale, ry * scale
+    num = rx * rx * ry * ry - rx * rx * y1p * y1p - ry * ry * x1p * x1p
+    den = rx * rx * y1p * y1p + ry * ry * x1p * x1p
+    coef = np.sqrt(np.maximum(num, 0.0) / den)
+    coef = np.where(large_arc == sweep, -coef, coef)
+    cxp, cyp = coef * rx * y1p / ry, -coef * ry * x1p / rx
+    cx = cos_phi * cxp - sin_phi * cyp + (x0 + x) / 2
+    cy = sin_phi * cxp + cos_phi * cyp + (y0 + y) / 2
+    theta = np.arctan2((y1p - cyp) / ry, (x1p - cxp) / rx)
+    delta = np.arctan2((-y1p - cyp) / ry, (-x1p - cxp) / rx) - theta
+    delta = np.where((sweep == 1) & (delta < 0), delta + 2 * np.pi, delta)
+    delta = np.where((sweep == 0) & (delta > 0), delta - 2 * np.pi, delta)
+    # 弦高误差 r·(1 - cos(θ/2)) ≤ tolerance 时每段可转过的最大角度
+    radius = np.maximum(rx, ry)
+    step = np.where(tolerance < radius, 2 * np.arccos(np.clip(1 - tolerance / radius, -1.0, 1.0)), np.pi)
+    n = np.maximum(1, np.ceil(np.abs(delta) / step)).astype(np.int64)
+    owner, k = _sample_indices(n)
+    t = theta[owner] + delta[owner] * k / n[owner]
+    cos_t, sin_t = np.cos(t), np.sin(t)
+    # 旋转后的椭圆轴向量：点 = 圆心 + cos(t)·u + sin(t)·v
+    points = np.empty((len(t), 2))
+    points[:, 0] = cx[owner] + (rx * cos_phi)[owner] * cos_t - (ry * sin_phi)[owner] * sin_t
+    points[:, 1] = cy[owner] + (rx * sin_phi)[owner] * cos_t + (ry * cos_phi)[owner] * sin_t
+    points[np.cumsum(n) - 1] = arcs[:, 7:9]
+    return n, points
+
+
+# 路径片段类型
+_LINE, _CUBIC, _ARC = 0, 1, 2
+
+
+class _GeometryBuilder:
+    """按文档顺序记录所有图形元素的几何，曲线与圆弧只记录参数，build 时用 NumPy 一次性展平
+
+    几何由片段组成：连续的直线点合为一个片段，每条曲线 / 圆弧各占一个片段，其点数在
+    展平后才确定。子路径与图形元素都按片段下标划分，每个元素带有自己的变换矩阵与容差，
+    因此整篇文档只需要固定次数的数组运算，与元素和曲线的数量无关。
+    """
+
+    def __init__(self):
+        self.kinds: List[int] = []
+        self.counts: List[int] = []
+        self.subpath_starts: List[int] = []
+        self.line_points: List[Point] = []
+        self.cubics: List[Tuple[float, ...]] = []
+        self.arcs: List[Tuple[float, ...]] = []
+        self.element_starts: List[int] = []  # 每个元素的第一个片段
+        self.element_subpaths: List[int] = []  # 每个元素的第一条子路径
+        self.matrices: List[Matrix] = []
+        self.tolerance = 0.0  # 当前元素在局部坐标下的展平容差
+        self._line_piece = -1
+        self._line_start = 0
+
+    def start_element(self, matrix: Matrix, tolerance: float) -> None:
+        self._close_line()
+        self.element_starts.append(len(self.kinds))
+        self.element_subpaths.append(len(self.subpath_starts))
+        self.matrices.append(matrix)
+        self.tolerance = tolerance
+
+    def _open_line(self) -> None:
+        self._line_piece = len(self.kinds)
+        self._line_start = len(self.line_points)
+        self.kinds.append(_LINE)
+        self.counts.append(0)
+
+    def _close_line(self) -> None:
+        if self._line_piece >= 0:
+            self.counts[self._line_piece] = len(self.line_points) - self._line_start
+            self._line_piece = -1
+
+    def start_subpath(self, x: float, y: float) -> None:
+        self._close_line()
+        self.subpath_starts.append(len(self.kinds))
+        self.line_to(x, y)
+
+    def line_to(self, x: float, y: float) -> None:
+        if self._line_piece < 0:
+            self._open_line()
+        self.line_points.append((x, y))
+
+    def lines_to(self, points: Iterable[Point]) -> None:
+        if self._line_piece < 0:
+            self._open_line()
+        self.line_points.extend(points)
+
+    def cubic_to(self, x0: float, y0: float, x1: float, y1: float,
+                 x2: float, y2: float, x3: float, y3: float) -> None:
+        self._close_line()
+        self.kinds.append(_CUBIC)
+        self.counts.append(0)
+        self.cubics.append((x0, y0, x1, y1, x2, y2, x3, y3, self.tolerance))
+
+    def arc_to(self, x0: float, y0: float, rx: float, ry: float, phi_deg: float,
+               large_arc: float, sweep: float, x: float, y: float) -> None:
+        rx, ry = abs(rx), abs(ry)
+        if rx == 0 or ry == 0 or (x0 == x and y0 == y):
+            # 半径为零或端点重合的圆弧按直线处理（规范 F.6.2）
+            self.line_to(x, y)
+            return
+        self._close_line()
+        self.kinds.append(_ARC)
+        self.counts.append(0)
+        self.arcs.append((x0, y0, rx, ry, phi_deg, large_arc, sweep, x, y, self.tolerance))
+
+    def build(self) -> List[List[np.ndarray]]:
+        """展平所有曲线、应用各元素的变换并切分子路径，返回每个元素的子路径列表
+
+        不足两点的子路径被丢弃；子路径是同一个 (N, 2) 坐标数组的切片。
+        """
+        self._close_line()
+        n_pieces = len(self.kinds)
+        kinds = np.array(self.kinds, dtype=np.int8)
+        counts = np.array(self.counts, dtype=np.int64)
+        blocks = [(_LINE, np.array(self.line_points, dtype=np.float64).reshape(-1, 2))]
+        for kind, params, flatten in ((_CUBIC, self.cubics, _flatten_cubics), (_ARC, self.arcs, _flatten_arcs)):
+            if params:
+                n, points = flatten(np.array(params, dtype=np.float64))
+                counts[kinds == kind] = n
+                blocks.append((kind, points))
+        if len(blocks) == 1:
+            points = blocks[0][1]
+        else:
+            # 各类片段内部的点已按文档顺序排列，按每个点所属的片段类型放回原位
+            point_kinds = np.repeat(kinds, counts)
+            points = np.empty((len(point_kinds), 2))
+            for kind, block in blocks:
+                points[point_kinds == kind] = block
+        if any(matrix != IDENTITY for matrix in self.matrices):
+            # 每个点按所属元素的矩阵变换：x' = a*x + c*y + e，y' = b*x + d*y + f
+            piece_elements = np.repeat(np.arange(len(self.matrices)), np.diff(self.element_starts + [n_pieces]))
+            point_elements = np.repeat(piece_elements, counts)
+            a, b, c, d, e, f = np.array(self.matrices, dtype=np.float64).T
+            x, y = points[:, 0].copy(), points[:, 1].copy()
+            points[:, 0] = a[point_elements] * x + c[point_elements] * y + e[point_elements]
+            points[:, 1] = b[point_elements] * x + d[point_elements] * y + f[point_elements]
+        offsets = np.concatenate(([0], np.cumsum(counts))).tolist()
+        bounds = [offsets[i] for i in self.subpath_starts] + [offsets[-1]]
+        element_subpaths = self.element_subpaths + [len(self.subpath_starts)]
+        return [[points[bounds[j]:bounds[j + 1]]
+                 for j in range(element_subpaths[i], element_subpaths[i + 1]) if bounds[j + 1] - bounds[j] >= 2]
+                for i in range(len(self.matrices))]
+
+
+class SvgPathParser:
+    """SVG 几何解析器：把 path / polyline / polygon / line / rect / circle / ellipse
+    展平为折线子路径（(N, 2) 的 NumPy 坐标数组），并应用元素及其祖先的 transform
+
+    路径数据按 SVG 1.1 语法完整支持 M/L/H/V/C/S/Q/T/A/Z（绝对与相对、M 之后的
+    隐式 L、紧凑写法的圆弧标志位）。贝塞尔曲线按 Wang 公式、圆弧按弦高误差自适应
+    分段，偏差不超过 tolerance（最终输出坐标单位）。遇到语法错误时与浏览器一致，
+    保留错误之前的部分。
+    """
+
+    def __init__(self, tolerance: float = 0.05):
+        if tolerance <= 0:
+            raise ValueError("曲线展平容差必须大于 0")
+        self.tolerance = tolerance
+
+    def parse_path(self, path_data: str, tolerance: Optional[float] = None) -> List[np.ndarray]:
+        """解析路径数据，返回子路径列表，每条为 (N, 2) 的坐标数组；闭合子路径的最后一点与起点相同，单点子路径被丢弃"""
+        builder = _GeometryBuilder()
+        builder.start_element(IDENTITY, tolerance or self.tolerance)
+        self._add_path(path_data, builder)
+        return builder.build()[0]
+
+    def _add_path(self, path_data: str, path: _GeometryBuilder) -> None:
+        """把路径数据记入 path
+
+        按命令字母切分为命令段，连续的同一命令段合并后整体转换参数。逐段只计算
+        端点与控制点，曲线与圆弧留到 _GeometryBuilder.build 时批量展平。
+        """
+        segments = _COMMAND_RE.split(path_data)
+        if segments[0].strip(' \t\r\n,'):
+            logger.warning("路径数据必须以命令开头，已忽略")
+            return
+        x = y = start_x = start_y = 0.0
+        # 上一条曲线的控制点（三次为第二控制点，二次为唯一控制点），用于 S / T 的反射
+        last_ctrl: Optional[Point] = None
+        last_cmd = ''
+        drawing = False  # 已开始当前子路径
+        closed = False
+        k, n_segments = 1, len(segments)
+        try:
+            while k < n_segments:
+                cmd = segments[k]
+                text = segments[k + 1]
+                k += 2
+                # 重复的同一命令字母与隐式重复参数等价；M 每次都开始新的子路径，Z 无参数，二者不合并
+                if k < n_segments and segments[k] == cmd and cmd not in 'MmZz':
+                    args = [text]
+                    while k < n_segments and segments[k] == cmd:
+                        args.append(segments[k + 1])
+                        k += 2
+                    text = ' '.join(args)
+                upper = cmd.upper()
+                relative = cmd != upper
+                values = _arc_arguments(text) if upper == 'A' else _numbers(text)
+                count = len(values)
+
+                if upper == 'Z':
+                    if count:
+                        raise ValueError("Z 命令不接受参数")
+                    if drawing:
+                        if (x, y) != (start_x, start_y):
+                            path.line_to(start_x, start_y)
+                        closed = True
+                    x, y = start_x, start_y
+                    last_ctrl, last_cmd = None, 'Z'
+                    continue
+                arity = _ARITY[upper]
+                if count < arity:
+                    raise ValueError(f"{cmd} 命令参数不足")
+                usable = count - count % arity
+                if upper == 'M':
+                    if relative:
+                        x, y = x + values[0], y + values[1]
+                    else:
+                        x, y = values[0], values[1]
+                    start_x, start_y = x, y
+                    path.start_subpath(x, y)
+                    drawing, closed = True, False
+                    last_ctrl, last_cmd = None, 'M'
+                    # M 之后的坐标对视为 L
+                    values, usable, upper = values[2:], usable - 2, 'L'
+                    if not usable:
+                        continue
+                if closed or not drawing:
+                    # Z 之后直接绘制：从子路径起点开始新的子路径
+                    path.start_subpath(x, y)
+                    drawing, closed = True, False
+
+                if usable == arity and (upper == 'L' or upper == 'H' or upper == 'V'):
+                    # 单个直线段（最常见的 "L x,y" 写法）
+                    if upper == 'L':
+                        x, y = (x + values[0], y + values[1]) if relative else (values[0], values[1])
+                    elif upper == 'H':
+                        x = x + values[0] if relative else values[0]
+                    else:
+                        y = y + values[0] if relative else values[0]
+                    path.line_to(x, y)
+                    last_ctrl = None
+                elif upper in 'LHV':
+                    if upper == 'L':
+                        xs, ys = values[0:usable:2], values[1:usable:2]
+                    elif upper == 'H':
+                        xs, ys = values[:usable], None
+                    else:
+                        xs, ys = None, values[:usable]
+                    if relative:
+                        xs = list(accumulate(xs, initial=x))[1:] if xs is not None else None
+                        ys = list(accumulate(ys, initial=y))[1:] if ys is not None else None
+                    if xs is None:
+                        xs = [x] * len(ys)
+                    elif ys is None:
+                        ys = [y] * len(xs)
+                    path.lines_to(zip(xs, ys))
+                    x, y = xs[-1], ys[-1]
+                    last_ctrl = None
+                else:
+                    for offset in range(0, usable, arity):
+                        group = values[offset:offset + arity]
+                        ox, oy = (x, y) if relative else (0.0, 0.0)
+                        if upper == 'C' or upper == 'S':
+                            if upper == 'C':
+                                x1, y1, x2, y2, x3, y3 = group
+                                x1, y1 = ox + x1, oy + y1
+                            else:
+                                x2, y2, x3, y3 = group
+                                if last_cmd in ('C', 'S') and last_ctrl is not None:
+                                    x1, y1 = 2 * x - last_ctrl[0], 2 * y - last_ctrl[1]
+                                else:
+                                    x1, y1 = x, y
+                            x2, y2, x3, y3 = ox + x2, oy + y2, ox + x3, oy + y3
+                            path.cubic_to(x, y, x1, y1, x2, y2, x3, y3)
+                            x, y = x3, y3
+                            last_ctrl = (x2, y2)
+                        elif upper == 'Q' or upper == 'T':
+                            if upper == 'Q':
+                                x1, y1, x2, y2 = group
+                                x1, y1 = ox + x1, oy + y1
+                            else:
+                                x2, y2 = group
+                                if last_cmd in ('Q', 'T') and last_ctrl is not None:
+                                    x1, y1 = 2 * x - last_ctrl[0], 2 * y - last_ctrl[1]
+                                else:
+                                    x1, y1 = x, y
+                            x2, y2 = ox + x2, oy + y2
+                            # 二次曲线精确升阶为三次曲线，分段数与二次的 Wang 公式相同
+                            path.cubic_to(x, y, x + 2 / 3 * (x1 - x), y + 2 / 3 * (y1 - y),
+                                          x2 + 2 / 3 * (x1 - x2), y2 + 2 / 3 * (y1 - y2), x2, y2)
+                            x, y = x2, y2
+                            last_ctrl = (x1, y1)
+                        else:
+                            rx, ry, rotation, large_arc, sweep, dx, dy = group
+                            path.arc_to(x, y, rx, ry, rotation, large_arc, sweep, ox + dx, oy + dy)
+                            x, y = ox + dx, oy + dy
+                            last_ctrl = None
+                        last_cmd = upper
+                last_cmd = upper
+                if usable != len(values):
+                    raise ValueError(f"{cmd} 命令参数个数不正确")
+        except ValueError as e:
+            logger.warning(f"路径数据出错，忽略之后的部分: {str(e)}")
+
+    def _add_element(self, tag: str, element: ET.Element, builder: _GeometryBuilder) -> None:
+        # 百分比尺寸相对于视口（如铺满画布的背景矩形），不作为绘制轮廓
+        if any(element.get(name, '').strip().endswith('%') for name in _LENGTH_ATTRS.get(tag, ())):
+            return
+
+        def attr(name: str) -> float:
+            match = _NUMBER_RE.match(element.get(name, '0').strip())
+            return float(match.group()) if match else 0.0
+
+        if tag == 'path':
+            self._add_path(element.get('d', ''), builder)
+        elif tag in ('polyline', 'polygon'):
+            values = [float(v) for v in _NUMBER_RE.findall(element.get('points', ''))]
+            if len(values) >= 4:
+                builder.start_subpath(values[0], values[1])
+                builder.lines_to(zip(values[2::2], values[3::2]))
+                if tag == 'polygon':
+                    builder.line_to(values[0], values[1])
+        elif tag == 'line':
+            builder.start_subpath(attr('x1'), attr('y1'))
+            builder.line_to(attr('x2'), attr('y2'))
+        elif tag == 'rect':
+            x, y, w, h = attr('x'), attr('y'), attr('width'), attr('height')
+            if w > 0 and h > 0:
+                builder.start_subpath(x, y)
+                builder.lines_to(((x + w, y), (x + w, y + h), (x, y + h), (x, y)))
+        elif tag in ('circle', 'ellipse'):
+            cx, cy = attr('cx'), attr('cy')
+            rx, ry = (attr('r'), attr('r')) if tag == 'circle' else (attr('rx'), attr('ry'))
+            if rx > 0 and ry > 0:
+                builder.start_subpath(cx + rx, cy)
+                builder.arc_to(cx + rx, cy, rx, ry, 0, 0, 1, cx - rx, cy)
+                builder.arc_to(cx - rx, cy, rx, ry, 0, 0, 1, cx + rx, cy)
+
+    def _add_tree(self, element: ET.Element, matrix: Matrix, builder: _GeometryBuilder) -> None:
+        """深度优先遍历元素树，按文档顺序把每个图形元素记入 builder"""
+        tag = element.tag.rsplit('}', 1)[-1]
+        if tag in _SKIPPED_TAGS or element.get('display') == 'none':
+            return
+        try:
+            matrix = multiply(matrix, parse_transform(element.get('transform')))
+        except ValueError as e:
+            logger.warning(f"忽略无效的 transform: {str(e)}")
+        if tag in _SHAPE_TAGS:
+            builder.start_element(matrix, self.tolerance / _matrix_scale(matrix))
+            self._add_element(tag, element, builder)
+        for child in element:
+            self._add_tree(child, matrix, builder)
+
+    def parse_document(self, root: ET.Element, matrix: Matrix = IDENTITY) -> List[List[np.ndarray]]:
+        """解析整棵 SVG 树，每个图形元素对应一个子路径列表（坐标已变换到输出坐标），没有几何的元素被省略"""
+        builder = _GeometryBuilder()
+        self._add_tree(root, matrix, builder)
+        return [subpaths for subpaths in builder.build() if subpaths]
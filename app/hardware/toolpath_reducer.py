@@ -0,0 +1,228 @@
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _segment_distances(points: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """points 中每个点到线段 ab 的距离"""
+    ab = b - a
+    denom = float(ab @ ab)
+    if denom == 0.0:
+        return np.hypot(*(points - a).T)
+    t = np.clip((points - a) @ ab / denom, 0.0, 1.0)
+    proj = a + t[:, None] * ab
+    return np.hypot(*(points - proj).T)
+
+
+def rdp_indices(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """Ramer–Douglas–Peucker 简化，返回保留点的索引（含首尾点）
+
+    每个待处理区间用一次 NumPy 运算求出区间内所有点的偏差，只在 Python
+    层维护区间栈。
+    """
+    n = len(points)
+    if n < 3 or tolerance <= 0:
+        return np.arange(n)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        d = _segment_distances(points[start + 1:end], points[start], points[end])
+        k = int(np.argmax(d))
+        if d[k] > tolerance:
+            mid = start + 1 + k
+            keep[mid] = True
+            stack.append((start, mid))
+            stack.append((mid, end))
+    return np.nonzero(keep)[0]
+
+
+def merge_collinear(points: np.ndarray, epsilon: float = 1e-9) -> np.ndarray:
+    """去掉重复点和严格共线的中间点，返回保留点的索引"""
+    n = len(points)
+    if n < 3:
+        return np.arange(n)
+    # 先去除连续重复点
+    moved = np.ones(n, dtype=bool)
+    moved[1:] = np.any(np.abs(np.diff(points, axis=0)) > epsilon, axis=1)
+    moved[-1] = True
+    idx = np.nonzero(moved)[0]
+    if len(idx) < 3:
+        return idx
+    p = points[idx]
+    v1 = p[1:-1] - p[:-2]
+    v2 = p[2:] - p[1:-1]
+    cross = v1[:, 0] * v2[:, 1] - v1[:, 1] * v2[:, 0]
+    dot = (v1 * v2).sum(axis=1)
+    # 同向共线的中间点可以去掉，折返点（dot < 0）必须保留
+    straight = (np.abs(cross) <= epsilon) & (dot > 0)
+    keep = np.ones(len(idx), dtype=bool)
+    keep[1:-1] = ~straight
+    return idx[keep]
+
+
+def _circle_through(p1: np.ndarray, p2: np.ndarray, p3: np.ndarray) -> Optional[Tuple[np.ndarray, float]]:
+    """三点确定的圆心与半径，三点共线时返回 None"""
+    ax, ay = p1
+    bx, by = p2
+    cx, cy = p3
+    d = 2.0 * (ax * (by - cy) + bx * (cy - ay) + cx * (ay - by))
+    if abs(d) < 1e-12:
+        return None
+    a2, b2, c2 = ax * ax + ay * ay, bx * bx + by * by, cx * cx + cy * cy
+    ux = (a2 * (by - cy) + b2 * (cy - ay) + c2 * (ay - by)) / d
+    uy = (a2 * (cx - bx) + b2 * (ax - cx) + c2 * (bx - ax)) / d
+    center = np.array([ux, uy])
+    return center, float(np.hypot(*(p1 - center)))
+
+
+class ToolpathReducer:
+    """G-code 生成前的刀路精简
+
+    对每条子路径依次做共线点合并、RDP 简化，并可选地把弯曲的连续线段
+    拟合为 G2/G3 圆弧。所有偏差都以路径坐标单位（mm）计。
+    """
+
+    def __init__(self, tolerance: float = 0.2, arc_fitting: bool = False,
+                 arc_tolerance: Optional[float] = None, min_arc_segments: int = 3,
+                 max_arc_radius: float = 1000.0):
+        self.tolerance = tolerance
+        self.arc_fitting = arc_fitting
+        self.arc_tolerance = arc_tolerance if arc_tolerance is not None else tolerance
+        self.min_arc_segments = min_arc_segments
+        self.max_arc_radius = max_arc_radius
+        self.stats: Dict = {}
+
+    def _fit_arc(self, points: np.ndarray) -> Optional[Tuple[np.ndarray, float, bool, float]]:
+        """尝试用一段圆弧拟合 points，返回 (圆心, 半径, 是否逆时针, 最大偏差)"""
+        circle = _circle_through(points[0], points[len(points) // 2], points[-1])
+        if circle is None:
+            return None
+        center, radius = circle
+        if radius > self.max_arc_radius:
+            return None
+        deviation = float(np.max(np.abs(np.hypot(*(points - center).T) - radius)))
+        if deviation > self.arc_tolerance:
+            return None
+        # 所有线段必须沿同一方向绕圆心旋转，且总转角小于一整圈
+        rel = points - center
+        angles = np.arctan2(rel[:, 1], rel[:, 0])
+        steps = (np.diff(angles) + np.pi) % (2 * np.pi) - np.pi
+        if not (np.all(steps >= -1e-9) or np.all(steps <= 1e-9)):
+            return None
+        sweep = float(steps.sum())
+        if sweep == 0.0 or abs(sweep) >= 2 * np.pi - 1e-6:
+            return None
+        # 弦的中点也要贴合圆弧，防止稀疏点之间的弦偏离过大
+        mids = (points[1:] + points[:-1]) / 2
+        chord_dev = float(np.max(np.abs(np.hypot(*(mids - center).T) - radius)))
+        if chord_dev > self.arc_tolerance:
+            return None
+        return center, radius, sweep > 0, max(deviation, chord_dev)
+
+    def _reduce_polyline(self, points: np.ndarray) -> Tuple[List[Dict], float]:
+        """精简一条折线，返回 (运动指令列表（不含起点）, 最大偏差)"""
+        base = merge_collinear(points)
+        kept = base[rdp_indices(points[base], self.tolerance)]
+        max_dev = 0.0
+        for a, b in zip(kept[:-1], kept[1:]):
+            if b - a > 1:
+                max_dev = max(max_dev, float(_segment_distances(points[a + 1:b], points[a], points[b]).max()))
+
+        commands = []
+        i = 0
+        while i < len(kept) - 1:
+            best = None
+            if self.arc_fitting:
+                # 贪心地向后延伸圆弧，覆盖尽可能多的简化线段
+                j = i + self.min_arc_segments
+                while j < len(kept):
+                    fit = self._fit_arc(points[kept[i]:kept[j] + 1])
+                    if fit is None:
+                        break
+                    best = (j, fit)
+                    j += 1
+            if best is not None:
+                j, (center, radius, ccw, deviation) = best
+                start, end = points[kept[i]], points[kept[j]]
+                commands.append({
+                    'type': 'G3' if ccw else 'G2',
+                    'x': float(end[0]), 'y': float(end[1]),
+                    'i': float(center[0] - start[0]), 'j': float(center[1] - start[1]),
+                })
+                max_dev = max(max_dev, deviation)
+                i = j
+            else:
+                end = points[kept[i + 1]]
+                commands.append({'type': 'G1', 'x': float(end[0]), 'y': float(end[1])})
+                i += 1
+        return commands, max_dev
+
+    def reduce(self, paths: List[List[Dict]]) -> List[List[Dict]]:
+        """精简所有路径中的连续 G1 线段
+
+        参数：
+            paths: 每条路径为指令字典列表
+
+        返回：
+            List[List[Dict]]: 精简后的路径指令
+        """
+        points_before = 0
+        points_after = 0
+        arcs = 0
+        max_dev = 0.0
+        reduced_paths = []
+        for commands in paths:
+            reduced = []
+            run = []  # 当前连续 G1 段（含起点）
+            feed = None
+
+            def flush() -> None:
+                nonlocal points_after, arcs, max_dev
+                if len(run) < 2:
+                    return
+                pts = np.asarray(run, dtype=np.float64)
+                moves, dev = self._reduce_polyline(pts)
+                for move in moves:
+                    if feed is not None:
+                        move['f'] = feed
+                    arcs += move['type'] in ('G2', 'G3')
+                reduced.extend(moves)
+                points_after += len(moves)
+                max_dev = max(max_dev, dev)
+
+            x = y = 0.0
+            for cmd in commands:
+                if cmd['type'] == 'G1' and 'x' in cmd and 'y' in cmd:
+                    if not run:
+                        run.append((x, y))
+                    run.append((cmd['x'], cmd['y']))
+                    feed = cmd.get('f', feed)
+                    points_before += 1
+                else:
+                    flush()
+                    run = []
+                    reduced.append(cmd)
+                    if cmd['type'] in ('G0', 'G1', 'G2', 'G3'):
+                        points_before += 1
+                        points_after += 1
+                x, y = cmd.get('x', x), cmd.get('y', y)
+            flush()
+            reduced_paths.append(reduced)
+
+        self.stats = {
+            'points_before': points_before,
+            'points_after': points_after,
+            'reduction_ratio': round(points_before / points_after, 2) if points_after else 0.0,
+            'arcs': arcs,
+            'max_deviation_mm': round(max_dev, 4),
+            'tolerance_mm': self.tolerance,
+        }
+        logger.info(f"刀路精简完成: {points_before} -> {points_after} 个点，最大偏差 {max_dev:.4f} mm")
+        return reduced_paths
@@ -1,7 +1,16 @@
-from flask import Flask, render_template, request, jsonify
-from ai.pattern_generator import PatternGenerator
+from flask import Flask, Response, g, render_template, request, jsonify, make_response, url_for, stream_with_context
+from ai.pattern_generator import PatternGenerator, MAX_SAMPLES
 from ai.step_analyzer import StepAnalyzer
-from hardware.arduino_controller import ArduinoController
+from ai.step_format import STEP_FORMATS
+from ai.analysis_cache import AnalysisCache
+from ai.api_client import RetryLater
+from ai.generation_cache import DiskGenerationCache, MemoryGenerationCache
+from ai.generation_jobs import GenerationJobManager, JobLimitError
+from hardware.arduino_controller import ArduinoController, MachineBusyError
+from hardware.plot_jobs import PlotJobManager, JobStateError
+from hardware.plot_program import PlotProgram
+from artifact_store import ArtifactStore
+from metrics import REGISTRY, request_timings, record_stage, server_timing_header, start_request_timing, timed
 import os
 from dotenv import load_dotenv
 import logging
@@ -10,6 +19,9 @@ import traceback
 from typing import Dict, Any, List, Optional, Union
 import json
 import io
+import math
+import time
+import xml.etree.ElementTree as ET
 from PIL import Image
 
 # 加载环境变量配置
@@ -33,15 +45,75 @@ app = Flask(__name__,
 
 # 初始化核心组件
 try:
-    pattern_generator = PatternGenerator()
-    step_analyzer = StepAnalyzer()
+    # 设置 GENERATION_CACHE_DIR 时使用可被多进程共享的磁盘缓存
+    generation_cache_dir = os.getenv('GENERATION_CACHE_DIR')
+    if generation_cache_dir:
+        generation_cache = DiskGenerationCache(
+            generation_cache_dir,
+            ttl=float(os.getenv('GENERATION_CACHE_TTL', 7 * 24 * 3600)),
+            max_bytes=int(os.getenv('GENERATION_CACHE_MAX_BYTES', 1024 * 1024 * 1024))
+        )
+    else:
+        generation_cache = MemoryGenerationCache(max_entries=100)
+    pattern_generator = PatternGenerator(cache=generation_cache)
+    analysis_cache = AnalysisCache(
+        max_entries=int(os.getenv('ANALYSIS_CACHE_SIZE', 64)),
+        disk_dir=os.getenv('ANALYSIS_CACHE_DIR') or None,
+        disk_max_bytes=int(os.getenv('ANALYSIS_CACHE_DISK_BYTES', 512 * 1024 * 1024))
+    )
+    step_analyzer = StepAnalyzer(cache=analysis_cache)
+    generation_job_manager = GenerationJobManager(
+        pattern_generator,
+        workers=int(os.getenv('GENERATION_WORKERS', 2)),
+        max_queue=int(os.getenv('GENERATION_MAX_QUEUE', 32)),
+        per_client_limit=int(os.getenv('GENERATION_PER_CLIENT_LIMIT', 2)),
+        batch_concurrency=int(os.getenv('GENERATION_BATCH_CONCURRENCY', 4)),
+        # 批量候选按轮廓数排序，轮廓越少越容易剪裁
+        scorer=lambda image: step_analyzer.cutting_complexity(base64.b64decode(image))
+    )
     arduino_controller = ArduinoController()
+    plot_job_manager = PlotJobManager(arduino_controller)
+    artifact_store = ArtifactStore(int(os.getenv('ARTIFACT_CACHE_BYTES', 256 * 1024 * 1024)))
     logger.info("所有核心组件初始化成功")
 except Exception as e:
     logger.error(f"组件初始化失败: {str(e)}")
     logger.error(f"详细错误信息: {traceback.format_exc()}")
     raise
 
+# 请求耗时与运行状态指标，由 /metrics 以 Prometheus 文本格式导出
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'papercut_http_request_seconds', 'HTTP 请求处理耗时（秒）', ('method', 'route', 'status'))
+REGISTRY.gauge('papercut_plotter_busy', '绘图机是否正在执行任务（1 为忙）').set_function(
+    lambda: arduino_controller.busy)
+REGISTRY.gauge('papercut_generation_queue_depth', '排队中的生成任务数').set_function(
+    lambda: generation_job_manager.stats()['queue_depth'])
+REGISTRY.gauge('papercut_generation_running', '正在执行的生成任务数').set_function(
+    lambda: generation_job_manager.stats()['running'])
+# 为 True 时每个响应附带 Server-Timing 头，可在浏览器开发者工具中查看各阶段耗时
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'false').lower() in ('1', 'true', 'yes')
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    start_request_timing()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get('request_started')
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    HTTP_REQUEST_SECONDS.observe(elapsed, method=request.method, route=route, status=response.status_code)
+    if SERVER_TIMING:
+        response.headers['Server-Timing'] = server_timing_header(request_timings(), elapsed)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """以 Prometheus 文本格式导出指标"""
+    return Response(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/')
 def index():
     """渲染主页
@@ -56,6 +128,46 @@ def index():
         logger.error(f"详细错误信息: {traceback.format_exc()}")
         return "服务器错误，请稍后重试", 500
 
+# 允许客户端覆盖的生成参数及其类型
+GENERATION_OPTION_TYPES = {
+    'cfg_scale': (int, float),
+    'steps': int,
+    'style_preset': str,
+    'width': int,
+    'height': int,
+    'seed': int,
+}
+
+def _generation_options(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """从请求中提取可选的生成参数
+    
+    Args:
+        payload: 请求JSON
+        
+    Returns:
+        Dict[str, Any]: 传给 PatternGenerator.generate 的关键字参数
+        
+    Raises:
+        ValueError: 参数类型无效
+    """
+    options = {}
+    for name, expected in GENERATION_OPTION_TYPES.items():
+        if name in payload:
+            value = payload[name]
+            if isinstance(value, bool) or not isinstance(value, expected):
+                raise ValueError(f'参数 {name} 类型无效')
+            options[name] = value
+    return options
+
+def _retry_later_response(error: RetryLater):
+    """远程 API 暂不可用时返回 503 + Retry-After，由客户端稍后重试"""
+    retry_after = max(int(math.ceil(error.retry_after)), 1)
+    logger.warning(f"图案生成暂不可用: {str(error)}，建议 {retry_after} 秒后重试")
+    response = jsonify({'error': f'{str(error)}，请 {retry_after} 秒后重试', 'retry_after': retry_after})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
 @app.route('/generate_pattern', methods=['POST'])
 def generate_pattern():
     """生成剪纸图案的API端点
@@ -81,7 +193,7 @@ def generate_pattern():
         logger.info(f"开始生成图案，提示词: {prompt}")
         
         # 生成图案
-        image_data = pattern_generator.generate(prompt)
+        image_data = pattern_generator.generate(prompt, **_generation_options(request.json))
         if not image_data:
             logger.error("图案生成失败")
             return jsonify({'error': '图案生成失败，请重试'}), 500
@@ -89,6 +201,9 @@ def generate_pattern():
         logger.info("图案生成成功")
         return jsonify({'image': image_data})
         
+    except RetryLater as e:
+        return _retry_later_response(e)
+        
     except ValueError as e:
         logger.error(f"参数验证错误: {str(e)}")
         return jsonify({'error': str(e)}), 400
@@ -98,52 +213,217 @@ def generate_pattern():
         logger.error(f"详细错误信息: {traceback.format_exc()}")
         return jsonify({'error': '服务器内部错误，请稍后重试'}), 500
 
-@app.route('/analyze_steps', methods=['POST'])
-def analyze_steps():
-    """分析剪纸步骤的API端点
+# 单个批量任务允许的最多提示词数
+MAX_BATCH_PROMPTS = int(os.getenv('GENERATION_MAX_BATCH', 50))
+
+def _client_id() -> str:
+    """区分客户端以限制并发生成任务数：优先使用 X-Client-Id 头"""
+    return request.headers.get('X-Client-Id') or request.remote_addr or 'anonymous'
+
+@app.route('/generation_jobs', methods=['POST'])
+def submit_generation_job():
+    """提交后台图案生成任务的API端点
     
     Returns:
         tuple: (JSON响应, HTTP状态码)
     """
     try:
-        # 获取并验证图像数据
         if not request.is_json:
             logger.warning("请求格式不是JSON")
             return jsonify({'error': '请求格式必须是JSON'}), 400
             
-        image_data = request.json.get('image')
-        if not image_data:
-            logger.error("未提供图像数据")
-            return jsonify({'error': '请提供需要分析的图像'}), 400
+        options = _generation_options(request.json)
+        prompts = request.json.get('prompts')
+        samples = request.json.get('samples', 1)
+        if isinstance(samples, bool) or not isinstance(samples, int) or not 1 <= samples <= MAX_SAMPLES:
+            return jsonify({'error': f'samples 必须是 1 到 {MAX_SAMPLES} 之间的整数'}), 400
 
-        # 验证base64数据格式
-        try:
-            if ',' in image_data:
-                image_data = image_data.split(',')[1]
-            # 验证base64数据是否有效
-            decoded_data = base64.b64decode(image_data)
-            if len(decoded_data) == 0:
-                logger.error("图像数据为空")
-                return jsonify({'error': '图像数据为空'}), 400
-                
-            # 验证图像数据是否有效
+        if prompts is not None or samples > 1:
+            # 批量 / 多候选任务
+            if prompts is None:
+                prompts = [request.json.get('prompt')]
+            if not isinstance(prompts, list) or not 0 < len(prompts) <= MAX_BATCH_PROMPTS:
+                return jsonify({'error': f'prompts 必须是包含 1 到 {MAX_BATCH_PROMPTS} 个提示词的列表'}), 400
+            job = generation_job_manager.submit_batch(
+                prompts, samples=samples, rank=bool(request.json.get('rank')),
+                options=options, client_id=_client_id())
+        else:
+            prompt = request.json.get('prompt')
+            if not prompt or not isinstance(prompt, str):
+                logger.warning("用户未提供有效的提示词")
+                return jsonify({'error': '请提供生成图案的关键词'}), 400
+            job = generation_job_manager.submit(prompt, options, client_id=_client_id())
+        data = job.to_dict()
+        data['status_url'] = url_for('get_generation_job', job_id=job.id)
+        data['events_url'] = url_for('generation_job_events', job_id=job.id)
+        return jsonify(data), 202
+        
+    except JobLimitError as e:
+        logger.warning(f"生成任务被拒绝: {str(e)}")
+        response = jsonify({'error': str(e), 'retry_after': e.retry_after})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(int(math.ceil(e.retry_after)))
+        return response
+        
+    except ValueError as e:
+        logger.error(f"参数验证错误: {str(e)}")
+        return jsonify({'error': str(e)}), 400
+        
+    except Exception as e:
+        logger.error(f"提交生成任务时发生错误: {str(e)}")
+        logger.error(f"详细错误信息: {traceback.format_exc()}")
+        return jsonify({'error': '服务器内部错误，请稍后重试'}), 500
+
+@app.route('/generation_jobs', methods=['GET'])
+def generation_jobs_stats():
+    """返回生成队列深度与吞吐统计的API端点
+    
+    Returns:
+        tuple: (JSON响应, HTTP状态码)
+    """
+    return jsonify(generation_job_manager.stats())
+
+@app.route('/generation_jobs/<job_id>', methods=['GET'])
+def get_generation_job(job_id):
+    """查询生成任务状态的API端点，完成后包含图片数据
+    
+    Args:
+        job_id: 任务ID
+        
+    Returns:
+        tuple: (JSON响应, HTTP状态码)
+    """
+    job = generation_job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': '生成任务不存在'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/generation_jobs/<job_id>/events', methods=['GET'])
+def generation_job_events(job_id):
+    """以 Server-Sent Events 推送生成任务状态变化的API端点
+    
+    Args:
+        job_id: 任务ID
+        
+    Returns:
+        Response: text/event-stream 响应
+    """
+    job = generation_job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': '生成任务不存在'}), 404
+
+    def events():
+        version = -1
+        while True:
+            current = job.wait_for_change(version, timeout=15.0)
+            if current == version:
+                yield ': keep-alive\n\n'
+                continue
+            version = current
+            yield f"data: {json.dumps(job.to_dict(include_image=False))}\n\n"
+            if job.finished:
+                break
+
+    response = Response(stream_with_context(events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/generation_jobs/<job_id>/cancel', methods=['POST'])
+def cancel_generation_job(job_id):
+    """取消排队中的生成任务的API端点
+    
+    Args:
+        job_id: 任务ID
+        
+    Returns:
+        tuple: (JSON响应, HTTP状态码)
+    """
+    try:
+        job = generation_job_manager.cancel(job_id)
+        return jsonify(job.to_dict(include_image=False))
+    except KeyError:
+        return jsonify({'error': '生成任务不存在'}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+
+@app.route('/analyze_steps', methods=['POST'])
+def analyze_steps():
+    """分析剪纸步骤的API端点
+    
+    Returns:
+        tuple: (JSON响应, HTTP状态码)
+    """
+    try:
+        # 获取图像数据：multipart/form-data、原始 image/* 请求体或 JSON 中的 base64
+        # 二进制上传默认以内容寻址 URL 返回 SVG 和可视化图像，JSON 请求默认内联
+        mimetype = request.mimetype or ''
+        if mimetype == 'multipart/form-data':
+            upload = request.files.get('image')
+            if upload is None:
+                logger.error("未提供图像数据")
+                return jsonify({'error': '请提供需要分析的图像'}), 400
+            decoded_data = upload.read()
+            artifact_mode = 'url'
+        elif mimetype.startswith('image/'):
+            decoded_data = request.get_data()
+            artifact_mode = 'url'
+        elif request.is_json:
+            image_data = request.json.get('image')
+            if not image_data:
+                logger.error("未提供图像数据")
+                return jsonify({'error': '请提供需要分析的图像'}), 400
+
+            # 一次性解码：base64 -> 字节 -> RGB 数组，直接交给分析器
             try:
-                image = Image.open(io.BytesIO(decoded_data))
-                if image.size[0] == 0 or image.size[1] == 0:
-                    logger.error("图像尺寸无效")
-                    return jsonify({'error': '图像尺寸无效'}), 400
+                if ',' in image_data:
+                    image_data = image_data.split(',')[1]
+                decoded_data = base64.b64decode(image_data)
             except Exception as e:
-                logger.error(f"图像数据无效: {str(e)}")
-                return jsonify({'error': '图像数据无效'}), 400
-                
-        except Exception as e:
-            logger.error(f"图像数据格式无效: {str(e)}")
-            return jsonify({'error': '图像数据格式不正确'}), 400
+                logger.error(f"图像数据格式无效: {str(e)}")
+                return jsonify({'error': '图像数据格式不正确'}), 400
+            artifact_mode = request.json.get('artifacts', 'inline')
+        else:
+            logger.warning(f"不支持的请求格式: {mimetype}")
+            return jsonify({'error': '请求格式必须是JSON、multipart/form-data 或 image/*'}), 400
+
+        artifact_mode = request.args.get('artifacts', artifact_mode)
+        if artifact_mode not in ('url', 'inline'):
+            return jsonify({'error': 'artifacts 参数必须是 url 或 inline'}), 400
+
+        # 只需要步骤和 SVG 的客户端可以跳过可视化 PNG 的绘制与编码
+        include_visualization = request.args.get('visualization')
+        if include_visualization is None:
+            include_visualization = request.json.get('visualization', True) if request.is_json else True
+        else:
+            include_visualization = include_visualization.lower() not in ('0', 'false', 'no')
+
+        # 步骤格式：compact（默认）/ packed / lean / full（旧版，每步自带 path_pixels）
+        steps_format = request.args.get('steps')
+        if steps_format is None:
+            steps_format = request.json.get('steps', 'compact') if request.is_json else 'compact'
+        if steps_format not in STEP_FORMATS:
+            return jsonify({'error': f"steps 参数必须是 {' / '.join(STEP_FORMATS)} 之一"}), 400
+
+        if len(decoded_data) == 0:
+            logger.error("图像数据为空")
+            return jsonify({'error': '图像数据为空'}), 400
+
+        try:
+            with timed('analyzer', 'decode'):
+                image = StepAnalyzer.decode_image(decoded_data)
+        except ValueError as e:
+            logger.error(f"图像数据无效: {str(e)}")
+            return jsonify({'error': '图像数据无效'}), 400
+        # 解码完成后尽早释放原始数据
+        del decoded_data
 
         # 分析剪纸步骤
         logger.info("开始分析剪纸步骤")
         try:
-            result = step_analyzer.analyze(image_data)
+            result = step_analyzer.analyze_image(image, binary_artifacts=artifact_mode == 'url',
+                                                 visualization=bool(include_visualization),
+                                                 steps_format=steps_format)
         except Exception as e:
             logger.error(f"步骤分析失败: {str(e)}")
             logger.error(f"详细错误信息: {traceback.format_exc()}")
@@ -170,8 +450,23 @@ def analyze_steps():
             logger.error(f"steps字段类型错误: {type(result['steps'])}")
             return jsonify({'error': '步骤数据格式错误'}), 500
             
+        if artifact_mode == 'url':
+            store_started = time.perf_counter()
+            svg_key = artifact_store.put(result.pop('svg_data').encode('utf-8'), 'svg')
+            result['svg_url'] = url_for('get_artifact', key=svg_key)
+            visualization = result.pop('visualization', None)
+            if visualization:
+                result['visualization_url'] = url_for('get_artifact', key=artifact_store.put(visualization, 'png'))
+            contours = result.get('contours')
+            if contours is not None:
+                # 轮廓数组以 int16 小端原始字节单独提供，客户端按 offsets 切分
+                contour_key = artifact_store.put(contours.pop('data'), 'bin')
+                contours['url'] = url_for('get_artifact', key=contour_key)
+            record_stage('http', 'artifacts', time.perf_counter() - store_started)
+
         logger.info(f"成功生成 {len(result['steps'])} 个剪纸步骤")
-        return jsonify(result)
+        with timed('http', 'serialize'):
+            return jsonify(result)
         
     except ValueError as e:
         logger.error(f"参数验证错误: {str(e)}")
@@ -182,35 +477,178 @@ def analyze_steps():
         logger.error(f"详细错误信息: {traceback.format_exc()}")
         return jsonify({'error': '服务器内部错误，请稍后重试'}), 500
 
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    """返回缓存命中统计（及远程 API 退避 / 熔断状态）的API端点
+    
+    Returns:
+        tuple: (JSON响应, HTTP状态码)
+    """
+    return jsonify({
+        'analysis': analysis_cache.stats(),
+        'generation': generation_cache.stats(),
+        'upstream': pattern_generator.backend.stats()
+    })
+
+@app.route('/artifacts/<key>', methods=['GET'])
+def get_artifact(key):
+    """按内容地址返回分析产物（SVG、可视化图像）
+    
+    Args:
+        key: 内容的 SHA-256 加扩展名
+        
+    Returns:
+        Response: 产物内容，带 ETag 与长期缓存头
+    """
+    artifact = artifact_store.get(key)
+    if artifact is None:
+        return jsonify({'error': '产物不存在或已过期'}), 404
+    data, mimetype = artifact
+    response = make_response(data)
+    response.mimetype = mimetype
+    response.set_etag(key.split('.')[0])
+    # 内容寻址：同一 URL 的内容永远不变
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response.make_conditional(request)
+
+# /export_gcode 支持的导出格式
+PROGRAM_EXPORT_FORMATS = {
+    'gcode': ('text/x-gcode; charset=utf-8', 'gcode'),
+    'bin': ('application/octet-stream', 'pcgc'),
+}
+
+@app.route('/export_gcode', methods=['POST'])
+def export_gcode():
+    """离线导出 G-code 的API端点
+
+    接受 JSON 中的 svg_data，或图像（JSON base64 / multipart / image/*，先做步骤分析）。
+    ?format=gcode（默认）返回 G-code 文本，?format=bin 返回预编译的二进制程序；
+    程序 id 在 X-Program-Id 头中返回，可直接用于 /plot_jobs 与 /send_to_arduino。
+
+    Returns:
+        Response: 附件形式的程序文件，或 (JSON错误, HTTP状态码)
+    """
+    try:
+        mimetype = request.mimetype or ''
+        payload = request.json if request.is_json else {}
+        export_format = request.args.get('format') or payload.get('format') or 'gcode'
+        if export_format not in PROGRAM_EXPORT_FORMATS:
+            return jsonify({'error': 'format 参数必须是 gcode 或 bin'}), 400
+
+        svg_data = payload.get('svg_data')
+        if not svg_data:
+            if mimetype == 'multipart/form-data':
+                upload = request.files.get('image')
+                image_data = upload.read() if upload is not None else None
+            elif mimetype.startswith('image/'):
+                image_data = request.get_data()
+            elif payload.get('image'):
+                try:
+                    image_data = base64.b64decode(payload['image'].split(',')[-1])
+                except Exception as e:
+                    logger.error(f"图像数据格式无效: {str(e)}")
+                    return jsonify({'error': '图像数据格式不正确'}), 400
+            else:
+                image_data = None
+            if not image_data:
+                logger.error("未提供SVG或图像数据")
+                return jsonify({'error': '请提供SVG绘图数据或需要分析的图像'}), 400
+            result = step_analyzer.analyze_image(image_data, visualization=False, steps_format='lean')
+            if not result:
+                return jsonify({'error': '分析失败或未找到轮廓'}), 400
+            svg_data = result['svg_data']
+
+        with timed('plotter', 'compile'):
+            program = arduino_controller.compile_svg(svg_data)
+        content_type, extension = PROGRAM_EXPORT_FORMATS[export_format]
+        data = program.to_gcode().encode('utf-8') if export_format == 'gcode' else program.to_bytes()
+        response = make_response(data)
+        response.headers['Content-Type'] = content_type
+        response.headers['Content-Disposition'] = f'attachment; filename="papercut-{program.id[:12]}.{extension}"'
+        response.headers['X-Program-Id'] = program.id
+        response.headers['X-Program-Lines'] = str(len(program))
+        return response
+
+    except ET.ParseError as e:
+        logger.error(f"SVG 解析失败: {str(e)}")
+        return jsonify({'error': 'SVG 数据格式不正确'}), 400
+
+    except ValueError as e:
+        logger.error(f"参数验证错误: {str(e)}")
+        return jsonify({'error': str(e)}), 400
+
+    except Exception as e:
+        logger.error(f"导出 G-code 时发生错误: {str(e)}")
+        logger.error(f"详细错误信息: {traceback.format_exc()}")
+        return jsonify({'error': '服务器内部错误，请稍后重试'}), 500
+
+def _plot_request() -> Dict[str, Any]:
+    """解析绘图请求：JSON（svg_data 或 program_id）或 application/octet-stream 二进制程序
+
+    Returns:
+        Dict: {'svg_data', 'program', 'mode'}，缺少输入时抛出 ValueError，
+        program_id 已失效时抛出 KeyError
+    """
+    if request.mimetype == 'application/octet-stream':
+        return {'svg_data': None, 'program': PlotProgram.from_bytes(request.get_data()),
+                'mode': request.args.get('mode')}
+    if not request.is_json:
+        raise ValueError('请求格式必须是JSON或 application/octet-stream')
+    program = None
+    program_id = request.json.get('program_id')
+    if program_id:
+        program = arduino_controller.programs.get(program_id)
+        if program is None:
+            raise KeyError(program_id)
+    svg_data = request.json.get('svg_data')
+    if program is None and not svg_data:
+        raise ValueError('请提供SVG绘图数据或 program_id')
+    return {'svg_data': svg_data, 'program': program, 'mode': request.json.get('mode')}
+
 @app.route('/send_to_arduino', methods=['POST'])
 def send_to_arduino():
     """发送指令到Arduino的API端点
+
+    除 SVG 外也接受 /export_gcode 返回的 program_id 或二进制程序，跳过编译。
     
     Returns:
         tuple: (JSON响应, HTTP状态码)
     """
     try:
-        # 验证请求格式
-        if not request.is_json:
-            logger.warning("请求格式不是JSON")
-            return jsonify({'error': '请求格式必须是JSON'}), 400
-            
-        svg_data = request.json.get('svg_data')
-        if not svg_data:
-            logger.error("未提供SVG数据")
-            return jsonify({'error': '请提供SVG绘图数据'}), 400
+        try:
+            plot = _plot_request()
+        except KeyError:
+            return jsonify({'error': '绘图程序不存在或已过期，请重新导出'}), 404
+
+        # 发送模式：pingpong 或 stream，未指定时使用控制器默认值
+        mode = plot['mode']
+        if mode is not None and mode not in ('pingpong', 'stream'):
+            logger.warning(f"发送模式无效: {mode}")
+            return jsonify({'error': '发送模式必须是 pingpong 或 stream'}), 400
 
         # 发送SVG到Arduino
-        logger.info("正在发送SVG绘图到Arduino")
-        success = arduino_controller.send_svg(svg_data)
+        if plot['program'] is not None:
+            logger.info("正在发送预编译的绘图程序到Arduino")
+            success = arduino_controller.send_program(plot['program'], mode=mode)
+        else:
+            logger.info("正在发送SVG绘图到Arduino")
+            success = arduino_controller.send_svg(plot['svg_data'], mode=mode)
         
         if success:
             logger.info("SVG绘图发送成功")
-            return jsonify({'message': 'SVG绘图已成功发送到机器'})
+            return jsonify({
+                'message': 'SVG绘图已成功发送到机器',
+                'stats': arduino_controller.last_send_stats,
+                'compile_stats': arduino_controller.last_compile_stats
+            })
         else:
             logger.error("SVG绘图发送失败")
             return jsonify({'error': '无法发送SVG绘图到机器'}), 500
             
+    except MachineBusyError as e:
+        logger.warning(f"机器正忙: {str(e)}")
+        return jsonify({'error': str(e)}), 409
+
     except ValueError as e:
         logger.error(f"参数验证错误: {str(e)}")
         return jsonify({'error': str(e)}), 400
@@ -220,6 +658,87 @@ def send_to_arduino():
         logger.error(f"详细错误信息: {traceback.format_exc()}")
         return jsonify({'error': '机器通信错误，请检查连接'}), 500
 
+@app.route('/plot_jobs', methods=['POST'])
+def submit_plot_job():
+    """提交后台绘图任务的API端点
+    
+    Returns:
+        tuple: (JSON响应, HTTP状态码)
+    """
+    try:
+        try:
+            plot = _plot_request()
+        except KeyError:
+            return jsonify({'error': '绘图程序不存在或已过期，请重新导出'}), 404
+
+        job = plot_job_manager.submit(plot['svg_data'], mode=plot['mode'] or 'stream',
+                                      program=plot['program'])
+        return jsonify(job.to_dict()), 202
+        
+    except ValueError as e:
+        logger.error(f"参数验证错误: {str(e)}")
+        return jsonify({'error': str(e)}), 400
+        
+    except Exception as e:
+        logger.error(f"提交绘图任务时发生错误: {str(e)}")
+        logger.error(f"详细错误信息: {traceback.format_exc()}")
+        return jsonify({'error': '服务器内部错误，请稍后重试'}), 500
+
+@app.route('/plot_jobs', methods=['GET'])
+def list_plot_jobs():
+    """列出绘图任务的API端点
+    
+    Returns:
+        tuple: (JSON响应, HTTP状态码)
+    """
+    return jsonify({'jobs': plot_job_manager.list_jobs(), 'busy': arduino_controller.busy})
+
+@app.route('/plot_jobs/<job_id>', methods=['GET'])
+def get_plot_job(job_id):
+    """查询绘图任务进度的API端点
+    
+    Args:
+        job_id: 任务ID
+        
+    Returns:
+        tuple: (JSON响应, HTTP状态码)
+    """
+    job = plot_job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': '绘图任务不存在'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/plot_jobs/<job_id>/<action>', methods=['POST'])
+def control_plot_job(job_id, action):
+    """暂停、继续或取消绘图任务的API端点
+    
+    Args:
+        job_id: 任务ID
+        action: pause / resume / cancel
+        
+    Returns:
+        tuple: (JSON响应, HTTP状态码)
+    """
+    handlers = {
+        'pause': plot_job_manager.pause,
+        'resume': plot_job_manager.resume,
+        'cancel': plot_job_manager.cancel,
+    }
+    if action not in handlers:
+        return jsonify({'error': '不支持的操作'}), 404
+    try:
+        job = handlers[action](job_id)
+        logger.info(f"绘图任务 {job_id} 执行操作: {action}")
+        return jsonify(job.to_dict())
+    except KeyError:
+        return jsonify({'error': '绘图任务不存在'}), 404
+    except JobStateError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        logger.error(f"绘图任务操作失败: {str(e)}")
+        logger.error(f"详细错误信息: {traceback.format_exc()}")
+        return jsonify({'error': '机器通信错误，请检查连接'}), 500
+
 @app.route('/calibrate_machine', methods=['POST'])
 def calibrate_machine():
     """校准机器的API端点
@@ -238,6 +757,10 @@ def calibrate_machine():
             logger.error("机器校准失败")
             return jsonify({'error': '机器校准失败，请检查机器状态'}), 500
             
+    except MachineBusyError as e:
+        logger.warning(f"机器正忙: {str(e)}")
+        return jsonify({'error': str(e)}), 409
+
     except Exception as e:
         logger.error(f"校准过程发生错误: {str(e)}")
         logger.error(f"详细错误信息: {traceback.format_exc()}")
@@ -261,11 +784,72 @@ def test_connection():
             logger.error("连接测试失败")
             return jsonify({'error': '无法连接到机器，请检查连接'}), 500
             
+    except MachineBusyError as e:
+        logger.warning(f"机器正忙: {str(e)}")
+        return jsonify({'error': str(e)}), 409
+
     except Exception as e:
         logger.error(f"连接测试错误: {str(e)}")
         logger.error(f"详细错误信息: {traceback.format_exc()}")
         return jsonify({'error': '连接测试失败，请检查机器状态'}), 500
 
+@app.route('/check_arduino_connection', methods=['GET'])
+def check_arduino_connection():
+    """检查机器连接状态的API端点
+
+    已连接时直接返回内存中的连接健康状况，不访问串口；从未连接时尝试连接一次并保持连接，
+    断线后的重连由后台线程按退避间隔进行，这里只在到达重试时间时顺带尝试一次。
+
+    Returns:
+        tuple: (JSON响应, HTTP状态码)
+    """
+    if not arduino_controller.connected:
+        if arduino_controller.auto_reconnect:
+            arduino_controller.reconnect()
+        else:
+            try:
+                with arduino_controller.exclusive():
+                    arduino_controller.connect()
+            except MachineBusyError:
+                pass
+    health = arduino_controller.health()
+    if not health['connected']:
+        return jsonify({'error': '无法连接到机器，请检查连接', **health}), 503
+    return jsonify(health)
+
+@app.route('/machine_status', methods=['GET'])
+def machine_status():
+    """查询最近一次机器状态（运行状态、笔的位置、缓冲区）的API端点
+
+    Returns:
+        Response: JSON响应
+    """
+    return jsonify(arduino_controller.status.to_dict())
+
+@app.route('/machine_status/events', methods=['GET'])
+def machine_status_events():
+    """以 Server-Sent Events 推送机器状态变化的API端点
+
+    Returns:
+        Response: text/event-stream 响应
+    """
+    status = arduino_controller.status
+
+    def events():
+        version = -1
+        while True:
+            current = status.wait_for_change(version, timeout=15.0)
+            if current == version:
+                yield ': keep-alive\n\n'
+                continue
+            version = current
+            yield f"data: {json.dumps(status.to_dict())}\n\n"
+
+    response = Response(stream_with_context(events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @app.errorhandler(404)
 def not_found(error):
     """处理404错误
@@ -7,7 +7,11 @@ let isPaused = false;       // 暂停状态
 let currentView = 'pattern'; // 当前视图状态
 let currentStepIndex = 0;    // 当前步骤索引
 let currentSVG = null;       // 当前的SVG数据
-let currentVisualization = null; // 当前的可视化图像
+let currentVisualization = null; // 当前的可视化图像地址（URL 或 data URL）
+let currentContours = null;  // 当前各部分的轮廓点（Int16Array，x/y 交替），步骤通过 path 引用
+let currentJobId = null;     // 当前的后台绘图任务ID
+let jobPollTimer = null;     // 任务进度轮询定时器
+let confirmCallbacks = {};   // 确认对话框的回调函数
 
 /**
  * 显示提示消息
@@ -43,9 +47,8 @@ function showConfirmModal(message, onConfirm, onCancel) {
     modal.style.display = 'flex';
     setTimeout(() => modal.classList.add('show'), 10);
     
-    // 存储回调函数
-    modal.dataset.onConfirm = onConfirm;
-    modal.dataset.onCancel = onCancel;
+    // 存储回调函数（dataset 只能保存字符串）
+    confirmCallbacks = { onConfirm, onCancel };
 }
 
 /**
@@ -53,7 +56,7 @@ function showConfirmModal(message, onConfirm, onCancel) {
  */
 window.confirmOperation = function() {
     const modal = document.getElementById('confirmModal');
-    const onConfirm = modal.dataset.onConfirm;
+    const onConfirm = confirmCallbacks.onConfirm;
     
     modal.classList.remove('show');
     setTimeout(() => {
@@ -69,7 +72,7 @@ window.confirmOperation = function() {
  */
 window.cancelOperation = function() {
     const modal = document.getElementById('confirmModal');
-    const onCancel = modal.dataset.onCancel;
+    const onCancel = confirmCallbacks.onCancel;
     
     modal.classList.remove('show');
     setTimeout(() => {
@@ -155,8 +158,8 @@ window.generatePattern = async function() {
         if(resultSection) resultSection.style.display = 'block';
         if(controlSection) controlSection.style.display = 'block';
 
-        // 发送生成请求
-        const response = await fetch('/generate_pattern', {
+        // 提交后台生成任务，等待完成
+        const response = await fetch('/generation_jobs', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -164,12 +167,12 @@ window.generatePattern = async function() {
             body: JSON.stringify({ prompt: prompt })
         });
 
+        const job = await response.json();
         if (!response.ok) {
-            const errorData = await response.json();
-            throw new Error(errorData.error || '生成图案失败');
+            throw new Error(job.error || '生成图案失败');
         }
 
-        const data = await response.json();
+        const data = await waitForGenerationJob(job);
         if (!data || !data.image) {
             throw new Error('从服务器返回的图案数据无效');
         }
@@ -203,6 +206,141 @@ window.generatePattern = async function() {
     }
 };
 
+/**
+ * 等待后台生成任务结束：优先使用事件流，不支持时退化为轮询
+ * @param {Object} job - 提交任务返回的数据
+ * @returns {Promise<Object>} 完成后的任务数据（包含 image）
+ */
+function waitForGenerationJob(job) {
+    const finished = ['completed', 'failed', 'cancelled'];
+
+    const fetchResult = async () => {
+        const response = await fetch(job.status_url);
+        const result = await response.json();
+        if (!response.ok || result.status !== 'completed') {
+            throw new Error(result.error || '生成图案失败');
+        }
+        return result;
+    };
+
+    const poll = (resolve, reject) => {
+        const timer = setInterval(async () => {
+            try {
+                const response = await fetch(job.status_url);
+                const status = await response.json();
+                if (!response.ok || finished.includes(status.status)) {
+                    clearInterval(timer);
+                    fetchResult().then(resolve, reject);
+                }
+            } catch (error) {
+                clearInterval(timer);
+                reject(error);
+            }
+        }, 1000);
+    };
+
+    return new Promise((resolve, reject) => {
+        if (!window.EventSource) {
+            poll(resolve, reject);
+            return;
+        }
+        const source = new EventSource(job.events_url);
+        source.onmessage = (event) => {
+            const status = JSON.parse(event.data);
+            if (finished.includes(status.status)) {
+                source.close();
+                fetchResult().then(resolve, reject);
+            }
+        };
+        // 事件流中断时改为轮询
+        source.onerror = () => {
+            source.close();
+            poll(resolve, reject);
+        };
+    });
+}
+
+/**
+ * 将base64数据转换为Blob，用于二进制上传
+ * @param {string} base64Data - 不带前缀的base64数据
+ * @param {string} type - MIME类型
+ * @returns {Blob} 二进制数据
+ */
+function base64ToBlob(base64Data, type = 'image/png') {
+    return new Blob([base64ToBytes(base64Data)], { type });
+}
+
+/**
+ * 将base64字符串解码为字节数组
+ * @param {string} base64Data - base64编码的数据
+ * @returns {Uint8Array} 字节数组
+ */
+function base64ToBytes(base64Data) {
+    const binary = atob(base64Data);
+    const bytes = new Uint8Array(binary.length);
+    for (let i = 0; i < binary.length; i++) {
+        bytes[i] = binary.charCodeAt(i);
+    }
+    return bytes;
+}
+
+/**
+ * 加载分析结果中的共享轮廓数组
+ * 支持三种形式：每个部分一个整数列表；{offsets, data(base64)}；{offsets, url}（int16 小端原始字节）
+ * @param {Array|Object} contours - 分析结果中的 contours 字段
+ * @returns {Promise<Int16Array[]|null>} 每个部分的轮廓点（x/y 交替）
+ */
+async function loadContours(contours) {
+    if (!contours) return null;
+    if (Array.isArray(contours)) {
+        return contours.map(points => Int16Array.from(points));
+    }
+
+    let buffer;
+    if (contours.url) {
+        const response = await fetch(contours.url);
+        if (!response.ok) {
+            throw new Error('获取轮廓数据失败');
+        }
+        buffer = await response.arrayBuffer();
+    } else {
+        buffer = base64ToBytes(contours.data || '').buffer;
+    }
+    // 浏览器平台均为小端字节序，可以直接按 Int16Array 读取
+    const flat = new Int16Array(buffer);
+    const offsets = contours.offsets;
+    const result = [];
+    for (let k = 0; k + 1 < offsets.length; k++) {
+        result.push(flat.subarray(offsets[k] * 2, offsets[k + 1] * 2));
+    }
+    return result;
+}
+
+/**
+ * 解析步骤对应的路径点
+ * 绘制步骤的 path 为 [轮廓编号, 起点索引, 终点索引]，沿轮廓从起点走到终点（含），
+ * 终点不大于起点时绕回轮廓开头，两者相等表示完整一圈
+ * @param {Object} step - 步骤数据
+ * @returns {Array<Array<number>>} 路径点 [[x, y], ...]
+ */
+function getStepPath(step) {
+    if (step.path_pixels) return step.path_pixels;
+    if (!step.path || !currentContours) return [];
+
+    const [contourId, start, end] = step.path;
+    const contour = currentContours[contourId];
+    if (!contour) return [];
+    const count = contour.length / 2;
+    const points = [];
+    let i = start;
+    do {
+        points.push([contour[i * 2], contour[i * 2 + 1]]);
+        if (i === end && points.length > 1) break;
+        i = (i + 1) % count;
+    } while (points.length <= count);
+    return points;
+}
+
 /**
  * 分析剪纸步骤
  * @param {string} imageData - 图案的base64数据
@@ -217,13 +355,12 @@ async function analyzeSteps(imageData, stepsListContainer, loadingHTML) {
             return;
         }
 
-        // 发送分析请求
+        // 以二进制方式上传图像，SVG和可视化图像通过内容地址URL获取
+        const formData = new FormData();
+        formData.append('image', base64ToBlob(imageData), 'pattern.png');
         const response = await fetch('/analyze_steps', {
             method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ image: imageData })
+            body: formData
         });
 
         if (!response.ok) {
@@ -245,17 +382,26 @@ async function analyzeSteps(imageData, stepsListContainer, loadingHTML) {
 
         // 更新步骤显示
         currentSteps = data.steps;
+        currentContours = await loadContours(data.contours);
         
         // 保存SVG数据和可视化图像
-        if (data.svg_data) {
+        if (data.svg_url) {
+            const svgResponse = await fetch(data.svg_url);
+            if (!svgResponse.ok) {
+                throw new Error('获取SVG数据失败');
+            }
+            currentSVG = await svgResponse.text();
+        } else if (data.svg_data) {
             currentSVG = data.svg_data;
         }
-        if (data.visualization) {
-            currentVisualization = data.visualization;
+        if (data.visualization_url) {
+            currentVisualization = data.visualization_url;
+        } else if (data.visualization) {
+            currentVisualization = `data:image/png;base64,${data.visualization}`;
         }
 
         // 更新显示
-        updateVisualizationDisplay(stepsListContainer);
+        updateStepsDisplay(currentSteps, stepsListContainer);
 
         showMessage(`成功生成剪纸分析结果`, 'success');
 
@@ -299,7 +445,10 @@ function updateVisualizationDisplay(container) {
     if (viewMode === 'visualization' && currentVisualization) {
         container.innerHTML = `
             <div class="visualization-container">
-                <img src="data:image/png;base64,${currentVisualization}" alt="剪纸步骤可视化" class="visualization-image">
+                <div class="visualization-stage">
+                    <img src="${currentVisualization}" alt="剪纸步骤可视化" class="visualization-image">
+                    <canvas class="visualization-highlight"></canvas>
+                </div>
             </div>`;
     } else if (viewMode === 'svg' && currentSVG) {
         container.innerHTML = `
@@ -311,6 +460,64 @@ function updateVisualizationDisplay(container) {
     }
 }
 
+/**
+ * 更新步骤显示：可视化图像下方列出全部步骤，鼠标悬停时在图像上高亮该步骤的路径
+ * @param {Array} steps - 步骤列表
+ * @param {HTMLElement} container - 显示容器，默认为步骤列表容器
+ */
+function updateStepsDisplay(steps, container = document.getElementById('stepsList')) {
+    if (!container) return;
+    updateVisualizationDisplay(container);
+    if (!Array.isArray(steps) || steps.length === 0) return;
+
+    const list = document.createElement('ol');
+    list.className = 'steps-list-view';
+    steps.forEach(step => {
+        const item = document.createElement('li');
+        item.className = 'step-list-item';
+        item.textContent = step.description || '无描述';
+        if (step.type === 'draw') {
+            item.addEventListener('mouseenter', () => highlightStepPath(container, step));
+            item.addEventListener('mouseleave', () => highlightStepPath(container, null));
+        }
+        list.appendChild(item);
+    });
+    container.appendChild(list);
+}
+
+/**
+ * 在可视化图像上方的画布中高亮步骤路径
+ * @param {HTMLElement} container - 显示容器
+ * @param {Object|null} step - 要高亮的步骤，为 null 时清除高亮
+ */
+function highlightStepPath(container, step) {
+    const canvas = container.querySelector('.visualization-highlight');
+    const image = container.querySelector('.visualization-image');
+    if (!canvas || !image || !image.naturalWidth) return;
+
+    // 画布使用图像的原始像素坐标，与分析结果中的轮廓坐标一致
+    if (canvas.width !== image.naturalWidth || canvas.height !== image.naturalHeight) {
+        canvas.width = image.naturalWidth;
+        canvas.height = image.naturalHeight;
+    }
+    const ctx = canvas.getContext('2d');
+    ctx.clearRect(0, 0, canvas.width, canvas.height);
+    if (!step) return;
+
+    const points = getStepPath(step);
+    if (points.length === 0) return;
+    ctx.strokeStyle = 'rgba(255, 215, 0, 0.9)';
+    ctx.lineWidth = 6;
+    ctx.lineJoin = 'round';
+    ctx.lineCap = 'round';
+    ctx.beginPath();
+    ctx.moveTo(points[0][0], points[0][1]);
+    for (let i = 1; i < points.length; i++) {
+        ctx.lineTo(points[i][0], points[i][1]);
+    }
+    ctx.stroke();
+}
+
 /**
  * 切换步骤视图
  */
@@ -437,7 +644,7 @@ window.toggleStepsView = function() {
     // 更新显示
     const stepsListContainer = document.getElementById('stepsList');
     if (stepsListContainer) {
-        updateVisualizationDisplay(stepsListContainer);
+        updateStepsDisplay(currentSteps, stepsListContainer);
     }
 }
 
@@ -462,7 +669,7 @@ window.downloadPattern = function() {
         let data, filename, type;
         
         if (viewMode === 'visualization' && currentVisualization) {
-            data = `data:image/png;base64,${currentVisualization}`;
+            data = currentVisualization;
             filename = '剪纸步骤可视化.png';
             type = 'image/png';
         } else if (viewMode === 'svg' && currentSVG) {
@@ -527,7 +734,7 @@ window.printPattern = function() {
                         </style>
                     </head>
                     <body>
-                        <img src="data:image/png;base64,${currentVisualization}" alt="剪纸步骤可视化">
+                        <img src="${new URL(currentVisualization, window.location.href).href}" alt="剪纸步骤可视化">
                     </body>
                 </html>`;
         } else if (viewMode === 'svg' && currentSVG) {
@@ -608,11 +815,135 @@ window.downloadSteps = function() {
     }
 }
 
+/**
+ * 更新机器状态文本
+ * @param {string} text - 状态文本
+ */
+function setMachineStatusText(text) {
+    const statusText = document.querySelector('#machineStatus .status-text');
+    if (statusText) statusText.textContent = text;
+}
+
+const MACHINE_STATE_NAMES = {
+    'Idle': '空闲',
+    'Run': '运行中',
+    'Hold': '进给保持',
+    'Jog': '点动',
+    'Alarm': '报警锁定',
+    'Door': '安全门打开',
+    'Check': '检查模式',
+    'Home': '回原点',
+    'Sleep': '休眠'
+};
+
+/**
+ * 显示后台状态轮询推送的机器状态与笔的位置
+ * @param {Object} status - /machine_status 返回的状态
+ */
+function renderMachineStatus(status) {
+    const indicator = document.getElementById('machineStatus');
+    if (!indicator) return;
+    indicator.dataset.state = status.connected ? (status.state || 'Unknown') : 'Disconnected';
+
+    const position = indicator.querySelector('.status-position');
+    if (position) {
+        position.textContent = status.connected && status.position
+            ? `X ${status.position[0].toFixed(2)}  Y ${status.position[1].toFixed(2)}`
+            : '';
+    }
+    // 绘图任务进行中时状态文字显示任务进度
+    if (!currentJobId) {
+        setMachineStatusText(status.connected
+            ? (MACHINE_STATE_NAMES[status.state] || status.state || '已连接')
+            : '未连接');
+    }
+}
+
+/**
+ * 订阅机器状态事件流，不支持 EventSource 时定时查询
+ */
+function watchMachineStatus() {
+    const poll = () => {
+        setInterval(async () => {
+            try {
+                const response = await fetch('/machine_status');
+                renderMachineStatus(await response.json());
+            } catch (error) {
+                console.error('查询机器状态时发生错误:', error);
+            }
+        }, 2000);
+    };
+
+    if (!window.EventSource) {
+        poll();
+        return;
+    }
+    const source = new EventSource('/machine_status/events');
+    source.onmessage = (event) => renderMachineStatus(JSON.parse(event.data));
+    // EventSource 会自动重连，这里只记录错误
+    source.onerror = () => console.warn('机器状态事件流中断，正在重连');
+}
+
+/**
+ * 恢复绘制按钮到空闲状态
+ */
+function resetCuttingButtons() {
+    const startBtn = document.querySelector('button[onclick="startCutting()"]');
+    const pauseBtn = document.querySelector('button[onclick="pauseCutting()"]');
+    const stopBtn = document.querySelector('button[onclick="stopCutting()"]');
+
+    setButtonState(startBtn, false);
+    setButtonState(pauseBtn, true);
+    setButtonState(stopBtn, true);
+    if (pauseBtn) pauseBtn.textContent = '暂停';
+}
+
+/**
+ * 轮询后台绘图任务进度
+ */
+async function pollPlotJob() {
+    if (!currentJobId) return;
+    try {
+        const response = await fetch(`/plot_jobs/${currentJobId}`);
+        const job = await response.json();
+        if (!response.ok) {
+            throw new Error(job.error || '查询绘图任务失败');
+        }
+
+        const eta = job.eta_s !== null ? `，剩余约 ${Math.ceil(job.eta_s)} 秒` : '';
+        const statusNames = {
+            'queued': '排队中',
+            'running': '绘制中',
+            'paused': '已暂停',
+            'completed': '绘制完成',
+            'failed': '绘制失败',
+            'cancelled': '已取消'
+        };
+        setMachineStatusText(`${statusNames[job.status] || job.status} ${job.percent}%${eta}`);
+
+        if (['completed', 'failed', 'cancelled'].includes(job.status)) {
+            clearInterval(jobPollTimer);
+            jobPollTimer = null;
+            currentJobId = null;
+            isCutting = false;
+            isPaused = false;
+            resetCuttingButtons();
+            if (job.status === 'completed') {
+                showMessage('绘制完成', 'success');
+            } else if (job.status === 'failed') {
+                showErrorModal(job.error || '绘制失败');
+            }
+        }
+    } catch (error) {
+        console.error('查询绘图任务时发生错误:', error);
+    }
+}
+
 /**
  * 开始切割
  */
 window.startCutting = async function() {
-    if (!currentSteps || !Array.isArray(currentSteps)) {
+    if (!currentSVG) {
         showMessage('没有可执行的切割步骤', 'warning');
         return;
     }
@@ -640,26 +971,27 @@ window.startCutting = async function() {
             if (pauseBtn) setButtonState(pauseBtn, false);
             if (stopBtn) setButtonState(stopBtn, false);
 
-            const response = await fetch('/send_to_arduino', {
+            const response = await fetch('/plot_jobs', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
                 },
-                body: JSON.stringify(currentSteps)
+                body: JSON.stringify({ svg_data: currentSVG })
             });
 
+            const job = await response.json();
             if (!response.ok) {
-                const errorData = await response.json();
-                throw new Error(errorData.error || '发送切割指令失败');
+                throw new Error(job.error || '发送切割指令失败');
             }
 
-            showMessage('切割指令已发送到机器', 'success');
+            currentJobId = job.id;
+            jobPollTimer = setInterval(pollPlotJob, 1000);
+            showMessage('切割任务已提交到机器', 'success');
         } catch (error) {
             console.error('开始切割时发生错误:', error);
             showErrorModal(error.message || '开始切割失败');
             isCutting = false;
-            const startBtn = document.querySelector('button[onclick="startCutting()"]');
-            if (startBtn) setButtonState(startBtn, false);
+            resetCuttingButtons();
         }
     });
 }
@@ -667,40 +999,50 @@ window.startCutting = async function() {
 /**
  * 暂停切割
  */
-window.pauseCutting = function() {
-    if (!isCutting) {
+window.pauseCutting = async function() {
+    if (!isCutting || !currentJobId) {
         showMessage('当前没有正在进行的切割任务', 'warning');
         return;
     }
 
-    isPaused = !isPaused;
-    const pauseBtn = document.querySelector('button[onclick="pauseCutting()"]');
-    pauseBtn.textContent = isPaused ? '继续' : '暂停';
-    showMessage(isPaused ? '切割已暂停' : '切割已继续', 'success');
+    const action = isPaused ? 'resume' : 'pause';
+    try {
+        const response = await fetch(`/plot_jobs/${currentJobId}/${action}`, { method: 'POST' });
+        const job = await response.json();
+        if (!response.ok) {
+            throw new Error(job.error || '操作失败');
+        }
+        isPaused = !isPaused;
+        const pauseBtn = document.querySelector('button[onclick="pauseCutting()"]');
+        pauseBtn.textContent = isPaused ? '继续' : '暂停';
+        showMessage(isPaused ? '切割已暂停' : '切割已继续', 'success');
+    } catch (error) {
+        console.error('暂停/继续切割时发生错误:', error);
+        showMessage(error.message || '操作失败', 'danger');
+    }
 }
 
 /**
  * 停止切割
  */
 window.stopCutting = function() {
-    if (!isCutting) {
+    if (!isCutting || !currentJobId) {
         showMessage('当前没有正在进行的切割任务', 'warning');
         return;
     }
 
-    showConfirmModal('确定要停止切割吗？', () => {
-        isCutting = false;
-        isPaused = false;
-        
-        const startBtn = document.querySelector('button[onclick="startCutting()"]');
-        const pauseBtn = document.querySelector('button[onclick="pauseCutting()"]');
-        const stopBtn = document.querySelector('button[onclick="stopCutting()"]');
-
-        setButtonState(startBtn, false);
-        setButtonState(pauseBtn, true);
-        setButtonState(stopBtn, true);
-        
-        showMessage('切割已停止', 'success');
+    showConfirmModal('确定要停止切割吗？', async () => {
+        try {
+            const response = await fetch(`/plot_jobs/${currentJobId}/cancel`, { method: 'POST' });
+            const job = await response.json();
+            if (!response.ok) {
+                throw new Error(job.error || '停止切割失败');
+            }
+            showMessage('切割已停止', 'success');
+        } catch (error) {
+            console.error('停止切割时发生错误:', error);
+            showMessage(error.message || '停止切割失败', 'danger');
+        }
     });
 }
 
@@ -759,6 +1101,7 @@ window.handlePatternUpload = async function(event) {
 
 // 添加键盘事件监听
 document.addEventListener('DOMContentLoaded', function() {
+    watchMachineStatus();
     const promptInput = document.getElementById('prompt');
     if (promptInput) {
         promptInput.addEventListener('keypress', function(e) {
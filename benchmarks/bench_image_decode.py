@@ -0,0 +1,93 @@
+"""对比 /analyze_steps 旧的双重解码路径与新的单次 cv2.imdecode 路径
+
+用法：
+    python benchmarks/bench_image_decode.py [--repeat 20]
+
+对 app/ 下自带的 PNG 样例分别测量两条路径的平均耗时和峰值内存（RSS）。
+每个测量在独立子进程中运行，保证峰值 RSS 互不干扰。
+"""
+import argparse
+import base64
+import glob
+import io
+import os
+import resource
+import sys
+import time
+from multiprocessing import get_context
+
+import numpy as np
+from PIL import Image
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+sys.path.insert(0, APP_DIR)
+
+from ai.step_analyzer import StepAnalyzer  # noqa: E402
+
+TARGET_SIZE = 800
+
+
+def legacy_path(payload: str) -> np.ndarray:
+    """旧流程：路由解码并用 PIL 校验，分析器再拆分、解码、打开一次"""
+    image_data = payload.split(',')[1] if ',' in payload else payload
+    decoded = base64.b64decode(image_data)
+    image = Image.open(io.BytesIO(decoded))
+    image.size  # 路由中的尺寸校验
+    # StepAnalyzer.analyze 内部
+    image_bytes = base64.b64decode(image_data)
+    image = Image.open(io.BytesIO(image_bytes))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    image.thumbnail((TARGET_SIZE, TARGET_SIZE))
+    return np.array(image)
+
+
+def single_decode_path(payload: str) -> np.ndarray:
+    """新流程：base64 解码一次，cv2.imdecode 直接得到数组"""
+    image_data = payload.split(',')[1] if ',' in payload else payload
+    image = StepAnalyzer.decode_image(base64.b64decode(image_data))
+    height, width = image.shape[:2]
+    ratio = min(TARGET_SIZE / width, TARGET_SIZE / height)
+    if ratio < 1:
+        import cv2
+        image = cv2.resize(image, (round(width * ratio), round(height * ratio)), interpolation=cv2.INTER_AREA)
+    return image
+
+
+PATHS = {'legacy': legacy_path, 'single_decode': single_decode_path}
+
+
+def _measure(args):
+    name, path, repeat = args
+    with open(path, 'rb') as f:
+        payload = 'data:image/png;base64,' + base64.b64encode(f.read()).decode()
+    func = PATHS[name]
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    func(payload)  # 预热
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(payload)
+    elapsed = (time.perf_counter() - start) / repeat
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return elapsed, rss_after - rss_before
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    samples = sorted(glob.glob(os.path.join(APP_DIR, '*.png')))
+    ctx = get_context('spawn')
+    print(f"{'样例':<40} {'路径':<14} {'耗时(ms)':>10} {'峰值RSS增量(MB)':>16}")
+    for sample in samples:
+        for name in PATHS:
+            with ctx.Pool(1) as pool:
+                elapsed, rss_delta = pool.apply(_measure, ((name, sample, args.repeat),))
+            # Linux 上 ru_maxrss 单位为 KB，macOS 为字节
+            rss_mb = rss_delta / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+            print(f"{os.path.basename(sample)[:38]:<40} {name:<14} {elapsed * 1000:>10.2f} {rss_mb:>16.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,265 @@
+"""图像到 G-code 全流程的分阶段基准测试
+
+用法：
+    python benchmarks/bench_pipeline.py [--repeat 5] [--output results.json]
+    python benchmarks/bench_pipeline.py --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_pipeline.py --baseline benchmarks/baseline.json [--threshold 0.15]
+
+样例为 app/ 下自带的 PNG 与按固定随机种子生成的、复杂度递增的合成图案。
+对每个样例分别计时各阶段（解码、模糊 + Canny、findContours、笔画分段、步骤生成、
+SVG 输出、可视化、结果序列化、SVG 路径解析、G-code 编译），取多次运行的最小值
+与平均值；另以 tracemalloc 单独运行一次，记录每个阶段的峰值内存（Python 与 numpy
+分配，不含 OpenCV 内部的临时缓冲）。
+
+结果以 JSON 输出。指定 --baseline 时逐项对比最小耗时，超过阈值（且绝对差值
+大于 --noise-ms）的阶段标记为回退，此时退出码为 1。
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+sys.path.insert(0, APP_DIR)
+
+from ai.step_analyzer import StepAnalyzer  # noqa: E402
+from ai.step_format import format_result, pack_contours  # noqa: E402
+from hardware.arduino_controller import ArduinoController  # noqa: E402
+
+# 合成样例：形状数量递增
+SYNTHETIC_LEVELS = (10, 50, 200, 800)
+SYNTHETIC_SIZE = 800
+
+
+def synthetic_image(shapes: int, seed: int = 0) -> bytes:
+    """生成白底黑色图形的 PNG：圆、旋转多边形与折线混合，固定种子保证可复现"""
+    rng = np.random.default_rng(seed + shapes)
+    canvas = np.full((SYNTHETIC_SIZE, SYNTHETIC_SIZE, 3), 255, dtype=np.uint8)
+    for _ in range(shapes):
+        kind = rng.integers(3)
+        center = rng.integers(20, SYNTHETIC_SIZE - 20, size=2)
+        radius = int(rng.integers(5, max(6, 200 // int(np.sqrt(shapes)) + 10)))
+        if kind == 0:
+            cv2.circle(canvas, tuple(int(v) for v in center), radius, (0, 0, 0), -1)
+        elif kind == 1:
+            sides = int(rng.integers(3, 9))
+            angles = np.sort(rng.uniform(0, 2 * np.pi, sides))
+            points = center + np.stack((np.cos(angles), np.sin(angles)), axis=1) * radius
+            cv2.fillPoly(canvas, [points.astype(np.int32)], (0, 0, 0))
+        else:
+            points = center + rng.integers(-radius, radius + 1, size=(4, 2))
+            cv2.polylines(canvas, [points.astype(np.int32)], False, (0, 0, 0), 3)
+    ok, png = cv2.imencode('.png', canvas)
+    return png.tobytes()
+
+
+def load_samples(include_bundled: bool = True) -> List[Tuple[str, bytes]]:
+    samples = []
+    if include_bundled:
+        for path in sorted(glob.glob(os.path.join(APP_DIR, '*.png'))):
+            with open(path, 'rb') as f:
+                samples.append((os.path.basename(path), f.read()))
+    for shapes in SYNTHETIC_LEVELS:
+        samples.append((f"synthetic-{shapes}", synthetic_image(shapes)))
+    return samples
+
+
+def pipeline_stages(analyzer: StepAnalyzer, controller: ArduinoController,
+                    data: bytes) -> List[Tuple[str, Callable[[Dict[str, Any]], Any]]]:
+    """返回按顺序执行的 (阶段名, 函数)；函数从共享状态取输入并写回输出"""
+
+    def decode(state):
+        state['image'] = analyzer._prepare_image(data)
+
+    def edges(state):
+        state['edges'] = analyzer._detect_edges(state['image'])
+
+    def contours(state):
+        state['contours'], state['hierarchy'] = analyzer._trace_contours(state['edges'])
+
+    def segmentation(state):
+        # 与 _build_steps 相同的角点定位与笔画度量，不生成步骤字典
+        if not state['contours']:
+            return
+        state['areas'], state['contour_info'] = analyzer._order_contours(state['contours'], state['hierarchy'])
+        for i, contour, _ in state['contour_info']:
+            if state['areas'][i] < analyzer.min_contour_area:
+                continue
+            corners = cv2.approxPolyDP(contour, analyzer.epsilon_factor * cv2.arcLength(contour, True), True)
+            if len(corners) >= 2:
+                points = contour.reshape(-1, 2)
+                analyzer._stroke_metrics(points, analyzer._corner_indices(points, corners.reshape(-1, 2)))
+
+    def steps(state):
+        if not state['contours']:
+            return
+        state['steps'], parts = analyzer._build_steps(state['areas'], state['contour_info'])
+        state['contour_data'], state['contour_offsets'] = pack_contours(parts)
+
+    def svg(state):
+        if not state['contours']:
+            state['svg'] = None
+            return
+        state['svg'] = analyzer.svg_writer.to_string(
+            analyzer._svg_paths(state['contours'], state['areas'], state['contour_info']))
+
+    def visualization(state):
+        if state.get('steps'):
+            analyzer.render_visualization(state['image'], state)
+
+    def serialize(state):
+        if state.get('steps'):
+            result = {key: state[key] for key in ('steps', 'contour_data', 'contour_offsets')}
+            result['svg_data'] = state['svg']
+            json.dumps(format_result(result, 'compact'))
+
+    def parse_svg(state):
+        state['paths'] = controller.parse_svg_paths(state['svg']) if state['svg'] else []
+
+    def gcode(state):
+        state['program'] = controller.compile_paths(state['paths'])
+
+    return [('decode', decode), ('edges', edges), ('find_contours', contours),
+            ('segmentation', segmentation), ('steps', steps), ('svg', svg),
+            ('visualization', visualization), ('serialize', serialize),
+            ('parse_svg', parse_svg), ('gcode', gcode)]
+
+
+def run_once(stages, measure_memory: bool = False) -> Tuple[Dict[str, float], Dict[str, int], Dict[str, Any]]:
+    timings, peaks, state = {}, {}, {}
+    for name, func in stages:
+        if measure_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        func(state)
+        timings[name] = time.perf_counter() - start
+        if measure_memory:
+            peaks[name] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    return timings, peaks, state
+
+
+def benchmark_sample(analyzer, controller, data: bytes, repeat: int) -> Dict[str, Any]:
+    stages = pipeline_stages(analyzer, controller, data)
+    run_once(stages)  # 预热
+    runs = [run_once(stages)[0] for _ in range(repeat)]
+    _, peaks, state = run_once(stages, measure_memory=True)
+    result = {
+        'contours': len(state.get('contours') or ()),
+        'steps': len(state.get('steps') or ()),
+        'gcode_lines': len(state.get('program') or ()),
+        'stages': {},
+    }
+    for name, _ in stages:
+        values = [run[name] for run in runs]
+        result['stages'][name] = {
+            'min_ms': round(min(values) * 1000, 3),
+            'mean_ms': round(sum(values) / len(values) * 1000, 3),
+            'peak_kb': round(peaks[name] / 1024, 1),
+        }
+    result['total_ms'] = round(sum(s['min_ms'] for s in result['stages'].values()), 3)
+    return result
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float,
+            noise_ms: float) -> List[Dict[str, Any]]:
+    """逐样例逐阶段比较最小耗时，返回超过阈值的回退项"""
+    regressions = []
+    for sample, result in current['samples'].items():
+        base = baseline.get('samples', {}).get(sample)
+        if base is None:
+            continue
+        for stage, timing in result['stages'].items():
+            base_timing = base['stages'].get(stage)
+            if base_timing is None:
+                continue
+            before, after = base_timing['min_ms'], timing['min_ms']
+            if after - before > noise_ms and after > before * (1 + threshold):
+                regressions.append({'sample': sample, 'stage': stage, 'baseline_ms': before,
+                                    'current_ms': after, 'ratio': round(after / max(before, 1e-9), 2)})
+    return regressions
+
+
+def print_table(results: Dict[str, Any], stage_names: List[str]) -> None:
+    header = f"{'样例':<28} {'轮廓数':>7}" + ''.join(f" {name[:12]:>12}" for name in stage_names) + f" {'合计(ms)':>10}"
+    print(header)
+    for sample, result in results['samples'].items():
+        row = f"{sample[:26]:<28} {result['contours']:>7}"
+        row += ''.join(f" {result['stages'][name]['min_ms']:>12.2f}" for name in stage_names)
+        print(row + f" {result['total_ms']:>10.2f}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='结果 JSON 的输出路径（默认输出到标准输出末尾）')
+    parser.add_argument('--save-baseline', help='把本次结果保存为基线')
+    parser.add_argument('--baseline', help='与已保存的基线对比')
+    parser.add_argument('--threshold', type=float, default=0.15, help='判定回退的相对阈值（默认 15%%）')
+    parser.add_argument('--noise-ms', type=float, default=1.0, help='小于该绝对差值的变化视为噪声')
+    parser.add_argument('--synthetic-only', action='store_true', help='只使用合成样例')
+    args = parser.parse_args()
+
+    analyzer = StepAnalyzer()
+    controller = ArduinoController()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'machine': platform.machine(),
+            'repeat': args.repeat,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'samples': {},
+    }
+    stage_names = []
+    for name, data in load_samples(not args.synthetic_only):
+        results['samples'][name] = benchmark_sample(analyzer, controller, data, args.repeat)
+        stage_names = list(results['samples'][name]['stages'])
+    results['meta']['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    print_table(results, stage_names)
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.noise_ms)
+        results['regressions'] = regressions
+        if regressions:
+            exit_code = 1
+            print(f"\n发现 {len(regressions)} 项性能回退（阈值 {args.threshold:.0%}）：")
+            for item in regressions:
+                print(f"  {item['sample']} / {item['stage']}: {item['baseline_ms']:.2f} ms -> "
+                      f"{item['current_ms']:.2f} ms（{item['ratio']}x）")
+        else:
+            print("\n与基线相比未发现性能回退")
+
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            f.write(output)
+        print(f"\n基线已保存到 {args.save_baseline}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    elif not args.save_baseline:
+        print(output)
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
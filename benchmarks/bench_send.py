@@ -0,0 +1,134 @@
+"""串口发送策略的吞吐量基准测试（使用 grblsim:// 模拟设备，无需硬件）
+
+用法：
+    python benchmarks/bench_send.py [--bauds 9600,115200] [--modes pingpong,stream] [--output results.json]
+    python benchmarks/bench_send.py --svg drawing.svg --sim "rx=128&planner=16"
+
+对每个样例、波特率与发送模式，编译出同一份绘图程序后通过虚拟时间的模拟 GRBL
+发送，记录：
+    wall      发送过程的真实耗时（主机侧开销），
+    plot      模拟的总绘制时间（第一行到达设备到最后一个运动块结束），
+    starved   规划器在两次运动之间排空的时间（主机来不及喂指令的损失），
+    estimate  编译器按距离与进给估算的时间，plot 与之的差即为通信造成的额外耗时。
+默认样例为按固定随机种子生成的两类 SVG：dense 由大量短线段组成（小圆与细碎曲线，
+逐行等待时最容易饿死规划器），sparse 为少量长直线。
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import time
+from typing import Any, Dict, List
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+sys.path.insert(0, APP_DIR)
+
+from hardware.arduino_controller import ArduinoController  # noqa: E402
+
+SVG_HEADER = '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 200 200" width="200" height="200">'
+
+
+def _dense_svg(seed: int = 1) -> str:
+    rng = random.Random(seed)
+    shapes = [f'<circle cx="{rng.uniform(5, 195):.1f}" cy="{rng.uniform(5, 195):.1f}" r="{rng.uniform(0.5, 4):.2f}" />'
+              for _ in range(300)]
+    for _ in range(40):
+        x, y = rng.uniform(0, 200), rng.uniform(0, 200)
+        points = [f"M{x:.2f},{y:.2f}"]
+        for _ in range(60):
+            x = min(max(x + rng.uniform(-1.5, 1.5), 0), 200)
+            y = min(max(y + rng.uniform(-1.5, 1.5), 0), 200)
+            points.append(f"L{x:.2f},{y:.2f}")
+        shapes.append(f'<path d="{" ".join(points)}" />')
+    return SVG_HEADER + ''.join(shapes) + '</svg>'
+
+
+def _sparse_svg(seed: int = 2) -> str:
+    rng = random.Random(seed)
+    lines = [f'<line x1="{rng.uniform(0, 200):.1f}" y1="{rng.uniform(0, 200):.1f}" '
+             f'x2="{rng.uniform(0, 200):.1f}" y2="{rng.uniform(0, 200):.1f}" />' for _ in range(150)]
+    return SVG_HEADER + ''.join(lines) + '</svg>'
+
+
+SAMPLES = {'dense': _dense_svg, 'sparse': _sparse_svg}
+
+
+def benchmark_send(svg_data: str, baud: int, mode: str, sim_options: str) -> Dict[str, Any]:
+    query = '&'.join(option for option in ('speed=0', sim_options) if option)
+    os.environ['ARDUINO_SERIAL_PORT'] = f"grblsim://?{query}"
+    os.environ['ARDUINO_BAUD_RATE'] = str(baud)
+    controller = ArduinoController()
+    program = controller.compile_svg(svg_data)
+    if not controller.connect():
+        raise RuntimeError(f"无法连接模拟设备: {os.environ['ARDUINO_SERIAL_PORT']}")
+    try:
+        start = time.perf_counter()
+        success = controller.send_program(program, mode)
+        wall = time.perf_counter() - start
+        simulated = controller.serial.simulator.stats()
+    finally:
+        controller.disconnect()
+    return {
+        'success': success,
+        'lines': len(program.lines),
+        'bytes': sum(len(line) + 1 for line in program.lines),
+        'wall_ms': round(wall * 1000, 1),
+        'plot_s': simulated['plot_time_s'],
+        'starved_s': simulated['idle_gap_s'],
+        'estimate_s': program.stats.get('estimated_time_s'),
+        'simulator': simulated,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bauds', default='9600,115200', help='波特率，逗号分隔')
+    parser.add_argument('--modes', default='pingpong,stream', help='发送模式，逗号分隔')
+    parser.add_argument('--svg', action='append', default=[], help='额外的 SVG 文件（可重复指定）')
+    parser.add_argument('--sim', default='', help='附加到 grblsim:// 的模拟器选项，如 "rx=128&planner=16"')
+    parser.add_argument('--output', help='结果 JSON 的输出路径（默认输出到标准输出末尾）')
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    samples: Dict[str, str] = {name: make() for name, make in SAMPLES.items()}
+    for path in args.svg:
+        with open(path, 'r', encoding='utf-8') as f:
+            samples[os.path.basename(path)] = f.read()
+
+    results: Dict[str, Any] = {
+        'meta': {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'sim_options': args.sim,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'samples': {},
+    }
+    print(f"{'样例':<16} {'波特率':>7} {'模式':<9} {'行数':>6} {'发送(ms)':>9} {'绘制(s)':>9} "
+          f"{'饥饿(s)':>8} {'估算(s)':>8}")
+    for name, svg_data in samples.items():
+        sample_results: List[Dict[str, Any]] = []
+        for baud in (int(b) for b in args.bauds.split(',')):
+            for mode in args.modes.split(','):
+                result = benchmark_send(svg_data, baud, mode, args.sim)
+                result.update({'baud': baud, 'mode': mode})
+                sample_results.append(result)
+                status = '' if result['success'] else '  失败'
+                print(f"{name:<16} {baud:>7} {mode:<9} {result['lines']:>6} {result['wall_ms']:>9.1f} "
+                      f"{result['plot_s']:>9.2f} {result['starved_s']:>8.2f} {result['estimate_s']:>8.2f}{status}")
+        results['samples'][name] = sample_results
+
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0 if all(r['success'] for rs in results['samples'].values() for r in rs) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""对比 StepAnalyzer 笔画分段的旧实现（逐角点求距离 + 逐笔画 arcLength）与向量化实现
+
+用法：
+    python benchmarks/bench_stroke_segmentation.py [--repeat 5]
+
+对 app/ 下自带的 PNG 样例提取轮廓后，分别测量两种实现对全部轮廓完成
+角点定位与笔画度量的平均耗时，并校验两者得到的角点索引与笔画长度一致。
+"""
+import argparse
+import glob
+import math
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+sys.path.insert(0, APP_DIR)
+
+from ai.step_analyzer import StepAnalyzer  # noqa: E402
+
+
+def legacy_segment(contours, analyzer):
+    """旧流程：每个角点对整条轮廓求距离，每条笔画单独调用 cv2.arcLength"""
+    result = []
+    for contour in contours:
+        perimeter = cv2.arcLength(contour, True)
+        corners = cv2.approxPolyDP(contour, analyzer.epsilon_factor * perimeter, True)
+        if len(corners) < 2:
+            continue
+        corner_indices = []
+        for corner in corners:
+            distances = np.sqrt(np.sum((contour - corner) ** 2, axis=2))
+            index = np.argmin(distances)
+            if not corner_indices or corner_indices[-1] != index:
+                corner_indices.append(index)
+        corner_indices.sort()
+        lengths = []
+        for j in range(len(corner_indices)):
+            start = corner_indices[j]
+            end = corner_indices[(j + 1) % len(corner_indices)]
+            if start < end:
+                stroke = contour[start:end + 1]
+            else:
+                stroke = np.vstack((contour[start:], contour[:end + 1]))
+            dx = stroke[-1][0][0] - stroke[0][0][0]
+            dy = stroke[-1][0][1] - stroke[0][0][1]
+            lengths.append(cv2.arcLength(stroke, False))
+            math.sqrt(dx * dx + dy * dy)
+            analyzer._get_direction_description(math.degrees(math.atan2(dy, dx)))
+        result.append((corner_indices, lengths))
+    return result
+
+
+def vectorized_segment(contours, analyzer):
+    """新流程：按坐标键批量定位角点，一次计算整条轮廓的全部笔画度量"""
+    result = []
+    for contour in contours:
+        perimeter = cv2.arcLength(contour, True)
+        corners = cv2.approxPolyDP(contour, analyzer.epsilon_factor * perimeter, True)
+        if len(corners) < 2:
+            continue
+        points = contour.reshape(-1, 2)
+        corner_indices = StepAnalyzer._corner_indices(points, corners.reshape(-1, 2))
+        strokes = StepAnalyzer._stroke_metrics(points, corner_indices)
+        result.append((corner_indices.tolist(), strokes['length'].tolist()))
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    analyzer = StepAnalyzer()
+    samples = sorted(glob.glob(os.path.join(APP_DIR, '*.png')))
+    print(f"{'样例':<40} {'轮廓数':>8} {'点数':>10} {'旧实现(ms)':>12} {'向量化(ms)':>12} {'加速比':>8} {'一致':>6}")
+    for sample in samples:
+        with open(sample, 'rb') as f:
+            image = analyzer._prepare_image(f.read())
+        contours, _ = analyzer._find_contours(image)
+        timings = {}
+        outputs = {}
+        for name, func in (('legacy', legacy_segment), ('vectorized', vectorized_segment)):
+            outputs[name] = func(contours, analyzer)  # 预热
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                func(contours, analyzer)
+            timings[name] = (time.perf_counter() - start) / args.repeat
+        same = len(outputs['legacy']) == len(outputs['vectorized']) and all(
+            list(map(int, a[0])) == b[0] and np.allclose(a[1], b[1], atol=1e-3)
+            for a, b in zip(outputs['legacy'], outputs['vectorized']))
+        points = sum(len(c) for c in contours)
+        speedup = timings['legacy'] / timings['vectorized'] if timings['vectorized'] else float('inf')
+        print(f"{os.path.basename(sample)[:38]:<40} {len(contours):>8} {points:>10} "
+              f"{timings['legacy'] * 1000:>12.2f} {timings['vectorized'] * 1000:>12.2f} "
+              f"{speedup:>7.1f}x {'是' if same else '否':>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+"""大尺寸 SVG 的解析与展平基准测试
+
+用法：
+    python benchmarks/bench_svg_parse.py [--sizes 1,5,10] [--repeat 3] [--output results.json]
+    python benchmarks/bench_svg_parse.py --baseline benchmarks/svg_baseline.json [--threshold 0.15]
+
+按固定随机种子生成指定大小（MB）的合成 SVG，分为三类：
+    lines   生成器输出风格的长折线（"L x,y" 逐点书写），
+    curves  C/S/Q/T/A 与相对 H/V 混合、带紧凑数字写法的路径，
+    shapes  嵌套 transform 的 g 中混合 circle / ellipse / rect / polygon / path。
+分别计时 SvgPathParser 的解析与展平（parse）和 ArduinoController 转换为指令
+字典（commands），输出每秒处理的 MB 数与生成的点数。指定 --baseline 时
+对比最小耗时，超过阈值的项目标记为回退，此时退出码为 1。
+计时前先校验 REGRESSION_CASES 中的路径解析结果，不一致时同样以退出码 1 结束。
+
+目标是多 MB 的 SVG 在一秒内解析完成。在单核的开发虚拟机上，5 MB 样例的解析耗时约为
+lines 0.45 s、shapes 1.2 s、curves 1.6 s：只有 lines 达标，curves 与 shapes 仍未达到。
+这两类文档每 MB 约产生 35 万到 57 万个点，剩余耗时主要在逐条命令的参数解析上，
+曲线与圆弧已在整篇文档范围内用 NumPy 批量展平。
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import time
+import xml.etree.ElementTree as ET
+from typing import Any, Callable, Dict, List
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+sys.path.insert(0, APP_DIR)
+
+from hardware.arduino_controller import ArduinoController  # noqa: E402
+from hardware.svg_path_parser import SvgPathParser  # noqa: E402
+
+SVG_HEADER = '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 1000 1000" width="1000" height="1000">'
+
+
+def _fill(target_bytes: int, make_element: Callable[[random.Random], str], seed: int) -> str:
+    rng = random.Random(seed)
+    parts = [SVG_HEADER]
+    size = len(SVG_HEADER)
+    while size < target_bytes:
+        element = make_element(rng)
+        parts.append(element)
+        size += len(element)
+    parts.append('</svg>')
+    return ''.join(parts)
+
+
+def _lines_element(rng: random.Random) -> str:
+    x, y = rng.uniform(0, 1000), rng.uniform(0, 1000)
+    points = [f"M {x:.1f},{y:.1f}"]
+    for _ in range(rng.randint(50, 400)):
+        x = min(max(x + rng.uniform(-2, 2), 0), 1000)
+        y = min(max(y + rng.uniform(-2, 2), 0), 1000)
+        points.append(f"L{x:.1f},{y:.1f}")
+    return f'<path d="{" ".join(points)} Z" fill="none" stroke="black" />'
+
+
+def _curves_element(rng: random.Random) -> str:
+    def r(scale: float = 10) -> str:
+        return f"{rng.uniform(-scale, scale):.2f}"
+
+    commands = [f"M{rng.uniform(0, 1000):.1f} {rng.uniform(0, 1000):.1f}"]
+    for _ in range(rng.randint(20, 80)):
+        kind = rng.randrange(7)
+        if kind == 0:
+            commands.append(f"c{r()} {r()} {r()} {r()} {r()} {r()}")
+        elif kind == 1:
+            commands.append(f"s{r()},{r()} {r()},{r()}")
+        elif kind == 2:
+            commands.append(f"q{r()} {r()} {r()} {r()}t{r()} {r()}")
+        elif kind == 3:
+            # 紧凑写法：标志位与坐标相连
+            commands.append(f"a{abs(float(r())) + 1:.1f} {abs(float(r())) + 1:.1f} {rng.randrange(90)} 01{r()} {r()}")
+        elif kind == 4:
+            commands.append(f"h{r()}v{r()}")
+        elif kind == 5:
+            commands.append(f"l{r()}{r()}")
+        else:
+            commands.append(f"A5 3 30 1 0 {rng.uniform(0, 1000):.1f} {rng.uniform(0, 1000):.1f}"
+                            if rng.random() < 0.1 else f"a5 3 30 1 0 {r()} {r()}")
+    return f'<path d="{"".join(commands)}z" />'
+
+
+def _shapes_element(rng: random.Random) -> str:
+    shapes = []
+    for _ in range(rng.randint(5, 20)):
+        kind = rng.randrange(5)
+        cx, cy = rng.uniform(0, 200), rng.uniform(0, 200)
+        if kind == 0:
+            shapes.append(f'<circle cx="{cx:.1f}" cy="{cy:.1f}" r="{rng.uniform(1, 30):.1f}" />')
+        elif kind == 1:
+            shapes.append(f'<ellipse cx="{cx:.1f}" cy="{cy:.1f}" rx="{rng.uniform(1, 30):.1f}" '
+                          f'ry="{rng.uniform(1, 30):.1f}" transform="rotate({rng.randrange(180)} {cx:.1f} {cy:.1f})" />')
+        elif kind == 2:
+            shapes.append(f'<rect x="{cx:.1f}" y="{cy:.1f}" width="{rng.uniform(1, 50):.1f}" height="{rng.uniform(1, 50):.1f}" />')
+        elif kind == 3:
+            points = ' '.join(f"{cx + rng.uniform(-20, 20):.1f},{cy + rng.uniform(-20, 20):.1f}" for _ in range(8))
+            shapes.append(f'<polygon points="{points}" />')
+        else:
+            shapes.append(f'<path d="M{cx:.1f} {cy:.1f}C{cx + 10:.1f} {cy:.1f} {cx:.1f} {cy + 10:.1f} {cx + 10:.1f} {cy + 10:.1f}" />')
+    transform = f"translate({rng.uniform(0, 800):.1f} {rng.uniform(0, 800):.1f}) scale({rng.uniform(0.5, 2):.2f})"
+    return f'<g transform="{transform}"><g transform="skewX({rng.randrange(-20, 20)})">{"".join(shapes)}</g></g>'
+
+
+GENERATORS = {'lines': _lines_element, 'curves': _curves_element, 'shapes': _shapes_element}
+
+# 曾经解析错误的路径写法：路径数据 -> 期望的子路径
+REGRESSION_CASES = {
+    # 连续的 M 各自开始新的子路径，不能合并为隐式 L（否则抬笔移动会被画出来）
+    'M 10 10 M 20 20 L 30 30': [[(20.0, 20.0), (30.0, 30.0)]],
+    'm 10 10 m 20 20 l 5 5': [[(30.0, 30.0), (35.0, 35.0)]],
+    'M0 0L5 0M10 0L15 0': [[(0.0, 0.0), (5.0, 0.0)], [(10.0, 0.0), (15.0, 0.0)]],
+    'M0 0L5 0ZZM1 1 2 2': [[(0.0, 0.0), (5.0, 0.0), (0.0, 0.0)], [(1.0, 1.0), (2.0, 2.0)]],
+}
+
+
+def check_regressions() -> List[str]:
+    """返回解析结果与期望不一致的路径说明"""
+    parser = SvgPathParser(tolerance=0.05)
+    failures = []
+    for path_data, expected in REGRESSION_CASES.items():
+        actual = [[tuple(point) for point in points.tolist()] for points in parser.parse_path(path_data)]
+        if actual != expected:
+            failures.append(f"{path_data!r}: 期望 {expected}，实际 {actual}")
+    return failures
+
+
+def benchmark_document(svg_data: str, repeat: int) -> Dict[str, Any]:
+    parser = SvgPathParser(tolerance=0.05)
+    controller = ArduinoController()
+    root = ET.fromstring(svg_data)
+
+    def parse() -> List:
+        return parser.parse_document(root)
+
+    def commands() -> List:
+        return controller.parse_svg_paths(svg_data)
+
+    result: Dict[str, Any] = {'bytes': len(svg_data)}
+    for name, func in (('parse', parse), ('commands', commands)):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            output = func()
+            timings.append(time.perf_counter() - start)
+        result[name] = {
+            'min_ms': round(min(timings) * 1000, 3),
+            'mean_ms': round(sum(timings) / len(timings) * 1000, 3),
+            'mb_per_s': round(len(svg_data) / 1e6 / max(min(timings), 1e-9), 2),
+        }
+        if name == 'parse':
+            result['elements'] = len(output)
+            result['points'] = sum(len(points) for subpaths in output for points in subpaths)
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1,5', help='合成 SVG 的大小（MB），逗号分隔')
+    parser.add_argument('--kinds', default=','.join(GENERATORS), help='样例类别，逗号分隔')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='结果 JSON 的输出路径（默认输出到标准输出末尾）')
+    parser.add_argument('--save-baseline', help='把本次结果保存为基线')
+    parser.add_argument('--baseline', help='与已保存的基线对比')
+    parser.add_argument('--threshold', type=float, default=0.15, help='判定回退的相对阈值（默认 15%%）')
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    failures = check_regressions()
+    if failures:
+        print("路径解析回归校验失败：")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+
+    results: Dict[str, Any] = {
+        'meta': {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'repeat': args.repeat,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'samples': {},
+    }
+    print(f"{'样例':<16} {'大小(MB)':>9} {'图形数':>8} {'点数':>10} {'解析(ms)':>10} {'MB/s':>7} {'指令(ms)':>10}")
+    for size in (float(s) for s in args.sizes.split(',')):
+        for kind in args.kinds.split(','):
+            name = f"{kind}-{size:g}mb"
+            svg_data = _fill(int(size * 1e6), GENERATORS[kind], seed=int(size * 1000))
+            result = benchmark_document(svg_data, args.repeat)
+            results['samples'][name] = result
+            print(f"{name:<16} {result['bytes'] / 1e6:>9.2f} {result['elements']:>8} {result['points']:>10} "
+                  f"{result['parse']['min_ms']:>10.1f} {result['parse']['mb_per_s']:>7.2f} "
+                  f"{result['commands']['min_ms']:>10.1f}")
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = []
+        for name, result in results['samples'].items():
+            base = baseline.get('samples', {}).get(name)
+            if base is None:
+                continue
+            for stage in ('parse', 'commands'):
+                before, after = base[stage]['min_ms'], result[stage]['min_ms']
+                if after > before * (1 + args.threshold):
+                    regressions.append({'sample': name, 'stage': stage, 'baseline_ms': before,
+                                        'current_ms': after, 'ratio': round(after / max(before, 1e-9), 2)})
+        results['regressions'] = regressions
+        if regressions:
+            exit_code = 1
+            print(f"\n发现 {len(regressions)} 项性能回退（阈值 {args.threshold:.0%}）：")
+            for item in regressions:
+                print(f"  {item['sample']} / {item['stage']}: {item['baseline_ms']:.1f} ms -> "
+                      f"{item['current_ms']:.1f} ms（{item['ratio']}x）")
+        else:
+            print("\n与基线相比未发现性能回退")
+
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            f.write(output)
+        print(f"\n基线已保存到 {args.save_baseline}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    elif not args.save_baseline:
+        print(output)
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())